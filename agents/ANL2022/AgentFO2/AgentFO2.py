@@ -1,6 +1,7 @@
 import csv
 import logging
 import os
+from collections import defaultdict
 from random import randint
 from time import time
 from typing import cast
@@ -33,6 +34,8 @@ from tudelft_utilities_logging.ReportToLogger import ReportToLogger
 from tudelft.utilities.immutablelist.ImmutableList import ImmutableList
 from decimal import Decimal
 
+from utils.bid_neighborhood import NeighborhoodIndex
+
 
 
 class AgentFO2(DefaultParty):
@@ -49,6 +52,8 @@ class AgentFO2(DefaultParty):
         self.settings: Settings = None
         self.storage_dir: str = None
         self.allbid:BidsWithUtility = None
+        self.neighborhood:NeighborhoodIndex = None
+        self.similarity:int = None
 
         self.pre_opponent_bid_hamming=None
         self.pre_opponent_utility_log=None
@@ -87,6 +92,8 @@ class AgentFO2(DefaultParty):
 
             self.parameters = self.settings.getParameters()
             self.storage_dir = self.parameters.get("storage_dir")
+            # trade-off bidding: offer the bids within this Hamming distance of the last opponent offer first
+            self.similarity = self.parameters.get("similarity")
 
             # the profile contains the preferences of the agent over the domain
             profile_connection = ProfileConnectionFactory.create(
@@ -96,6 +103,8 @@ class AgentFO2(DefaultParty):
             self.domain = self.profile.getDomain()
             self.issue=self.domain.getIssuesValues()
             self.allbid = BidsWithUtility.create(cast(LinearAdditive,self.profile))
+            if self.similarity:
+                self.neighborhood = NeighborhoodIndex(cast(LinearAdditive,self.profile))
             profile_connection.close()
 
         # ActionDone informs you of an action (an offer or an accept)
@@ -247,15 +256,9 @@ class AgentFO2(DefaultParty):
 
             bid = cast(Offer, action).getBid()
             self.opponent_utility_log.append(self.profile.getUtility(bid))
-            count=0
             # ハミング距離
             if len(self.opponent_bid_hamming):
-                for issue in self.issue.keys():
-                    now_value=bid.getValue(issue)
-                    pre_value=self.last_received_bid.getValue(issue)
-                    if not now_value==pre_value:
-                        count+=1
-                self.opponent_bid_hamming.append(count)
+                self.opponent_bid_hamming.append(NeighborhoodIndex.get_distance(bid,self.last_received_bid))
             else:
                 self.opponent_bid_hamming.append(0)
 
@@ -343,7 +346,12 @@ class AgentFO2(DefaultParty):
             self.getMin(),
             self.getMax(),
         )
-        
+
+        if self.neighborhood is not None and self.last_received_bid is not None:
+            bid=self._makeSimilarBid(utilityGoal-Decimal(0.05),min(self.getMax(),utilityGoal+Decimal(0.05)))
+            if bid is not None:
+                return bid
+
         options: ImmutableList[Bid] = self.allbid.getBids(Interval(utilityGoal-Decimal(0.05),min(self.getMax(),utilityGoal+Decimal(0.05))))
         if options.size() == 0:
             # if we can't find good bid
@@ -351,6 +359,27 @@ class AgentFO2(DefaultParty):
         # pick a random one.
         return options.get(randint(0, options.size() - 1))
 
+    def _makeSimilarBid(self, low: Decimal, high: Decimal) -> Bid:
+        """
+        @param low  the minimum utility of the bid
+        @param high the maximum utility of the bid
+        @return a random bid in [low, high] among the closest ones to the last
+                received bid (at most similarity issues changed), or None if
+                there is no such bid.
+        """
+        # one pass over the neighborhood, the rows are grouped by distance and only the chosen one is decoded
+        center=self.neighborhood.encoder.encode(self.last_received_bid)
+        rows_by_distance=defaultdict(list)
+        for row,util,distance in self.neighborhood.get_neighbor_rows(center,int(self.similarity),min_utility=float(low),
+                                                                     max_utility=float(high)):
+            rows_by_distance[distance].append(row)
+        if not rows_by_distance:
+            return None
+        # the last received bid itself counts as distance 1
+        nearest=max(1,min(rows_by_distance))
+        options=[row for distance in range(nearest+1) for row in rows_by_distance.get(distance,[])]
+        return self.neighborhood.encoder.decode(options[randint(0,len(options)-1)])
+
     def getE(self) -> float:
         return 0.4
 
@@ -1,11 +1,5 @@
 import logging
-import numpy as np
-from pandas import array
 from random import randint
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.ensemble import VotingRegressor
-from sklearn.neighbors import KNeighborsRegressor
 from time import time
 from typing import cast
 import random
@@ -34,6 +28,13 @@ from geniusweb.references.Parameters import Parameters
 from tudelft_utilities_logging.ReportToLogger import ReportToLogger
 
 from agents.ANL2022.BIU_agent.utils.opponent_model import OpponentModel
+from utils.lazy_import import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+linear_model = lazy_import("sklearn.linear_model")
+ensemble = lazy_import("sklearn.ensemble")
+neighbors = lazy_import("sklearn.neighbors")
 
 
 class BIU_agent(DefaultParty):
@@ -310,10 +311,10 @@ class BIU_agent(DefaultParty):
 
 
     def regression_opponent_time(self, bid_times):
-        r1 = LinearRegression()
-        r2 = RandomForestRegressor(n_estimators=10, random_state=1)
-        r3 = KNeighborsRegressor()
-        X = array(range(len(bid_times))).reshape(-1, 1)
-        y = array(bid_times).reshape(-1, 1)
-        er = VotingRegressor([('lr', r1), ('rf', r2), ('r3', r3)])        
+        r1 = linear_model.LinearRegression()
+        r2 = ensemble.RandomForestRegressor(n_estimators=10, random_state=1)
+        r3 = neighbors.KNeighborsRegressor()
+        X = pd.array(range(len(bid_times))).reshape(-1, 1)
+        y = pd.array(bid_times).reshape(-1, 1)
+        er = ensemble.VotingRegressor([('lr', r1), ('rf', r2), ('r3', r3)])        
         return er.fit(X, y).predict(X)
\ No newline at end of file
@@ -38,6 +38,7 @@ from geniusweb.references.Parameters import Parameters
 from tudelft_utilities_logging.ReportToLogger import ReportToLogger
 from tudelft.utilities.immutablelist.ImmutableList import ImmutableList
 from .utils.opponent_model import OpponentModel
+from utils.storage import read_data, update_data
 from geniusweb.profile.utilityspace.LinearAdditive import LinearAdditive
 from agents.time_dependent_agent.extended_util_space import ExtendedUtilSpace
 from decimal import Decimal
@@ -204,11 +205,8 @@ class LuckyAgent2022(DefaultParty):
                 self.e = 0.05
 
     def return_saved_data(self, file_name):
-        # for reading also binary mode is important
-        file = open(f"{self.storage_dir}/{file_name}", 'rb')
-        saved_data = json.load(file)
-        file.close()
-        return saved_data
+        # cached in the process until the file changes, the saved data must not be modified
+        return read_data(f"{self.storage_dir}/{file_name}", fmt="json", cache=True)
 
     def notifyChange(self, data: Inform):
         """MUST BE IMPLEMENTED
@@ -369,56 +367,26 @@ class LuckyAgent2022(DefaultParty):
         """
         # **************************************************
 
-        c_data = {}
-        if os.path.isfile(f"{self.storage_dir}/c_data_{self.other}"):
-            # OLD
-            # dbfile_c = open(f"{self.storage_dir}/c_data", 'rb')
-            # c_data = pickle.load(dbfile_c)
-            # dbfile_c.close()
-            # NEW
-            with open(f"{self.storage_dir}/c_data_{self.other}", 'r') as dbfile_c:
-                c_data = json.load(dbfile_c)
-
-        if os.path.exists(f"{self.storage_dir}/c_data_{self.other}"):
-            os.remove(f"{self.storage_dir}/c_data_{self.other}")
-
-        c_data[self.other] = self.condition_d
-        # OLD
-        # dbfile_c = open(f"{self.storage_dir}/c_data", 'ab')
-        # pickle.dump(c_data, dbfile_c)
-        # dbfile_c.close()
-        # NEW
-        with open(f"{self.storage_dir}/c_data_{self.other}", 'w') as dbfile_c:
-            json.dump(c_data, dbfile_c, indent=2)
-
-        m_data = {}
-        if os.path.isfile(f"{self.storage_dir}/m_data_{self.other}"):
-            # OLD
-            # dbfile = open(f"{self.storage_dir}/m_data", 'rb')
-            # m_data = pickle.load(dbfile)
-            # dbfile.close()
-            # NEW
-            with open(f"{self.storage_dir}/m_data_{self.other}", 'r') as dbfile:
-                m_data = json.load(dbfile)
-
-
-        if os.path.exists(f"{self.storage_dir}/m_data_{self.other}"):
-            os.remove(f"{self.storage_dir}/m_data_{self.other}")
+        # the files are updated under their lock, so the concurrent sessions against this opponent do not lose each
+        # other's results. The cached data is shared, so it is copied before the update.
+        def merge_c_data(c_data: dict) -> dict:
+            c_data = dict(c_data)
+            c_data[self.other] = self.condition_d
+            return c_data
+
+        update_data(f"{self.storage_dir}/c_data_{self.other}", merge_c_data, default={}, fmt="json", indent=2,
+                    cache=True)
 
         m_tuple = (self.agreement_utility, self.min, self.e)
-        if self.other in m_data:
-            m_data[self.other].append(m_tuple)
-        else:
-            m_data[self.other] = [m_tuple, ]
-
-        # OLD
-        # dbfile = open(f"{self.storage_dir}/m_data", 'ab')
-        # # source, destination
-        # pickle.dump(m_data, dbfile)
-        # dbfile.close()
-        # NEW
-        with open(f"{self.storage_dir}/m_data_{self.other}", 'w') as dbfile:
-            json.dump(m_data, dbfile, indent=2)
+
+        def merge_m_data(m_data: dict) -> dict:
+            m_data = dict(m_data)
+            # stored as a list, as it is read back from the JSON file
+            m_data[self.other] = m_data.get(self.other, []) + [list(m_tuple)]
+            return m_data
+
+        update_data(f"{self.storage_dir}/m_data_{self.other}", merge_m_data, default={}, fmt="json", indent=2,
+                    cache=True)
 
     ###########################################################################################
     ################################## Example methods below ##################################
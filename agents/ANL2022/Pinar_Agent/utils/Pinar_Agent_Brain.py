@@ -1,11 +1,14 @@
 import json
 import random
-import pandas as pd
-import lightgbm as lgb
 
 from geniusweb.bidspace.AllBidsList import AllBidsList
 from geniusweb.issuevalue.Bid import Bid
 
+from utils.lazy_import import lazy_import
+
+pd = lazy_import("pandas")
+lgb = lazy_import("lightgbm")
+
 
 class Pinar_Agent_Brain:
     def __init__(self):
@@ -28,7 +28,10 @@ class LearnedData:
 
         # our new data structures
         self.__stdUtility: float = 0.0
-        self.__negoResults: list = []
+        # sum and sum of squares of the agreement utilities, instead of the list of all of them: the learned data
+        # stays the same size however many sessions are folded into it
+        self.__sumResults: float = 0.0
+        self.__sumSquaredResults: float = 0.0
         self.__avgOpponentUtility: float = 0.0
         self.__opponentAlpha: float = 0.0
         self.__opponentUtilByTime: list = []
@@ -42,12 +45,22 @@ class LearnedData:
         self.__numEncounters = paramList[2]
         self.__avgMaxUtilityOpponent = paramList[3]
         self.__stdUtility = paramList[4]
-        self.__negoResults = paramList[5]
+        self.__sumResults = sum(paramList[5])
+        self.__sumSquaredResults = sum(util * util for util in paramList[5])
         self.__avgOpponentUtility = paramList[6]
         self.__opponentAlpha = paramList[7]
         self.__opponentUtilByTime = paramList[8]
         self.__opponentMaxReject = paramList[9]
 
+    def __setstate__(self, state: dict):
+        """ Load learned data pickled with the list of all agreement utilities
+        """
+        negoResults = state.pop("_LearnedData__negoResults", None)
+        if negoResults is not None:
+            state["_LearnedData__sumResults"] = sum(negoResults)
+            state["_LearnedData__sumSquaredResults"] = sum(util * util for util in negoResults)
+        self.__dict__.update(state)
+
     def update(self, negotiationData: NegotiationData):
         """ Update the learned data with a negotiation data of a previous negotiation
                session
@@ -61,13 +74,14 @@ class LearnedData:
         self.__avgUtility = (self.__avgUtility * self.__numEncounters + newUtil) \
                             / (self.__numEncounters + 1)
 
-        # add utility to UtiList calculate std deviation of results
-        self.__negoResults.append(negotiationData.getAgreementUtil())
-        self.__stdUtility = 0.0
+        # add utility to the sums, calculate std deviation of results:
+        # sum((util - avg) ^ 2) = sum(util ^ 2) - 2 * avg * sum(util) + n * avg ^ 2
+        self.__sumResults += negotiationData.getAgreementUtil()
+        self.__sumSquaredResults += pow(negotiationData.getAgreementUtil(), 2)
 
-        for util in self.__negoResults:
-            self.__stdUtility += pow(util - self.__avgUtility, 2)
-        self.__stdUtility = sqrt(self.__stdUtility / (self.__numEncounters + 1))
+        self.__stdUtility = self.__sumSquaredResults - 2 * self.__avgUtility * self.__sumResults \
+                            + (self.__numEncounters + 1) * pow(self.__avgUtility, 2)
+        self.__stdUtility = sqrt(max(self.__stdUtility, 0.0) / (self.__numEncounters + 1))
 
         # Track the average value of the maximum that an opponent has offered us across
         # multiple negotiation sessions Double
@@ -1,5 +1,4 @@
 import datetime
-import json
 import logging
 from math import floor
 from random import randint
@@ -36,6 +35,7 @@ from .utils.logger import Logger
 
 from .utils.opponent_model import OpponentModel
 from .utils.utils import bid_to_string
+from utils.storage import read_data, update_data
 
 class SessionData(TypedDict):
     progressAtFinish: float
@@ -244,8 +244,7 @@ class DreamTeam109Agent(DefaultParty):
 
     def attempt_load_data(self):
         if path.exists(self.get_data_file_path()):
-            with open(self.get_data_file_path()) as f:
-                self.data_dict = json.load(f)
+            self.data_dict = read_data(self.get_data_file_path(), fmt="json")
             self.logger.log(logging.INFO, "Loaded previous data about opponent: " + self.other_name)
             self.logger.log(logging.INFO, "data_dict = " + str(self.data_dict))
         else:
@@ -280,9 +279,15 @@ class DreamTeam109Agent(DefaultParty):
         if self.other_name is None:
             self.logger.log(logging.WARNING, "Opponent name was not set; skipping save data")
         else:
-            json_data = json.dumps(self.data_dict, sort_keys=True, indent=4)
-            with open(self.get_data_file_path(), "w") as f:
-                f.write(json_data)
+            # merge the session into the stored data, other sessions against the same opponent may run in parallel
+            session_data = self.data_dict["sessions"][-1]
+
+            def merge(stored_data: dict) -> dict:
+                stored_data["sessions"].append(session_data)
+                return stored_data
+
+            self.data_dict = update_data(self.get_data_file_path(), merge, default={"sessions": []}, fmt="json",
+                                         indent=4)
             self.logger.log(logging.INFO, "Saved data about opponent: " + self.other_name)
 
     def learn_from_past_sessions(self, sessions: list[SessionData]):
@@ -3,7 +3,6 @@ from random import randint
 from time import time
 from typing import cast
 
-import pandas as pd
 from geniusweb.actions.Accept import Accept
 from geniusweb.actions.Action import Action
 from geniusweb.actions.Offer import Offer
@@ -31,10 +30,12 @@ from tudelft_utilities_logging.ReportToLogger import ReportToLogger
 from agents.ANL2022.gea_agent.utils.opponent_model import OpponentModel
 
 # our imports
-import numpy as np
-from sklearn import tree
-from sklearn.preprocessing import label_binarize
 import random
+from utils.lazy_import import lazy_import
+
+np = lazy_import("numpy")
+tree = lazy_import("sklearn.tree")
+preprocessing = lazy_import("sklearn.preprocessing")
 
 
 class GEAAgent(DefaultParty):
@@ -302,7 +303,7 @@ class GEAAgent(DefaultParty):
         domain_issues.sort()
         for issue in domain_issues:
             # encode categorical data
-            issue_encoded = label_binarize([str(bid_issue_values[issue])], classes=self.all_issue_values[issue])
+            issue_encoded = preprocessing.label_binarize([str(bid_issue_values[issue])], classes=self.all_issue_values[issue])
             # concat current category to X
             bid_data.extend(issue_encoded.flatten().tolist())
 
@@ -321,7 +322,7 @@ class GEAAgent(DefaultParty):
         domain_issues.sort()
         for issue in domain_issues:
             # encode categorical data
-            issue_encoded = label_binarize([str(bid_issue_values[issue])], classes=self.all_issue_values[issue])
+            issue_encoded = preprocessing.label_binarize([str(bid_issue_values[issue])], classes=self.all_issue_values[issue])
             # concat current category to X
             bid_data.extend(issue_encoded.flatten().tolist())
 
@@ -1,17 +1,10 @@
-import json
 import math
 import os
 from decimal import Decimal
-from os.path import exists
 
 from geniusweb.inform.Agreements import Agreements
-from geniusweb.issuevalue.ValueSet import ValueSet
-from geniusweb.issuevalue.Value import Value
-from geniusweb.issuevalue.DiscreteValue import DiscreteValue
-from geniusweb.issuevalue.NumberValue import NumberValue
 
 import logging
-from random import randint
 import time
 from typing import cast
 
@@ -35,12 +28,17 @@ from geniusweb.profileconnection.ProfileConnectionFactory import (
 )
 from geniusweb.progress.ProgressTime import ProgressTime
 from geniusweb.references.Parameters import Parameters
-from numpy import long
 from tudelft_utilities_logging.ReportToLogger import ReportToLogger
 
+from utils.acceptance import AcceptanceContext
+from utils.frequency_model import BidEncoder, FrequencyModel
+from utils.lazy_import import lazy_import
+from utils.session_log import SessionLog
+
 from .LearnedData import LearnedData
 from .NegotiationData import NegotiationData
-from .Pair import Pair
+
+np = lazy_import("numpy")
 
 # static vars
 defualtAlpha: float = 10.7
@@ -48,6 +46,10 @@ defualtAlpha: float = 10.7
 tSplit: int = 40
 # agent has 2 - phases - learning of the opponent and offering bids while considering opponent utility, this constant define the threshold between those two phases
 tPhase: float = 0.2
+# number of random bids evaluated per turn, in the first phase, in the second phase and close to the deadline
+goodSamples: int = 1000
+opSamples: int = 2000
+nearDeadlineSamples: int = 100000
 
 
 
@@ -64,8 +66,7 @@ class LearningAgent(DefaultParty):
         self.domain: Domain = None
         self.learnedData: LearnedData = None
         self.negotiationData: NegotiationData = None
-        self.learnedDataPath: str = None
-        self.negotiationDataPath: str = None
+        self.sessionLog: SessionLog = None
         self.storage_dir: str = None
 
         self.opponentName: str = None
@@ -73,12 +74,18 @@ class LearningAgent(DefaultParty):
         # Expecting Lower Limit of Concession Function behavior
         # The idea here that we will keep for a negotiation scenario the most frequent
         # Issues - Values, afterwards, as a counter offer bid for each issue we will select the most frequent value.
-        self.freqMap: dict = None
+        # The counts are kept as one array per issue, indexed by the encoded values (see utils.frequency_model).
+        self.freqMap: FrequencyModel = None
+        self.bidEncoder: BidEncoder = None
+        # weighted value utilities of our profile per issue, to evaluate encoded bids in batch
+        self.utilTables: list = None
 
         # average and standard deviation of the competition for determine "good" utility threshold
         self.avgUtil: float = 0.95
         self.stdUtil: float = 0.15
         self.utilThreshold: float = 0.95
+        # threshold, optimal-bid utility and progress of the current turn
+        self.acceptance: AcceptanceContext = None
 
         self.alpha: float = defualtAlpha
 
@@ -88,7 +95,7 @@ class LearningAgent(DefaultParty):
         self.opReject: list = [0.0] * tSplit
 
         # Best bid for agent, exists if bid space is small enough to search in
-        self.MAX_SEARCHABLE_BIDSPACE: long = 50000
+        self.MAX_SEARCHABLE_BIDSPACE: int = 50000
         self.MIN_UTILITY: float = 0.6
         self.optimalBid: Bid = None
         self.bestOfferBid: Bid = None
@@ -153,28 +160,14 @@ class LearningAgent(DefaultParty):
         agreements: Agreements = data.getAgreements()
         self.processAgreements(agreements)
 
-        # Write the negotiation data that we collected to the path provided.
-        if not (self.negotiationDataPath == None or self.negotiationData == None):
+        # Append the negotiation data that we collected to the log of the opponent, it is folded into the learned
+        # data when we meet this opponent again.
+        if not (self.sessionLog == None or self.negotiationData == None):
             try:
-                with open(self.negotiationDataPath, "w") as f:
-                    # w means overwritten
-                    json.dump(self.negotiationData.__dict__, default=lambda o: o.__dict__, indent=5, fp=f)
-
-
+                self.sessionLog.append(self.negotiationData)
             except:
                 self.logger.log(logging.ERROR, "Failed to write negotiation data to disk")
 
-        # Write the learned data to the path provided.
-        if not (self.learnedDataPath == None or self.learnedData == None):
-            try:
-                with open(self.learnedDataPath, "w") as f:
-                    # w means overwritten
-                    json.dump(self.learnedData.__dict__, default=lambda o: o.__dict__, indent=9, fp=f)
-
-
-            except:
-                self.logger.log(logging.ERROR, "Failed to learned data to disk")
-
         self.logger.log(logging.INFO, "party is terminating:")
         super().terminate()
 
@@ -190,9 +183,8 @@ class LearningAgent(DefaultParty):
                 # The part behind the last _ is always changing, so we must cut it off.
                 self.opponentName = str(actor).rsplit("_", 1)[0]
 
-                # path depend on opponent name
-                self.negotiationDataPath = self.getPath("negotiationData", self.opponentName)
-                self.learnedDataPath = self.getPath("learnedData", self.opponentName)
+                # log depend on opponent name
+                self.sessionLog = SessionLog(self.getPath("learnedData", self.opponentName), updateLearnedData)
 
                 # update and load learnedData
                 self.updateAndLoadLearnedData()
@@ -254,35 +246,10 @@ class LearningAgent(DefaultParty):
             profile_connection = ProfileConnectionFactory.create(data.getProfile().getURI(), self.getReporter())
             self.domain = profile_connection.getProfile().getDomain()
 
-            # Create a Issues-Values frequency map
-            if self.freqMap == None:
-                # Map wasn't created before, create a new instance now
-                self.freqMap = {}
-            else:
-                # Map was created before, but this is a new negotiation scenario, clear the old map.
-                self.freqMap.clear()
-
-            # Obtain all of the issues in the current negotiation domain
-            issues: set = self.domain.getIssues()
-            for s in issues:
-                # create new list of all the values for
-                p: Pair = Pair()
-                p.vList = {}
-
-                # gather type of issue based on the first element
-                vs: ValueSet = self.domain.getValues(s)
-                if isinstance(vs.get(0), DiscreteValue):
-                    p.type = 0
-                elif isinstance(vs.get(0), NumberValue):
-                    p.type = 1
-
-                # Obtain all of the values for an issue "s"
-                for v in vs:
-                    # Add a new entry in the frequency map for each(s, v, typeof(v))
-                    vStr: str = self.valueToStr(v, p)
-                    p.vList[vStr] = 0
-
-                self.freqMap[s] = p
+            # Create a Issues-Values frequency map for the new negotiation scenario, a count of zero for each
+            # (issue, value)
+            self.bidEncoder = BidEncoder(self.domain)
+            self.freqMap = FrequencyModel(self.bidEncoder)
 
         except:
             self.logger.log(logging.ERROR, "error settingsFunction")
@@ -291,6 +258,7 @@ class LearningAgent(DefaultParty):
         self.utilitySpace = profile_connection.getProfile()
         profile_connection.close()
 
+        self.utilTables = self.bidEncoder.get_utility_tables(self.utilitySpace)
         self.allBidList = AllBidsList(self.domain)
 
         # Attempt to find the optimal bid in a search-able bid space, if bid space size
@@ -305,18 +273,13 @@ class LearningAgent(DefaultParty):
                     self.optimalBid = b
 
         else:
-            mx_util: Decimal = Decimal(0)
-            # Iterate randomly through list of bids until we find a good bid
-            for attempt in range(self.MAX_SEARCHABLE_BIDSPACE.intValue()):
-                i: long = randint(0, self.allBidList.size())
-                b: Bid = self.allBidList.get(i)
-                canidate: Decimal = self.utilitySpace.getUtility(b)
-                if canidate > mx_util:
-                    mx_util = canidate
-                    self.optimalBid = b
+            # Evaluate random bids in batch and keep the best one
+            rows = self.bidEncoder.sample(self.MAX_SEARCHABLE_BIDSPACE)
+            utilities = BidEncoder.get_utilities(self.utilTables, rows)
+            self.optimalBid = self.bidEncoder.decode(rows[np.argmax(utilities)])
 
     def isNearNegotiationEnd(self):
-        return 0 if self.progress.get(int(time.time() * 1000)) < tPhase else 1
+        return 0 if self.acceptance.progress < tPhase else 1
 
     def processAction(self, action: Action):
         """Processes an Action performed by the opponent."""
@@ -361,9 +324,13 @@ class LearningAgent(DefaultParty):
     def myTurn(self):
         action: Action = None
 
+        # the acceptance threshold is computed once, the bids of this turn are compared against it
+        self.acceptance = self.createAcceptanceContext()
+        progress: float = self.acceptance.progress
+
         # save average of the last avgSplit offers (only when frequency table is stabilized)
         if self.isNearNegotiationEnd() > 0:
-            index: int = (int)((tSplit - 1) / (1 - tPhase) * (self.progress.get(int(time.time() * 1000)) - tPhase))
+            index: int = (int)((tSplit - 1) / (1 - tPhase) * (progress - tPhase))
 
             if self.lastReceivedBid != None:
                 self.opSum[index] += self.calcOpValue(self.lastReceivedBid)
@@ -390,45 +357,20 @@ class LearningAgent(DefaultParty):
 
             isNearNegotiationEnd = self.isNearNegotiationEnd()
             if isNearNegotiationEnd == 0:
-                attempt = 0
-                while attempt < 1000 and not self.isGood(bid):
-                    attempt += 1
-                    i: long = randint(0, self.allBidList.size())
-                    bid = self.allBidList.get(i)
+                # any random bid which is good for us
+                bid = self.sampleGoodBid(goodSamples, False)
 
                 bid = bid if (self.isGood(
                     bid)) else self.optimalBid  # if the last bid isn't good, offer (default) the optimal bid
 
             elif isNearNegotiationEnd == 1:
-                if self.progress.get(int(time.time() * 1000)) > 0.95:
-                    maxOpponentUtility: float = 0.0
-                    maxBid: Bid = None
-                    i = 0
-                    while i < 10000 and self.progress.get(int(time.time() * 1000)) < 0.99:
-                        i: long = randint(0, self.allBidList.size())
-                        bid = self.allBidList.get(i)
-                        if self.isGood(bid) and self.isOpGood(bid):
-                            opValue = self.calcOpValue(bid)
-                            if opValue > maxOpponentUtility:
-                                maxOpponentUtility = opValue
-                                maxBid = bid
-                        i += 1
-                    bid = maxBid
+                # look for bid with max utility for opponent
+                if progress > 0.95:
+                    bid = self.sampleGoodBid(nearDeadlineSamples, True) if progress < 0.99 else None
                 else:
-                    # look for bid with max utility for opponent
-                    maxOpponentUtility: float = 0.0
-                    maxBid: Bid = None
-                    for i in range(2000):
-                        i: long = randint(0, self.allBidList.size())
-                        bid = self.allBidList.get(i)
-                        if self.isGood(bid) and self.isOpGood(bid):
-                            opValue = self.calcOpValue(bid)
-                            if opValue > maxOpponentUtility:
-                                maxOpponentUtility = opValue
-                                maxBid = bid
-                    bid = maxBid
-
-                bid = self.bestOfferBid if (self.progress.get(int(time.time() * 1000)) > 0.99) and self.isGood(
+                    bid = self.sampleGoodBid(opSamples, True)
+
+                bid = self.bestOfferBid if (progress > 0.99) and self.isGood(
                     self.bestOfferBid) else bid
                 bid = bid if self.isGood(
                     bid) else self.optimalBid  # if the last bid isn't good, offer (default) the optimal bid
@@ -447,123 +389,91 @@ class LearningAgent(DefaultParty):
           """
         if bid == None:
             return False
-        maxVlue: float = 0.95 * float(
-            self.utilitySpace.getUtility(self.optimalBid)) if not self.optimalBid == None else 0.95
+
+        return self.acceptance.accepts(self.utilitySpace.getUtility(bid))
+
+    def createAcceptanceContext(self):
+        """ Computes the utility threshold of a good bid at the current time, once per turn.
+          return the acceptance context, the threshold is at least MIN_UTILITY
+          """
+        progress: float = self.progress.get(int(time.time() * 1000))
+        optimalUtility: float = float(
+            self.utilitySpace.getUtility(self.optimalBid)) if not self.optimalBid == None else 1.0
+        maxVlue: float = 0.95 * optimalUtility
         avgMaxUtility: float = self.learnedData.getAvgMaxUtility() \
             if self.learnedData != None \
             else self.avgUtil
 
         self.utilThreshold = maxVlue \
                              - (maxVlue - 0.55 * self.avgUtil - 0.4 * avgMaxUtility + 0.5 * pow(self.stdUtil, 2)) \
-                             * (math.exp(self.alpha * self.progress.get(int(time.time() * 1000))) - 1) \
+                             * (math.exp(self.alpha * progress) - 1) \
                              / (math.exp(self.alpha) - 1)
 
         if (self.utilThreshold < self.MIN_UTILITY):
             self.utilThreshold = self.MIN_UTILITY
 
-        return float(self.utilitySpace.getUtility(bid)) >= self.utilThreshold
-
-    def calcOpValue(self, bid: Bid):
-        value: float = 0
-
-        issues = bid.getIssues()
-        valUtil: list = [0] * len(issues)
-        issWeght: list = [0] * len(issues)
-        k: int = 0  # index
-
-        for s in issues:
-            p: Pair = self.freqMap[s]
-            v: Value = bid.getValue(s)
-            vs: str = self.valueToStr(v, p)
+        return AcceptanceContext(progress, optimalUtility, self.utilThreshold)
 
-            # calculate utility of value (in the issue)
-            sumOfValues: int = 0
-            maxValue: int = 1
-            for vString in p.vList.keys():
-                sumOfValues += p.vList[vString]
-                maxValue = max(maxValue, p.vList[vString])
-
-            # calculate estimated utility of the issuevalue
-            valUtil[k] = p.vList.get(vs) / maxValue
-
-            # calculate the inverse std deviation of the array
-            mean: float = sumOfValues / len(p.vList)
-            for vString in p.vList.keys():
-                issWeght[k] += pow(p.vList.get(vString) - mean, 2)
-            issWeght[k] = 1.0 / math.sqrt((issWeght[k] + 0.1) / len(p.vList))
+    def sampleGoodBid(self, samples: int, maxOpValue: bool):
+        """ Draws random bids and evaluates isGood (and isOpGood) on all of them at once.
+          param samples the number of random bids
+          param maxOpValue if true, the bid with the highest opponent value among the bids which are good for both
+          agents, otherwise the first bid which is good for us
+          return the bid, or None if no random bid is good
+          """
+        rows = self.bidEncoder.sample(samples)
+        good = BidEncoder.get_utilities(self.utilTables, rows) >= self.acceptance.threshold
 
-            k += 1
+        if maxOpValue:
+            opValues = self.freqMap.get_values(rows)
+            good &= (opValues > self.getOpThreshold()) & (opValues > 0.0)
+            if not good.any():
+                return None
+            return self.bidEncoder.decode(rows[np.argmax(np.where(good, opValues, -1.0))])
 
-        sumOfWght: float = 0
-        for k in range(len(issues)):
-            value += valUtil[k] * issWeght[k]
-            sumOfWght += issWeght[k]
+        if not good.any():
+            return None
+        return self.bidEncoder.decode(rows[np.argmax(good)])
 
-        return value / sumOfWght
+    def calcOpValue(self, bid: Bid):
+        return self.freqMap.get_value(bid)
 
     def isOpGood(self, bid: Bid):
         if bid == None:
             return False
 
         value: float = self.calcOpValue(bid)
-        index: int = int(((tSplit - 1) / (1 - tPhase) * (self.progress.get(int(
-            time.time() * 1000)) - tPhase)))
+        return value > self.getOpThreshold()
+
+    def getOpThreshold(self):
+        index: int = int(((tSplit - 1) / (1 - tPhase) * (self.acceptance.progress - tPhase)))
         # change
         opThreshold: float = max(max(2 * self.opThreshold[index] - 1, self.opReject[index]),
                                  0.2) if self.opThreshold != None and self.opReject != None else 0.6
-        return value > opThreshold
+        return opThreshold
 
     def updateFreqMap(self, bid: Bid):
-        if not (bid == None):
-            issues = bid.getIssues()
-
-            for s in issues:
-                p: Pair = self.freqMap.get(s)
-                v: Value = bid.getValue(s)
-
-                vs: str = self.valueToStr(v, p)
-                p.vList[vs] = (p.vList.get(vs) + 1)
-
-    def valueToStr(self, v: Value, p: Pair):
-        v_str: str = ""
-        if p.type == 0:
-            v_str = cast(DiscreteValue, v).getValue()
-        elif p.type == 1:
-            v_str = cast(NumberValue, v).getValue()
-
-        if v_str == "":
-            print("Warning: Value wasn't found")
-        return v_str
+        self.freqMap.update(bid)
 
     def getPath(self, dataType: str, opponentName: str):
-        return os.path.join(self.storage_dir, dataType + "_" + opponentName + ".json")
+        return os.path.join(self.storage_dir, dataType + "_" + opponentName)
 
     def updateAndLoadLearnedData(self):
-        # we didn't meet this opponent before
-        if exists(self.negotiationDataPath):
-            try:
-                # Load the negotiation data object of a previous negotiation
-                with open(self.negotiationDataPath, "r") as f:
-                    negotiationData: NegotiationData = NegotiationData()
-                    negotiationData.encode(list(json.load(f).values()))
-
-            except:
-                self.logger.log(logging.ERROR, "Negotiation data does not exist")
+        try:
+            # Snapshot of the learned data with the negotiation data of the recent sessions folded into it
+            self.learnedData = self.sessionLog.load()
+        except:
+            self.logger.log(logging.ERROR, "learned data does not exist")
 
-            if exists(self.learnedDataPath):
-                try:
-                    # Load the negotiation data object of a previous negotiation
-                    with open(self.learnedDataPath, "r") as f:
-                        self.learnedData = LearnedData()
-                        self.learnedData.encode(list(json.load(f).values()))
+        # we met this opponent before
+        if self.learnedData != None:
+            self.avgUtil = self.learnedData.getAvgUtility()
+            self.stdUtil = self.learnedData.getStdUtility()
 
-                except:
-                    self.logger.log(logging.ERROR, "learned data does not exist")
 
-            else:
-                self.learnedData = LearnedData()
+def updateLearnedData(learnedData: LearnedData, negotiationData: NegotiationData) -> LearnedData:
+    # Process the negotiation data of a previous session in our learned data
+    learnedData = LearnedData() if learnedData == None else learnedData
+    learnedData.update(negotiationData)
 
-            # Process the negotiation data in our learned Data
-            self.learnedData.update(negotiationData)
-            self.avgUtil = self.learnedData.getAvgUtility()
-            self.stdUtil = self.learnedData.getStdUtility()
+    return learnedData
@@ -31,7 +31,6 @@ from geniusweb.profileconnection.ProfileConnectionFactory import (
 )
 from geniusweb.progress.ProgressTime import ProgressTime
 from geniusweb.references.Parameters import Parameters
-from numpy import append
 from tudelft_utilities_logging.ReportToLogger import ReportToLogger
 from .utils import opponent_model
 
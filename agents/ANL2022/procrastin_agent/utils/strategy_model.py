@@ -1,5 +1,6 @@
-import numpy as np
-from scipy.stats import norm
+from utils.lazy_import import lazy_import
+
+np = lazy_import("numpy")
 
 class StrategyModel():
 	def __init__(self, alphas: list, betas: list, accepts: list):
@@ -1,5 +1,7 @@
-import numpy as np
-from sklearn.linear_model import LinearRegression
+from utils.lazy_import import lazy_import
+
+np = lazy_import("numpy")
+linear_model = lazy_import("sklearn.linear_model")
 
 """
 Key assumptions:
@@ -63,7 +65,7 @@ class TimeEstimator:
         # x2 = np.array(x2_list)
         # X = np.stack([x1, x2]).transpose((1,0))
         X = np.array([x1]).transpose((1,0))
-        model1 = LinearRegression().fit(X, y)
+        model1 = linear_model.LinearRegression().fit(X, y)
         # model2 = LinearRegression().fit(X2, y)
         y_pred = model1.predict(X)
         res = y_pred - y
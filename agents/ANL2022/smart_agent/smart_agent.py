@@ -1,4 +1,3 @@
-import json
 import logging
 import math
 import os.path
@@ -42,6 +41,8 @@ from geniusweb.references.Parameters import Parameters
 from tudelft_utilities_logging.ReportToLogger import ReportToLogger
 
 from agents.ANL2022.smart_agent.utils.opponent_model import OpponentModel
+from utils.acceptance import AcceptanceContext
+from utils.storage import read_data, write_data
 
 
 class SmartAgent(DefaultParty):
@@ -95,6 +96,8 @@ class SmartAgent(DefaultParty):
         self.optimalBid: Bid = None
         self.bestOfferedBid: Bid = None
         self.utilThreshold = None
+        # threshold, optimal-bid utility and progress of the current turn
+        self.acceptance: AcceptanceContext = None
         self.opThreshold = None
         self.last_received_bid: Bid = None
         self.opponent_model: OpponentModel = None
@@ -303,8 +306,11 @@ class SmartAgent(DefaultParty):
         """This method is called when it is our turn. It should decide upon an action
         to perform and send this action to the opponent.
         """
+        # the acceptance threshold is computed once, the bids of this turn are compared against it
+        self.acceptance = self.create_acceptance_context()
+
         if self.is_near_negotiation_end() > 0:
-            index = int((self.time_split - 1) / (1 - self.time_phase) * (self.progress.get(int(time() * 1000)) - self.time_phase))
+            index = int((self.time_split - 1) / (1 - self.time_phase) * (self.acceptance.progress - self.time_phase))
             if self.opponent_sum[index]:
                 self.opponent_sum[index] = self.calc_opponnets_value(self.last_received_bid)
             else:
@@ -338,7 +344,7 @@ class SmartAgent(DefaultParty):
                     if bid != self.optimalBid and not self.accept_condition(bid) and not self.is_opponents_proposal_is_good(bid):
                         i = random.randint(0, self.all_bid_list.size())
                         bid = self.all_bid_list.get(i)
-                    if self.progress.get(int(time()) * 1000) > 0.99 and self.accept_condition(self.bestOfferedBid):
+                    if self.acceptance.progress > 0.99 and self.accept_condition(self.bestOfferedBid):
                         bid = self.bestOfferedBid
                     if not self.accept_condition(bid):
                         bid = self.optimalBid
@@ -349,9 +355,7 @@ class SmartAgent(DefaultParty):
 
     def read_persistent_negotiation_data(self):
         if os.path.exists(f"{self.storage_dir}/{self.opponent_name}"):
-            with open(f"{self.storage_dir}/{self.opponent_name}", "r") as f:
-                data = json.load(f)
-                return data
+            return read_data(f"{self.storage_dir}/{self.opponent_name}", fmt="json")
         else:
             return {"opponent_alpha": self.default_alpha, "aggreement_util": 0.0, "max_received_util": 0.0,
                     "opponent_name": self.opponent_name,
@@ -363,11 +367,10 @@ class SmartAgent(DefaultParty):
         for learning capabilities. Note that no extensive calculations can be done within this method.
         Taking too much time might result in your agent being killed, so use it for storage only.
         """
-        with open(f"{self.storage_dir}/{self.opponent_name}", "w") as f:
-            f.write(json.dumps(self.negotiation_data))
+        write_data(f"{self.storage_dir}/{self.opponent_name}", self.negotiation_data, fmt="json")
 
     def is_near_negotiation_end(self):
-        prog = self.progress.get(time() * 1000)
+        prog = self.acceptance.progress
         if prog < self.time_phase:
             return 0
         else:
@@ -408,7 +411,7 @@ class SmartAgent(DefaultParty):
         if bid == None:
             return 0
         value = self.calc_opponnets_value(bid)
-        index = int(((self.time_split - 1) / (1 - self.time_phase) * (self.progress.get(time() * 1000) - self.time_phase)))
+        index = int(((self.time_split - 1) / (1 - self.time_phase) * (self.acceptance.progress - self.time_phase)))
         if self.opThreshold != None:
             self.opThreshold = max(1 - 2 * self.opThreshold[index], 0.2)
         else:
@@ -422,19 +425,30 @@ class SmartAgent(DefaultParty):
     def accept_condition(self, bid: Bid) -> bool:
         if bid is None or self.opponent_name is None:
             return False
-        avg_max_utility = self.avg_opponent_utility[self.opponent_name]
+        return self.acceptance.accepts(self.utilitySpace.getUtility(bid))
+
+    def create_acceptance_context(self) -> AcceptanceContext:
+        """Compute the acceptance threshold once per turn
+
+        Returns:
+            AcceptanceContext: progress, utility of the optimal bid and threshold
+        """
+        progress = self.progress.get(time() * 1000)
         if self.optimalBid is not None:
-            maxValue = 0.95 * float(self.utilitySpace.getUtility(self.optimalBid))
+            optimal_utility = float(self.utilitySpace.getUtility(self.optimalBid))
         else:
-            maxValue = 0.95
-        if self.isKnownOpponent(self.opponent_name):
+            optimal_utility = 1.0
+        if self.opponent_name is not None:
             avg_max_utility = self.avg_opponent_utility[self.opponent_name]
-        if self.alpha != 0:
-            self.utilThreshold = maxValue - (
-                    maxValue - 0.6 * self.opponent_avg_utility - 0.4 * avg_max_utility + pow(self.std_utility, 2)) * (
-                                             math.exp(self.alpha * self.progress.get(time() * 1000) - 1) - 1) / (
-                                             math.exp(self.alpha) - 1)
-        return self.utilitySpace.getUtility(bid) >= self.utilThreshold
+            maxValue = 0.95 * optimal_utility
+            if self.isKnownOpponent(self.opponent_name):
+                avg_max_utility = self.avg_opponent_utility[self.opponent_name]
+            if self.alpha != 0:
+                self.utilThreshold = maxValue - (
+                        maxValue - 0.6 * self.opponent_avg_utility - 0.4 * avg_max_utility + pow(self.std_utility, 2)) * (
+                                                 math.exp(self.alpha * progress - 1) - 1) / (
+                                                 math.exp(self.alpha) - 1)
+        return AcceptanceContext(progress, optimal_utility, self.utilThreshold)
 
     def find_bid(self) -> Bid:
         # compose a list of all possible bids
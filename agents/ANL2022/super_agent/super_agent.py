@@ -2,10 +2,7 @@ import logging
 import math
 import os.path
 import random
-import pickle
-from time import time
 from typing import cast
-from collections import defaultdict
 from typing import List
 from geniusweb.profileconnection.ProfileInterface import ProfileInterface
 from geniusweb.actions.Accept import Accept
@@ -22,9 +19,6 @@ from geniusweb.bidspace.AllBidsList import AllBidsList
 from geniusweb.party.Capabilities import Capabilities
 from geniusweb.party.DefaultParty import DefaultParty
 from geniusweb.utils import val
-from geniusweb.issuevalue.Value import Value
-from geniusweb.issuevalue import DiscreteValue
-from geniusweb.issuevalue import NumberValue
 from geniusweb.inform.Agreements import Agreements
 from geniusweb.references.Parameters import Parameters
 from geniusweb.profileconnection.ProfileConnectionFactory import (
@@ -33,9 +27,14 @@ from geniusweb.profileconnection.ProfileConnectionFactory import (
 from geniusweb.progress.ProgressRounds import ProgressRounds
 
 from .utils.utils import get_ms_current_time
-from .utils.pair import Pair
 from .utils.persistent_data import PersistentData
 from .utils.negotiation_data import NegotiationData
+from utils.acceptance import AcceptanceContext
+from utils.frequency_model import BidEncoder, FrequencyModel
+from utils.lazy_import import lazy_import
+from utils.storage import read_data, update_data, write_data
+
+np = lazy_import("numpy")
 
 
 class SuperAgent(DefaultParty):
@@ -67,10 +66,13 @@ class SuperAgent(DefaultParty):
         # self._data_paths: List[str] = []
         self._negotiation_data_paths: List[str] = []
         self._opponent_name = None
-        self._freq_map = defaultdict()
+        self._freq_map: FrequencyModel = None
+        self._bid_encoder: BidEncoder = None
         self._avg_utility = 0.95
         self._std_utility = 0.15
         self._util_threshold = 0.95
+        # threshold, optimal-bid utility and progress of the current turn
+        self._acceptance: AcceptanceContext = None
         self._min_utility = 0.6
         self.default_alpha = 10.7
         self.alpha = self.default_alpha
@@ -85,6 +87,9 @@ class SuperAgent(DefaultParty):
         self._optimal_bid: Bid = None
         self._all_bid_list: AllBidsList = None
         self._sorted_bid_list: List = None
+        # encoded bids and float utilities of the sorted bid list, to evaluate it in batch
+        self._sorted_rows = None
+        self._sorted_utilities = None
         self._len_sorted_bid_list: int = 0
         self._storage_dir: str = None
 
@@ -97,8 +102,7 @@ class SuperAgent(DefaultParty):
         self._negotiation_data_paths.append(data_path_raw)
         if self._negotiation_data is not None and os.path.exists(data_path_raw):
             # print("non-empty NegotiationData")
-            with open(data_path_raw, "rb") as negotiation_data_file:
-                self._negotiation_data: NegotiationData = pickle.load(negotiation_data_file)
+            self._negotiation_data: NegotiationData = read_data(data_path_raw)
         else:
             # print("empty NegotiationData")
             self.create_empty_negotiation_data(opponent_name=opponent_name)
@@ -108,32 +112,27 @@ class SuperAgent(DefaultParty):
         if self._persistent_path is not None and os.path.exists(self._persistent_path):
             # json load
             # print("non-empty PersistentData")
-            with open(self._persistent_path, "rb") as persistent_file:
-                self._persistent_data: PersistentData = pickle.load(persistent_file)
+            # shared with the cache of the process, it is only modified by the merge of learn, which writes it back
+            self._persistent_data: PersistentData = read_data(self._persistent_path, cache=True)
             self._avg_utility = self._persistent_data.get_avg_utility()
             self._std_utility = self._persistent_data.get_std_utility()
         else:
             self._persistent_data: PersistentData = PersistentData()
 
     def first_better_then(self, utility):
-        idx = None
-        try:
-            idx = next(len(self._sorted_bid_list) - 1 - x for x, val in enumerate(self._sorted_bid_list[-1::-1]) if
-                               self.calc_utility(val) > utility)
-        except StopIteration:
-            pass
-        finally:
-            return idx
+        # the last bid of the sorted list which is better
+        better = np.flatnonzero(self._sorted_utilities > utility)
+        return int(better[-1]) if len(better) > 0 else None
 
     def last_bids(self, good_bid: int):
         # this session's max utility got
-        if self._progress.get(get_ms_current_time()) <= 0.97 and self.is_good(self._best_offer_bid):
+        if self._acceptance.progress <= 0.97 and self.is_good(self._best_offer_bid):
             return self._best_offer_bid
         # all session's max utility got
         avg_max_util = self._persistent_data.get_avg_max_utility(self._opponent_name)
         if not avg_max_util:
             return self._best_offer_bid
-        if self._progress.get(get_ms_current_time()) <= 0.99:
+        if self._acceptance.progress <= 0.99:
             idx = self.first_better_then(avg_max_util)
             if idx != None:
                 self.getReporter().log(logging.INFO, "avg_max_util: {0}, bid_utility: {1}".format(avg_max_util,
@@ -147,7 +146,8 @@ class SuperAgent(DefaultParty):
         if good_bid == 0:
             bid = self._optimal_bid
         else:
-            bid = max(self._sorted_bid_list[0:good_bid], key=self.calc_op_value)
+            op_values = self._freq_map.get_values(self._sorted_rows[0:good_bid])
+            bid = self._sorted_bid_list[int(np.argmax(op_values))]
 
         self.getReporter().log(logging.INFO, "chosen bid utility: {}".format(self._utility_space.getUtility(bid)))
         return bid
@@ -189,29 +189,17 @@ class SuperAgent(DefaultParty):
                 self._profile = self._profile_interface.getProfile()
                 self._domain = self._profile.getDomain()
 
-                if self._freq_map is None:
-                    self._freq_map = defaultdict()
-                else:
-                    self._freq_map.clear()
-
-                issues = self._domain.getIssues()
-                for issue in issues:
-                    p = Pair()
-                    vs = self._domain.getValues(issue)
-                    if isinstance(vs.get(0), DiscreteValue.DiscreteValue):
-                        p.value_type = 0
-                    elif isinstance(vs.get(0), NumberValue.NumberValue):
-                        p.value_type = 1
-                    for v in vs:
-                        vstr = self.value_to_str(v, p)
-                        p.vlist[vstr] = 0
-                    self._freq_map[issue] = p
+                self._bid_encoder = BidEncoder(self._domain)
+                self._freq_map = FrequencyModel(self._bid_encoder)
 
                 self._utility_space = self._profile_interface.getProfile()
                 self._all_bid_list: AllBidsList = AllBidsList(domain=self._domain)
                 self._sorted_bid_list = sorted(AllBidsList(domain=self._domain),
                                                key=self._utility_space.getUtility, reverse=True)
                 self._len_sorted_bid_list = len(self._sorted_bid_list)
+                self._sorted_rows = self._bid_encoder.encode_all(self._sorted_bid_list)
+                self._sorted_utilities = BidEncoder.get_utilities(
+                    self._bid_encoder.get_utility_tables(self._utility_space), self._sorted_rows)
                 # after sort of bid list the optimal bid is in the first element
                 self._optimal_bid = self._sorted_bid_list[0]
 
@@ -260,8 +248,7 @@ class SuperAgent(DefaultParty):
                     self._negotiation_data_paths) > 0 and self._negotiation_data is not None:
                 for negotiation_path in self._negotiation_data_paths:
                     try:
-                        with open(negotiation_path, "wb") as negotiation_file:
-                            pickle.dump(self._negotiation_data, negotiation_file)
+                        write_data(negotiation_path, self._negotiation_data)
                     except Exception as e:
                         self.getReporter().log(logging.WARNING, "Error in {}".format(str(e)))
             self.terminate()
@@ -288,17 +275,6 @@ class SuperAgent(DefaultParty):
         if self._profile_interface is not None:
             self._profile_interface.close()
 
-    def value_to_str(self, v: Value, p: Pair) -> str:
-        v_str = ""
-        if p.value_type == 0:
-            v_str = str(cast(DiscreteValue, v).getValue())
-        elif p.value_type == 1:
-            v_str = str(cast(NumberValue, v).getValue())
-
-        if v_str == "":
-            self.getReporter().log(logging.WARNING, "Warning: Value wasn't found")
-        return v_str
-
     def process_action(self, action: Action):
         if isinstance(action, Offer):
             self._last_received_bid = cast(Offer, action).getBid()
@@ -307,59 +283,31 @@ class SuperAgent(DefaultParty):
             self._negotiation_data.add_bid_util(util_value)
 
     def update_freq_map(self, bid: Bid):
-        if bid is not None:
-            issues = bid.getIssues()
-            for issue in issues:
-                p: Pair = self._freq_map[issue]
-                v: Value = bid.getValue(issue)
-                vs: str = self.value_to_str(v, p)
-                p.vlist[vs] = p.vlist[vs] + 1
+        self._freq_map.update(bid)
 
     def calc_op_value(self, bid: Bid):
-        value: float = 0
-        issues: set[str] = bid.getIssues()
-        val_util: list[float] = [0] * len(issues)
-        is_weight: list[float] = [0] * len(issues)
-        k: int = 0
-        for issue in issues:
-            p: Pair = self._freq_map[issue]
-            v: Value = bid.getValue(issue)
-            vs: str = self.value_to_str(v=v, p=p)
-            sum_of_values = 0
-            max_value = 1
-            for vString in p.vlist.keys():
-                sum_of_values = sum_of_values + p.vlist.get(vString)
-                max_value = max(max_value, p.vlist.get(vString))
-            val_util[k] = float(p.vlist.get(vs)) / max_value
-            mean = sum_of_values / len(p.vlist)
-            for v_string in p.vlist.keys():
-                is_weight[k] = is_weight[k] + math.pow(p.vlist.get(v_string) - mean, 2)
-            is_weight[k] = 1 / math.sqrt((is_weight[k] + 0.1) / len(p.vlist))
-            k = k + 1
-        sum_of_weight = 0
-        for k in range(len(issues)):
-            value = value + val_util[k] * is_weight[k]
-            sum_of_weight = sum_of_weight + is_weight[k]
-        return value / sum_of_weight
+        return self._freq_map.get_value(bid)
 
     def is_op_good(self, bid: Bid):
         if bid is None:
             return False
         value = self.calc_op_value(bid=bid)
+        return value > self.get_op_threshold()
+
+    def get_op_threshold(self):
         index = int(
-            ((self.t_split - 1) / (1 - self.t_phase) * (self._progress.get(get_ms_current_time()) - self.t_phase)))
-        op_threshold = max(1 - 2 * self.op_threshold[index], 0.2) if self.op_threshold is not None else 0.6
-        return value > op_threshold
+            ((self.t_split - 1) / (1 - self.t_phase) * (self._acceptance.progress - self.t_phase)))
+        return max(1 - 2 * self.op_threshold[index], 0.2) if self.op_threshold is not None else 0.6
         # index = (int)((t_split - 1) / (1 - t_phase) * (progress.get(System.currentTimeMillis()) - t_phase));
 
     def is_last_turn(self):
-        return self._progress.get(time() * 1000) > 0.997
+        return self._acceptance.progress > 0.997
 
     def is_near_negotiation_end(self):
-        return self._progress.get(time() * 1000) > self.t_phase
+        return self._acceptance.progress > self.t_phase
 
     def is_social_welfare_time(self):
-        return self._progress.get(time() * 1000) > self.t_social_welfare
+        return self._acceptance.progress > self.t_social_welfare
 
     def calc_utility(self, bid):
         # get utility from utility space
@@ -374,30 +322,35 @@ class SuperAgent(DefaultParty):
     def is_good(self, bid):
         if bid is None:
             return False
-        max_value = 0.95 if self._optimal_bid is None else 0.95 * float(self.calc_utility(self._optimal_bid))
+        return self._acceptance.accepts(self.calc_utility(bid))
+
+    def create_acceptance_context(self) -> AcceptanceContext:
+        # computed once per turn, the candidate bids of the turn are compared against the threshold
+        progress = self._progress.get(get_ms_current_time())
+        optimal_utility = 1.0 if self._optimal_bid is None else float(self.calc_utility(self._optimal_bid))
+        max_value = 0.95 * optimal_utility
         avg_max_utility = self._persistent_data.get_avg_max_utility(self._opponent_name) \
             if self._persistent_data._known_opponent(self._opponent_name) \
             else self._avg_utility
         self._util_threshold = max_value - (
                 max_value - 0.55 * self._avg_utility - 0.4 * avg_max_utility + 0.5 * pow(self._std_utility, 2)) * \
-                               (math.exp(self.alpha * self._progress.get(get_ms_current_time())) - 1) / (math.exp(
+                               (math.exp(self.alpha * progress) - 1) / (math.exp(
             self.alpha) - 1)
         if self._util_threshold < self._min_utility:
             self._util_threshold = self._min_utility
-        return float(self.calc_utility(bid)) >= self._util_threshold
+        return AcceptanceContext(progress, optimal_utility, self._util_threshold)
 
     def first_is_good_idx(self):
-        for i in range(len(self._sorted_bid_list)):
-            if not self.is_good(self._sorted_bid_list[i]):
-                return i
-        return len(self._sorted_bid_list) - 1
+        # the utilities are sorted, so the first bid which is not good ends the good ones
+        not_good = np.flatnonzero(self._sorted_utilities < self._acceptance.threshold)
+        return int(not_good[0]) if len(not_good) > 0 else len(self._sorted_bid_list) - 1
 
     def on_negotiation_near_end(self):
         slice_idx = self.first_is_good_idx()
         end_slice = int(min(slice_idx + 0.005 * self._len_sorted_bid_list - 1, self._len_sorted_bid_list - 1))
         idx = random.randint(0, slice_idx)
 
-        if self._progress.get(get_ms_current_time()) >= 0.95:
+        if self._acceptance.progress >= 0.95:
             bid = self.last_bids(idx)
             if self.calc_utility(bid) <= 0.5:
                 bid = self._optimal_bid
@@ -411,12 +364,12 @@ class SuperAgent(DefaultParty):
 
         slice_idx = self.first_is_good_idx()
         end_slice = int(min(slice_idx + 0.005 * self._len_sorted_bid_list - 1, self._len_sorted_bid_list - 1))
-        for i in range(slice_idx, 0, -1):
-            tmp_bid = self._sorted_bid_list[i]
-            if tmp_bid == self._optimal_bid or self.is_op_good(tmp_bid):
-                bid = tmp_bid
-                break
-        if self._progress.get(get_ms_current_time()) > 0.992 and self.is_good(self._best_offer_bid):
+        # the worst good bid which is good for the opponent (the optimal bid is the first one, it is not searched)
+        op_values = self._freq_map.get_values(self._sorted_rows[1:slice_idx + 1])
+        op_good = np.flatnonzero(op_values > self.get_op_threshold())
+        if len(op_good) > 0:
+            bid = self._sorted_bid_list[int(op_good[-1]) + 1]
+        if self._acceptance.progress > 0.992 and self.is_good(self._best_offer_bid):
             bid = self._best_offer_bid
         if bid is None or not self.is_good(bid):
             idx = random.randint(0, slice_idx)
@@ -448,9 +401,10 @@ class SuperAgent(DefaultParty):
         if self._opponent_name is None:
             return Offer(self._me, self._optimal_bid)
 
+        self._acceptance = self.create_acceptance_context()
         if self.is_near_negotiation_end():
             index = int(
-                (self.t_split - 1) / (1 - self.t_phase) * (self._progress.get(get_ms_current_time()) - self.t_phase))
+                (self.t_split - 1) / (1 - self.t_phase) * (self._acceptance.progress - self.t_phase))
             self.op_sum[index] += self.calc_op_value(self._last_received_bid)
             self.op_counter[index] += 1
         if self.is_good(self._last_received_bid) or (self.is_last_turn() and self.calc_utility(self._last_received_bid)>=0.5):
@@ -463,17 +417,19 @@ class SuperAgent(DefaultParty):
     def learn(self):
         self.getReporter().log(logging.INFO, "party is learning")
         # probably have to shift to self._negotiation_data_paths
-        for path in self._negotiation_data_paths:
-            try:
-                with open(path, "rb") as f:
-                    nego_data = pickle.load(f)
-                self._persistent_data.update(nego_data)
-            except Exception as e:
-                print("error in learn function - persistent data update, error:{}", str(e))
+        # the persistent data is updated under a lock, starting from the stored version which contains the updates of
+        # the sessions running in parallel
+        def merge(persistent_data: PersistentData) -> PersistentData:
+            for path in self._negotiation_data_paths:
+                try:
+                    persistent_data.update(read_data(path))
+                except Exception as e:
+                    print("error in learn function - persistent data update, error:{}", str(e))
+
+            return persistent_data
 
         try:
-            with open(self._persistent_path, "wb") as pers_file:
-                pickle.dump(self._persistent_data, pers_file)
+            self._persistent_data = update_data(self._persistent_path, merge, default=self._persistent_data, cache=True)
         except Exception as e:
             print("error in persistent path dump:{}", str(e))
 
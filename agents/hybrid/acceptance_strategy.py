@@ -1,4 +1,5 @@
 from agents.hybrid.utils import *
+from utils.latency import timed
 
 
 class AcceptanceStrategy:
@@ -14,6 +15,7 @@ class AcceptanceStrategy:
         self.profile = profile
         self.progress = progress
 
+    @timed
     def is_accepted(self, received_bid: Bid, generated_bid: Bid, **kwargs) -> bool:
         if received_bid is None:
             return False
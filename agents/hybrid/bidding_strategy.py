@@ -1,4 +1,6 @@
 from agents.hybrid.utils import *
+from utils.latency import timed
+from utils.trade_off import TradeOffGenerator
 
 
 class BiddingStrategy:
@@ -12,6 +14,7 @@ class BiddingStrategy:
     progress: ProgressTime
     my_offers: list
     received_offers: list
+    trade_off: TradeOffGenerator
 
     p0: float = 1.0
     p1: float = 0.85
@@ -21,16 +24,25 @@ class BiddingStrategy:
     window_upper_bound: float = 0.02
     epsilon: float = 0.05
 
+    # Hyperparameters which can be fixed through the parameters of the agent, e.g. by a sweep (utils.sweep)
+    TUNABLE = ("p0", "p1", "p2", "p3", "window_lower_bound", "window_upper_bound")
+
     def __init__(self, profile: LinearAdditiveUtilitySpace, progress: ProgressTime, **kwargs):
         self.profile = profile
         self.progress = progress
         self.my_offers = []
         self.received_offers = []
+        self.trade_off = TradeOffGenerator(profile)
+
+        self.fixed = {name: float(kwargs[name]) for name in self.TUNABLE if kwargs.get(name) is not None}
+        for name, value in self.fixed.items():
+            setattr(self, name, value)
 
     def receive_bid(self, bid: Bid, **kwargs):
         if bid is not None:
             self.received_offers.append(bid)
 
+    @timed
     def generate(self, **kwargs) -> Bid:
         time = get_time(self.progress)
 
@@ -49,26 +61,28 @@ class BiddingStrategy:
 
         log_fn("Target Utility: %f" % target_utility)
 
-        bids = get_bids_at(self.profile, target_utility, self.window_lower_bound, self.window_upper_bound)
+        opponent_model = kwargs["opponent_model"]
 
-        if len(bids) > 0:
-            selected_bid = None
+        # bids of the window by descending opponent utility: a later bid cannot beat the best product once the
+        # opponent utility times the highest utility of the window is below it
+        upper_utility = target_utility + self.window_upper_bound
+        opponent_tables = self.trade_off.get_opponent_tables(
+            lambda issue, value: opponent_model.issues[issue].get_utility(value))
 
-            opponent_model = kwargs["opponent_model"]
+        selected_bid = None
+        selected_product = 0.
 
-            for bid in bids:
-                if selected_bid is None:
-                    if bid not in self.my_offers[-5:]:
-                        selected_bid = bid
-                elif opponent_model.get_utility(bid) * get_utility(self.profile, bid) > \
-                        opponent_model.get_utility(selected_bid) * get_utility(self.profile, selected_bid) and \
-                        bid not in self.my_offers[-5:]:
+        for bid, utility, opponent_utility in self.trade_off.get_bids(
+                opponent_tables, target_utility - self.window_lower_bound, upper_utility):
+            if selected_bid is not None and opponent_utility * upper_utility <= selected_product:
+                break
 
+            if opponent_utility * utility > selected_product or selected_bid is None:
+                if bid not in self.my_offers[-5:]:
                     selected_bid = bid
+                    selected_product = opponent_utility * utility
 
-            if selected_bid is None:
-                selected_bid = get_bid_at(self.profile, target_utility)
-        else:
+        if selected_bid is None:
             selected_bid = get_bid_at(self.profile, target_utility)
 
         self.my_offers.append(selected_bid)
@@ -163,4 +177,8 @@ class BiddingStrategy:
         self.p0 = min(1.0, max_utility)
         self.p2 = max([min_utility, self.p2, reservation_utility])
 
+        # the fixed hyperparameters replace the adapted ones
+        for name, value in self.fixed.items():
+            setattr(self, name, value)
+
         log_fn("P0: %f, P1: %f, P2: %f" % (self.p0, self.p1, self.p2))
@@ -47,6 +47,7 @@ class HybridAgent(DefaultParty):
         self.other: str = None
         self.settings: Settings = None
         self.storage_dir: str = None
+        self.store_path: str = None
 
         self.last_received_bid: Bid = None
         self.last_generated_bid: Bid = None
@@ -66,6 +67,7 @@ class HybridAgent(DefaultParty):
 
             self.parameters = self.settings.getParameters()
             self.storage_dir = self.parameters.get("storage_dir")
+            self.store_path = self.parameters.get("store_path")
 
             self.parameters.get("")
 
@@ -89,7 +91,7 @@ class HybridAgent(DefaultParty):
             if actor != self.me:
                 if self.other is None:
                     self.other = str(actor).rsplit("_", 1)[0]
-                    self.learning_model.load_data(self.storage_dir, self.other)
+                    self.learning_model.load_data(self.storage_dir, self.other, store_path=self.store_path)
 
                     self.bidding_strategy.update(self.learning_model.data, self.log)
                     self.acceptance_strategy.update(self.learning_model.data, self.log)
@@ -103,7 +105,7 @@ class HybridAgent(DefaultParty):
 
         elif isinstance(data, Finished):
             if self.learning_model is not None:
-                self.learning_model.save_data(self.storage_dir, self.other)
+                self.learning_model.save_data(self.storage_dir, self.other, store_path=self.store_path)
                 self.log("%s data is saved." % self.other)
 
             self.log("%s is terminating." % self.NAME)
@@ -116,12 +118,14 @@ class HybridAgent(DefaultParty):
         self.last_received_bid = None
 
         self.opponent_model = OpponentModel(self.domain, self.profile, self.progress, log=self.log)
-        self.bidding_strategy = BiddingStrategy(self.profile, self.progress)
+        self.bidding_strategy = BiddingStrategy(self.profile, self.progress,
+                                                **{name: self.parameters.get(name) for name in BiddingStrategy.TUNABLE})
         self.acceptance_strategy = AcceptanceStrategy(self.profile, self.progress)
-        self.learning_model = LearningModel(self.profile, self.progress, opponent_model=self.opponent_model)
+        self.learning_model = LearningModel(self.profile, self.progress, opponent_model=self.opponent_model,
+                                            store_name=self.parameters.get("store_name"))
 
         if self.other is not None:
-            self.learning_model.load_data(self.storage_dir, self.other)
+            self.learning_model.load_data(self.storage_dir, self.other, store_path=self.store_path)
 
             self.log("Data loaded.")
 
@@ -1,9 +1,13 @@
+import os
+import re
+
 from agents.hybrid.utils import *
 from agents.hybrid.opponent_model import OpponentModel
-import os
-import pickle
-import numpy as np
-from numpy.linalg import inv
+from utils.lazy_import import lazy_import
+from utils.session_log import SessionLog
+from utils.sqlite_store import SQLiteStore
+
+np = lazy_import("numpy")
 
 
 class LearningModel:
@@ -19,6 +23,8 @@ class LearningModel:
     opponent_accepted: bool
     opponent_model: OpponentModel
     data: list
+    history_size: int = 10      # Number of the most recent sessions kept in the learned data
+    store_name: str = None      # Agent name in the optional SQLiteStore, see get_store_name
 
     def __init__(self, profile: LinearAdditiveUtilitySpace, progress: ProgressTime, **kwargs):
         self.profile = profile
@@ -30,6 +36,7 @@ class LearningModel:
         self.acceptance_time = -1
         self.opponent_accepted = False
         self.accepted_bid = None
+        self.store_name = kwargs.get("store_name")
 
     def receive_bid(self, bid: Bid, **kwargs):
         if bid is not None:
@@ -47,8 +54,8 @@ class LearningModel:
         self.opponent_accepted = opponent_accepted
         self.acceptance_time = time
 
-    def save_data(self, storage_dir: str, other: str, **kwargs):
-        if other is None or storage_dir is None or len(self.received_bids) < 2:
+    def save_data(self, storage_dir: str, other: str, store_path: str = None, **kwargs):
+        if other is None or (storage_dir is None and store_path is None) or len(self.received_bids) < 2:
             return
 
         domain_size = AllBidsList(self.profile.getDomain()).size()
@@ -72,25 +79,64 @@ class LearningModel:
         X = np.reshape(np.array(times, dtype=np.float32), (len(times), 1))
         Y = np.reshape(np.array(target, dtype=np.float32), (len(target), 1))
 
-        p1 = float(inv((X.transpose().dot(X))).dot(X.transpose().dot(Y)))
+        p1 = float(np.linalg.inv((X.transpose().dot(X))).dot(X.transpose().dot(Y)))
 
         opponent_acceptance_time = -1 if not self.opponent_accepted or self.accepted_bid is None \
             else self.acceptance_time
 
-        self.data.append({"p0": p0, "p1": p1, "p2": p2, "domain_size": domain_size,
-                          "opponent_acceptance_time": opponent_acceptance_time})
+        session_data = {"p0": p0, "p1": p1, "p2": p2, "domain_size": domain_size,
+                        "opponent_acceptance_time": opponent_acceptance_time}
+
+        # only the session is appended, the history is not re-written
+        if store_path is not None:
+            SQLiteStore(store_path).add_learned(self.get_store_name(storage_dir), other, session_data, domain_size)
+        else:
+            self.get_session_log(storage_dir, other).append(session_data)
 
-        with open(f"{storage_dir}/{other}_data.pkl", "wb") as f:
-            pickle.dump(self.data, f)
+        self.data = (self.data + [session_data])[-self.history_size:]
 
-    def load_data(self, storage_dir: str, other: str, **kwargs) -> list:
+    def load_data(self, storage_dir: str, other: str, store_path: str = None, **kwargs) -> list:
         self.data = []
 
-        if storage_dir is None or other is None:
+        if (storage_dir is None and store_path is None) or other is None:
             return self.data
 
-        if os.path.exists(f"{storage_dir}/{other}_data.pkl"):
-            with open(f"{storage_dir}/{other}_data.pkl", "rb") as f:
-                self.data = pickle.load(f)
+        if store_path is not None:
+            self.data = SQLiteStore(store_path).get_learned(self.get_store_name(storage_dir), other,
+                                                            limit=self.history_size)
+        else:
+            self.data = self.get_session_log(storage_dir, other).load()
 
         return self.data
+
+    def get_store_name(self, storage_dir: str) -> str:
+        """
+            Agent name in the optional SQLiteStore: the ``store_name`` parameter of the agent, otherwise derived from
+            its storage directory, so the variants of the agent (e.g. the configurations of a sweep) do not share their
+            learned data. The per-session directories of a tournament (``session_<index>``) belong to their agent.
+        :param storage_dir: Storage directory
+        :return: Agent name
+        """
+        if self.store_name is not None:
+            return self.store_name
+
+        if storage_dir is None:
+            return "HybridAgent"
+
+        path = os.path.normpath(storage_dir)
+        if re.fullmatch(r"session_\d+", os.path.basename(path)):
+            path = os.path.dirname(path)
+
+        return "HybridAgent:%s" % path.replace(os.sep, "/")
+
+    def get_session_log(self, storage_dir: str, other: str) -> SessionLog:
+        """
+            Append-only log of the sessions against the opponent. Its summary is the list of the most recent
+            ``history_size`` sessions.
+        :param storage_dir: Storage directory
+        :param other: The name of the opponent agent
+        :return: Session log
+        """
+        return SessionLog(f"{storage_dir}/{other}_data",
+                          lambda history, session_data: (history + [session_data])[-self.history_size:],
+                          initial=list)
@@ -5,7 +5,10 @@ from geniusweb.issuevalue.DiscreteValueSet import DiscreteValueSet
 from geniusweb.issuevalue.Domain import Domain
 from geniusweb.issuevalue.Value import Value
 from agents.hybrid.utils import *
-from scipy.stats import chisquare
+from utils.latency import timed
+from utils.lazy_import import lazy_import
+
+stats = lazy_import("scipy.stats")
 
 
 class OpponentModel:
@@ -35,6 +38,7 @@ class OpponentModel:
 
         self.log_fn = kwargs["log"]
 
+    @timed
     def update(self, bid: Bid, **kwargs):
         if bid is None:
             return
@@ -77,7 +81,7 @@ class OpponentModel:
         for issue_name, issue_obj in self.issues.items():
             fr_current = frequency(current_window, issue_name, issue_obj)
             fr_previous = frequency(previous_window, issue_name, issue_obj)
-            p_val = chisquare(fr_previous, fr_current)[1]
+            p_val = stats.chisquare(fr_previous, fr_current)[1]
 
             if p_val > 0.05:
                 not_changed.append(issue_obj)
@@ -0,0 +1,180 @@
+import json
+import logging
+from decimal import Decimal
+from typing import List, Optional, cast
+
+from geniusweb.actions.Accept import Accept
+from geniusweb.actions.Action import Action
+from geniusweb.actions.Offer import Offer
+from geniusweb.inform.ActionDone import ActionDone
+from geniusweb.inform.Finished import Finished
+from geniusweb.inform.Inform import Inform
+from geniusweb.inform.Settings import Settings
+from geniusweb.inform.YourTurn import YourTurn
+from geniusweb.issuevalue.Bid import Bid
+from geniusweb.issuevalue.DiscreteValue import DiscreteValue
+from geniusweb.issuevalue.NumberValue import NumberValue
+from geniusweb.party.Capabilities import Capabilities
+from geniusweb.party.DefaultParty import DefaultParty
+from geniusweb.profile.utilityspace.LinearAdditive import LinearAdditive
+from geniusweb.profileconnection.ProfileConnectionFactory import (
+    ProfileConnectionFactory,
+)
+from geniusweb.utils import val
+
+from utils.extended_util_space import ExtendedUtilSpace
+
+
+class ReplayAgent(DefaultParty):
+    """
+    A scripted party for benchmarks. All bids are prepared when the settings
+    are received; each turn only sends the next one, so the party costs
+    (almost) no time and plays the same sequence in every session.
+
+    Parameters:
+        - trace: path of a session_results_trace.json (full or compact). The
+          offers of the party with the same profile (or of "actor") are
+          replayed, the last one is repeated after the end of the trace.
+        - without a trace, a concession curve on the own profile: the bid of
+          turn i has the utility 1 - (1 - reservation) * (i / rounds) ^ (1 / e),
+          with "e" (default 0.2), "reservation" (default 0.5) and "rounds"
+          (default 1000).
+        - accept_utility: accept an offer with at least this utility. As a
+          default, the party never accepts.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._profile = None
+        self._bids: List[Bid] = []
+        self._turn = 0
+        self._acceptUtility: Optional[Decimal] = None
+        self._lastReceivedBid: Bid = None
+
+    # Override
+    def notifyChange(self, info: Inform):
+        if isinstance(info, Settings):
+            settings: Settings = cast(Settings, info)
+            self._me = settings.getID()
+            self._profile = ProfileConnectionFactory.create(
+                settings.getProfile().getURI(), self.getReporter()
+            )
+            parameters = settings.getParameters()
+
+            accept_utility = parameters.get("accept_utility")
+            if accept_utility is not None:
+                self._acceptUtility = Decimal(str(accept_utility))
+
+            if parameters.get("trace") is not None:
+                self._bids = self._loadTrace(
+                    parameters.get("trace"),
+                    parameters.get("actor"),
+                    str(settings.getProfile().getURI()),
+                )
+            else:
+                self._bids = self._createCurve(
+                    parameters.get("e") or 0.2,
+                    parameters.get("reservation") or 0.5,
+                    parameters.get("rounds") or 1000,
+                )
+        elif isinstance(info, ActionDone):
+            action: Action = cast(ActionDone, info).getAction()
+            if isinstance(action, Offer):
+                self._lastReceivedBid = cast(Offer, action).getBid()
+        elif isinstance(info, YourTurn):
+            self._myTurn()
+        elif isinstance(info, Finished):
+            self.terminate()
+        else:
+            self.getReporter().log(
+                logging.WARNING, "Ignoring unknown info " + str(info)
+            )
+
+    # Override
+    def getCapabilities(self) -> Capabilities:
+        return Capabilities(
+            set(["SAOP"]), set(["geniusweb.profile.utilityspace.LinearAdditive"])
+        )
+
+    # Override
+    def getDescription(self) -> str:
+        return "Replays the offers of a session trace, or a fixed concession curve. Parameters trace, actor, e, reservation, rounds and accept_utility."
+
+    # Override
+    def terminate(self):
+        super().terminate()
+        if self._profile != None:
+            self._profile.close()
+            self._profile = None
+
+    def _myTurn(self):
+        if (
+            self._acceptUtility is not None
+            and self._lastReceivedBid is not None
+            and self._profile.getProfile().getUtility(self._lastReceivedBid)
+            >= self._acceptUtility
+        ):
+            action = Accept(self._me, self._lastReceivedBid)
+        else:
+            action = Offer(self._me, self._bids[min(self._turn, len(self._bids) - 1)])
+            self._turn += 1
+        val(self.getConnection()).send(action)
+
+    def _loadTrace(self, trace_path: str, actor: Optional[str], profile_uri: str) -> List[Bid]:
+        """
+        @param trace_path the path of the session trace
+        @param actor      the party of which the offers are replayed. As a
+                          default, the party with the same profile, or else
+                          the first party.
+        @param profile_uri the URI of our profile
+        @return the offers of the party in the trace
+        """
+        with open(trace_path, "r", encoding="utf-8") as f:
+            trace = json.load(f)
+
+        if actor is None:
+            actors = [
+                party
+                for party, party_profile in trace["partyprofiles"].items()
+                if party_profile["profile"] == profile_uri
+            ]
+            actor = actors[0] if actors else trace["connections"][0]
+
+        bids = []
+        for action in trace["actions"]:
+            if "Offer" in action and action["Offer"]["actor"] == actor:
+                bids.append(
+                    Bid(
+                        {
+                            issue: DiscreteValue(value)
+                            if isinstance(value, str)
+                            else NumberValue(Decimal(str(value)))
+                            for issue, value in action["Offer"]["bid"]["issuevalues"].items()
+                        }
+                    )
+                )
+
+        if not bids:
+            raise ValueError(f"No offers of {actor} in {trace_path}")
+
+        return bids
+
+    def _createCurve(self, e: float, reservation: float, rounds: int) -> List[Bid]:
+        """
+        @param e           the concession factor
+        @param reservation the utility of the last bid
+        @param rounds      the number of bids
+        @return the bids of the concession curve
+        """
+        space = ExtendedUtilSpace(cast(LinearAdditive, self._profile.getProfile()))
+
+        bids = []
+        for i in range(rounds):
+            t = i / max(rounds - 1, 1)
+            goal = Decimal(1 - (1 - reservation) * pow(t, 1 / e))
+            goal = max(min(goal * space.getMax(), space.getMax()), space.getMin())
+
+            # the bids are sorted by utility, the first one is closest to the goal
+            bids.append(space.getBidsIn(goal, space.getMax()).get(0))
+
+        return bids
@@ -1,4 +1,5 @@
 from agents.template_agent.utils import *
+from utils.latency import timed
 
 
 class AcceptanceStrategy:
@@ -20,6 +21,7 @@ class AcceptanceStrategy:
         self.profile = profile
         self.progress = progress
 
+    @timed
     def is_accepted(self, received_bid: Bid, generated_bid: Bid, **kwargs) -> bool:
         """
             Decide received_bid will be accepted, or not
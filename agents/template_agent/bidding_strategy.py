@@ -1,4 +1,5 @@
 from agents.template_agent.utils import *
+from utils.latency import timed
 
 
 class BiddingStrategy:
@@ -28,6 +29,7 @@ class BiddingStrategy:
         if bid is not None:
             self.received_offers.append(bid)
 
+    @timed
     def generate(self, **kwargs) -> Bid:
         """
             Generate a bid.
@@ -1,6 +1,5 @@
 from agents.template_agent.utils import *
-import os
-import pickle
+from utils.storage import read_data, update_data
 
 
 class LearningModel:
@@ -71,9 +70,10 @@ class LearningModel:
         if opponent_agent is None or storage_dir is None:
             return
 
-        # Save the data as Pickle format.
-        with open(f"{storage_dir}/{opponent_agent}_data.pkl", "wb") as f:
-            pickle.dump(self.data, f)
+        # Save the data as Pickle format. The agent may run against the same opponent in parallel sessions, so the
+        # data is merged into the stored data under a lock and written atomically.
+        self.data = update_data(f"{storage_dir}/{opponent_agent}_data.pkl",
+                                lambda stored_data: {**stored_data, **self.data}, default={})
 
     def load_data(self, storage_dir: str, opponent_agent: str, **kwargs) -> dict:
         """
@@ -90,8 +90,6 @@ class LearningModel:
             return self.data
 
         # Load corresponding data
-        if os.path.exists(f"{storage_dir}/{opponent_agent}_data.pkl"):
-            with open(f"{storage_dir}/{opponent_agent}_data.pkl", "rb") as f:
-                self.data = pickle.load(f)
+        self.data = read_data(f"{storage_dir}/{opponent_agent}_data.pkl", default={})
 
         return self.data
@@ -3,6 +3,7 @@ from geniusweb.issuevalue.DiscreteValueSet import DiscreteValueSet
 from geniusweb.issuevalue.Domain import Domain
 from geniusweb.issuevalue.Value import Value
 from agents.template_agent.utils import *
+from utils.latency import timed
 
 
 class OpponentModel:
@@ -36,6 +37,7 @@ class OpponentModel:
         self.issues = {issue: Issue(values) for issue, values in domain.getIssuesValues().items()}
         self.normalize()
 
+    @timed
     def update(self, bid: Bid, **kwargs):
         """
             This method is called when a bid received.
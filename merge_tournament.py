@@ -0,0 +1,57 @@
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+from summary_extractor import extract
+from utils.columnar import get_sessions_table, write_table
+from utils.runners import merge_journals, process_tournament_results
+
+# Combine the journals of a tournament that was spread over several machines (see SHARD_INDEX and SHARD_COUNT in
+# run_tournament.py) and create the same result files as run_tournament.py for the whole tournament.
+parser = argparse.ArgumentParser(description="Merge the shard journals of a tournament.")
+parser.add_argument("journals", nargs="+", help="Paths of the shard journals (tournament_journal_*.jsonl)")
+parser.add_argument("--output", default=os.path.join("results", time.strftime('%Y%m%d-%H%M%S')),
+                    help="Directory to save the merged results")
+parser.add_argument("--settings", default=None,
+                    help="JSON file of the tournament settings, to check the settings of every session")
+parser.add_argument("--format", default="json", choices=["json", "columnar"],
+                    help="Format of the result files, columnar is Parquet (CSV if pyarrow is not installed)")
+args = parser.parse_args()
+
+RESULTS_DIR = Path(args.output)
+RESULTS_FORMAT = args.format
+
+# create results directory if it does not exist
+if not RESULTS_DIR.exists():
+    os.makedirs(RESULTS_DIR)
+
+# combine the journals, every session must be present exactly once and belong to the same tournament
+tournament_settings = None
+if args.settings is not None:
+    with open(args.settings, "r", encoding="utf-8") as f:
+        tournament_settings = json.load(f)
+
+tournament_steps, tournament_results = merge_journals(args.journals, tournament_settings)
+tournament_results_summary = process_tournament_results(tournament_results)
+
+if RESULTS_FORMAT == "columnar":
+    # save the tournament settings and results as one table, partitioned by domain
+    tournament_results_path = write_table(get_sessions_table(tournament_steps, tournament_results),
+                                          str(RESULTS_DIR.joinpath("tournament_results")))
+else:
+    # save the tournament settings for reference
+    with open(RESULTS_DIR.joinpath("tournament_steps.json"), "w", encoding="utf-8") as f:
+        f.write(json.dumps(tournament_steps, indent=2))
+    # save the tournament results
+    tournament_results_path = RESULTS_DIR.joinpath("tournament_results.json")
+    with open(tournament_results_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(tournament_results, indent=2))
+# save the tournament results summary
+tournament_results_summary.to_csv(RESULTS_DIR.joinpath("tournament_results_summary.csv"))
+
+# Call our extractor for more detailed tournament results
+extract(tournament_results_path, RESULTS_DIR)
+
+print("Merged %d sessions from %d journals." % (len(tournament_results), len(args.journals)))
@@ -3,6 +3,7 @@ import os
 import time
 from pathlib import Path
 
+from utils.columnar import get_offers_table, write_table
 from utils.plot_trace import plot_trace
 from utils.runners import run_session
 
@@ -11,6 +12,14 @@ RESULTS_DIR = Path("results", time.strftime('%Y%m%d-%H%M%S'))
 # Reset Stored Data. If you want to use previous stored data, make it false. If you want to clean stored data, make it true.
 RESET_STORAGE = True
 
+# Optional SQLite database to store the session with its offers, e.g. "agent_storage/store.sqlite". Agents can share it
+# for their learned data via the "store_path" parameter (see HybridAgent).
+STORE_PATH = None
+
+# Format of the result files: "json", or "columnar" to write the offers of the session as Parquet (CSV if pyarrow is not
+# installed), see utils.columnar.
+RESULTS_FORMAT = "json"
+
 # create results directory if it does not exist
 if not RESULTS_DIR.exists():
     os.makedirs(RESULTS_DIR)
@@ -32,17 +41,26 @@ settings = {
     ],
     "profiles": ["domains/domain00/profileA.json", "domains/domain00/profileB.json"],
     "deadline_time_ms": 10000,
+    # "none", "summary", "compact" or "full" (default), see utils.runners.run_session
+    "trace_level": "full",
 }
 
 # run a session and obtain results in dictionaries
-session_results_trace, session_results_summary = run_session(settings, RESET_STORAGE)
+session_results_trace, session_results_summary = run_session(settings, RESET_STORAGE, STORE_PATH)
+
+# the offers are only traced with the "compact" and "full" trace levels
+has_offers = session_results_trace is not None and "actions" in session_results_trace \
+             and not session_results_trace["error"]
 
 # plot trace to html file
-if not session_results_trace["error"]:
+if has_offers:
     plot_trace(session_results_trace, RESULTS_DIR.joinpath("trace_plot.html"))
 
 # write results to file
-with open(RESULTS_DIR.joinpath("session_results_trace.json"), "w", encoding="utf-8") as f:
-    f.write(json.dumps(session_results_trace, indent=2))
+if RESULTS_FORMAT == "columnar" and has_offers:
+    write_table(get_offers_table(session_results_trace), str(RESULTS_DIR.joinpath("session_offers")))
+else:
+    with open(RESULTS_DIR.joinpath("session_results_trace.json"), "w", encoding="utf-8") as f:
+        f.write(json.dumps(session_results_trace, indent=2))
 with open(RESULTS_DIR.joinpath("session_results_summary.json"), "w", encoding="utf-8") as f:
     f.write(json.dumps(session_results_summary, indent=2))
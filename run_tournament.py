@@ -1,3 +1,4 @@
+import glob
 import json
 import os
 import shutil
@@ -5,10 +6,31 @@ from pathlib import Path
 import time
 
 from summary_extractor import extract
+from utils.columnar import get_sessions_table, write_table
 from utils.runners import run_tournament
 
 RESULTS_DIR = Path("results", time.strftime('%Y%m%d-%H%M%S'))
 
+# Number of sessions running in parallel. Each session runs in a process forked from a warm parent process.
+NUM_WORKERS = os.cpu_count()
+
+# Spread the tournament over several machines: every machine runs this script with its own SHARD_INDEX in
+# [0, SHARD_COUNT). Then, combine the shard journals with `python merge_tournament.py <journals> --output <dir>`.
+SHARD_INDEX = int(os.environ.get("SHARD_INDEX", 0))
+SHARD_COUNT = int(os.environ.get("SHARD_COUNT", 1))
+JOURNAL_PATH = RESULTS_DIR.joinpath(
+    "tournament_journal.jsonl" if SHARD_COUNT == 1 else f"tournament_journal_{SHARD_INDEX}_of_{SHARD_COUNT}.jsonl"
+)
+
+# Format of the result files: "json", or "columnar" to write the results as Parquet (CSV if pyarrow is not installed),
+# see utils.columnar.
+RESULTS_FORMAT = "json"
+
+# Profiler mode: time the stages of every session and print their breakdown. With PROFILE_DIR, the sessions also run
+# under cProfile and a flame graph compatible report (profile.collapsed) is written, see utils.profiling.
+PROFILE = False
+PROFILE_DIR = RESULTS_DIR.joinpath("profile") if PROFILE else None
+
 # create results directory if it does not exist
 if not RESULTS_DIR.exists():
     os.makedirs(RESULTS_DIR)
@@ -23,6 +45,13 @@ if STORAGE_DIR.exists():
 #   You need to specify the classpath of 2 agents to start a negotiation. Parameters for the agent can be added as a dict (see example)
 #   You need to specify the preference profiles for both agents. The first profile will be assigned to the first agent.
 #   You need to specify a time deadline (is milliseconds (ms)) we are allowed to negotiate before we end without agreement.
+#   Optionally, a session is killed if it runs "grace_time_ms" longer than its deadline (TIMEOUT) or if it uses more than
+#   "max_memory_mb" memory (OOM).
+#   Optionally, every session and its offers are stored in the SQLite database at "store_path" (utils.sqlite_store).
+#   Optionally, "trace_level" of the sessions ("none", "summary", "compact" or "full"), see utils.runners.run_session.
+#   Optionally, "persistent_storage": True lets the agents learn across the sessions of the tournament in their
+#   "storage_dir". By default, every session starts with an empty storage (storage_dir/session_<index>), whether the
+#   sessions run in parallel (NUM_WORKERS) or not.
 tournament_settings = {
     "agents": [
         {
@@ -53,21 +82,39 @@ tournament_settings = {
         ["domains/domain00/profileA.json", "domains/domain00/profileB.json"],
     ],
     "deadline_time_ms": 10000,
+    "grace_time_ms": 10000,
+    "max_memory_mb": 4096,
 }
 
 # run a session and obtain results in dictionaries
-tournament_steps, tournament_results, tournament_results_summary = run_tournament(tournament_settings)
+# The journals of the previous tournaments are used to dispatch the most expensive sessions first.
+tournament_steps, tournament_results, tournament_results_summary = run_tournament(
+    tournament_settings,
+    NUM_WORKERS,
+    journal_path=JOURNAL_PATH,
+    history=glob.glob("results/*/tournament_journal*.jsonl"),
+    shard_index=SHARD_INDEX,
+    shard_count=SHARD_COUNT,
+    profile=PROFILE,
+    profile_dir=None if PROFILE_DIR is None else str(PROFILE_DIR),
+)
 
-# save the tournament settings for reference
-with open(RESULTS_DIR.joinpath("tournament_steps.json"), "w", encoding="utf-8") as f:
-    f.write(json.dumps(tournament_steps, indent=2))
-# save the tournament results
-with open(RESULTS_DIR.joinpath("tournament_results.json"), "w", encoding="utf-8") as f:
-    f.write(json.dumps(tournament_results, indent=2))
+if RESULTS_FORMAT == "columnar":
+    # save the tournament settings and results as one table, partitioned by domain
+    tournament_results_path = write_table(get_sessions_table(tournament_steps, tournament_results),
+                                          str(RESULTS_DIR.joinpath("tournament_results")))
+else:
+    # save the tournament settings for reference
+    with open(RESULTS_DIR.joinpath("tournament_steps.json"), "w", encoding="utf-8") as f:
+        f.write(json.dumps(tournament_steps, indent=2))
+    # save the tournament results
+    tournament_results_path = RESULTS_DIR.joinpath("tournament_results.json")
+    with open(tournament_results_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(tournament_results, indent=2))
 # save the tournament results summary
 tournament_results_summary.to_csv(RESULTS_DIR.joinpath("tournament_results_summary.csv"))
 
 # Call our extractor for more detailed tournament results
-extract(RESULTS_DIR.joinpath("tournament_results.json"), RESULTS_DIR)
+extract(tournament_results_path, RESULTS_DIR)
 
 print("Tournament ends.")
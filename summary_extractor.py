@@ -1,105 +1,203 @@
+import argparse
 import json
 import os.path
 from pathlib import Path
-from typing import Union
+from typing import Iterable, Iterator, List, Union
 import pandas as pd
 import numpy as np
 
+from utils.columnar import read_table
+
+RESULTS = {"Agreement": "Agreement", "Error": "Error", "Failed": "Failed", "Timeout": "Timeout", "Oom": "OOM"}
+METRICS = {
+    "Utility": "Utility",
+    "OppUtility": "Opp. Utility",
+    "NashProduct": "Nash Product",
+    "SocialWelfare": "Social Welfare",
+    "AgreementUtility": "Agreement Utility",
+    "AgreementOppUtility": "Agreement Opp. Utility",
+}
+
 
 def extract(tournament_results_json: Union[str, Path], save_dir: Union[str, Path]):
     """
         This method extracts some detailed tournament results.
-    :param tournament_results_json: Path of ``tournament_results.json`` file
+    :param tournament_results_json: Path of ``tournament_results.json`` file, or of the columnar
+        ``tournament_results.parquet`` (``.csv``) file of ``utils.columnar``
     :param save_dir: Directory to extract
     :return: Nothing
     """
     if not os.path.exists(save_dir):
         os.mkdir(save_dir)
 
-    rows = []
-    agent_names = set()
-
     # results.csv
-    with open(tournament_results_json, "r") as f:
-        data = json.load(f)
+    if Path(tournament_results_json).suffix in (".parquet", ".csv"):
+        # only the needed columns are read
+        df = read_table(str(tournament_results_json), ["agent_1", "utility_1", "agent_2", "utility_2", "result"])
+        df = pd.DataFrame({"AgentA": df["agent_1"], "AgentAUtility": df["utility_1"], "AgentB": df["agent_2"],
+                           "AgentBUtility": df["utility_2"], "Result": df["result"].str.capitalize()})
+    else:
+        with open(tournament_results_json, "r") as f:
+            df = get_results(json.load(f))
 
-        for session in data:
-            numbers = []
+    df.to_csv(os.path.join(save_dir, "results.csv"), sep=";")
 
-            for key in session:
-                if key.startswith("agent_"):
-                    numbers.append(int(key.split("_")[1]))
+    # Summary
+    summarize(get_stats(df)).to_csv(os.path.join(save_dir, "summary.csv"), sep=";")
 
-            agent_a, agent_b = min(numbers), max(numbers)
 
-            row = {
-                "AgentA": session[f"agent_{agent_a}"],
-                "AgentAUtility": session[f"utility_{agent_a}"],
-                "AgentB": session[f"agent_{agent_b}"],
-                "AgentBUtility": session[f"utility_{agent_b}"],
-                "Result": session["result"].capitalize()
-            }
+def extract_journal(journal_paths: List[Union[str, Path]], save_dir: Union[str, Path], chunk_size: int = 100000):
+    """
+        Streaming version of ``extract`` which reads the tournament journals (``tournament_journal*.jsonl``) directly.
+        The sessions are processed in chunks, only the per-agent sums of each chunk are kept in memory.
+    :param journal_paths: Paths of the journals
+    :param save_dir: Directory to extract
+    :param chunk_size: Number of sessions in a chunk
+    :return: Nothing
+    """
+    if not os.path.exists(save_dir):
+        os.mkdir(save_dir)
 
-            rows.append(row)
+    results_path = os.path.join(save_dir, "results.csv")
+    stats = None
+    num_sessions = 0
 
-            agent_names.add(row["AgentA"])
-            agent_names.add(row["AgentB"])
+    for sessions in read_journals(journal_paths, chunk_size):
+        df = get_results(sessions)
+        df.index += num_sessions
 
-    df = pd.DataFrame(data=rows)
-    df.to_csv(os.path.join(save_dir, "results.csv"), sep=";")
+        # results.csv, appended chunk by chunk
+        df.to_csv(results_path, sep=";", mode="w" if num_sessions == 0 else "a", header=num_sessions == 0)
+
+        chunk_stats = get_stats(df)
+        stats = chunk_stats if stats is None else stats.add(chunk_stats, fill_value=0)
+        num_sessions += len(df)
+
+    if stats is None:
+        get_results([]).to_csv(results_path, sep=";")
+        stats = get_stats(get_results([]))
 
     # Summary
-    summary_rows = []
+    summarize(stats).to_csv(os.path.join(save_dir, "summary.csv"), sep=";")
+
+
+def read_journals(journal_paths: Iterable[Union[str, Path]], chunk_size: int) -> Iterator[List[dict]]:
+    """
+        Read the session summaries of the journals in chunks.
+    :param journal_paths: Paths of the journals
+    :param chunk_size: Number of sessions in a chunk
+    :return: Generator of session summary lists
+    """
+    sessions = []
 
-    for agent_name in agent_names:
-        row = {"Agent": agent_name}
+    for journal_path in journal_paths:
+        with open(journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    sessions.append(json.loads(line)["summary"])
 
-        rows_a = df.loc[df["AgentA"] == agent_name]
-        rows_b = df.loc[df["AgentB"] == agent_name]
+                if len(sessions) == chunk_size:
+                    yield sessions
+                    sessions = []
 
-        utility = rows_a["AgentAUtility"].to_list() + rows_b["AgentBUtility"].to_list()
+    if sessions:
+        yield sessions
 
-        row["Utility Mean"] = np.mean(utility)
-        row["Utility Stdev"] = np.std(utility)
 
-        opp_utility = rows_a["AgentBUtility"].to_list() + rows_b["AgentAUtility"].to_list()
+def get_results(sessions: List[dict]) -> pd.DataFrame:
+    """
+        One row per session: the agent with the lower party number is ``AgentA``.
+    :param sessions: Session summaries
+    :return: Results table of ``results.csv``
+    """
+    rows = []
 
-        row["Opp. Utility Mean"] = np.mean(opp_utility)
-        row["Opp. Utility Stdev"] = np.mean(opp_utility)
+    for session in sessions:
+        numbers = [int(key.split("_")[1]) for key in session if key.startswith("agent_")]
 
-        row["Nash Product Mean"] = np.mean([a * b for a, b in zip(utility, opp_utility)])
-        row["Nash Product Stdev"] = np.std([a * b for a, b in zip(utility, opp_utility)])
+        agent_a, agent_b = min(numbers), max(numbers)
 
-        row["Social Welfare Mean"] = np.mean([a + b for a, b in zip(utility, opp_utility)])
-        row["Social Welfare Stdev"] = np.std([a + b for a, b in zip(utility, opp_utility)])
+        rows.append((session[f"agent_{agent_a}"], session[f"utility_{agent_a}"], session[f"agent_{agent_b}"],
+                     session[f"utility_{agent_b}"], session["result"].capitalize()))
 
-        utility = rows_a.loc[rows_a["Result"] == "Agreement", "AgentAUtility"].to_list() + rows_b.loc[rows_b["Result"] == "Agreement","AgentBUtility"].to_list()
+    return pd.DataFrame(data=rows, columns=["AgentA", "AgentAUtility", "AgentB", "AgentBUtility", "Result"])
+
+
+def get_stats(df: pd.DataFrame) -> pd.DataFrame:
+    """
+        Per-agent sums of the results table, which can be added up over chunks: count, sum and sum of squares of each
+        metric, and the number of sessions per result.
+    :param df: Results table of ``get_results``
+    :return: Sums indexed by agent
+    """
+    # long format, one row per agent and session
+    long = pd.DataFrame({
+        "Agent": pd.concat([df["AgentA"], df["AgentB"]], ignore_index=True),
+        "Utility": pd.concat([df["AgentAUtility"], df["AgentBUtility"]], ignore_index=True).astype(float),
+        "OppUtility": pd.concat([df["AgentBUtility"], df["AgentAUtility"]], ignore_index=True).astype(float),
+        "Result": pd.concat([df["Result"], df["Result"]], ignore_index=True),
+    })
 
-        row["Agreement Utility Mean"] = np.mean(utility)
-        row["Agreement Utility Stdev"] = np.std(utility)
+    agreement = long["Result"] == "Agreement"
 
-        opp_utility = rows_a.loc[rows_a["Result"] == "Agreement", "AgentBUtility"].to_list() + rows_b.loc[
-            rows_b["Result"] == "Agreement", "AgentAUtility"].to_list()
+    long["NashProduct"] = long["Utility"] * long["OppUtility"]
+    long["SocialWelfare"] = long["Utility"] + long["OppUtility"]
+    long["AgreementUtility"] = long["Utility"].where(agreement)
+    long["AgreementOppUtility"] = long["OppUtility"].where(agreement)
 
-        row["Agreement Opp. Utility Mean"] = np.mean(opp_utility)
-        row["Agreement Opp. Utility Stdev"] = np.std(opp_utility)
+    for metric in METRICS:
+        long[f"{metric}Square"] = long[metric] ** 2
 
-        row["Count"] = len(rows_a) + len(rows_b)
+    grouped = long.groupby("Agent")
+
+    stats = grouped.agg(**{f"{metric}Count": (metric, "count") for metric in METRICS},
+                        **{f"{metric}Sum": (metric, "sum") for metric in METRICS},
+                        **{f"{metric}SquareSum": (f"{metric}Square", "sum") for metric in METRICS})
+    stats["Count"] = grouped.size()
+
+    results = pd.crosstab(long["Agent"], long["Result"])
+
+    for result in RESULTS:
+        stats[result] = results[result] if result in results else 0
+
+    return stats
+
+
+def summarize(stats: pd.DataFrame) -> pd.DataFrame:
+    """
+        Summary of ``summary.csv`` from the sums of ``get_stats``: mean and (population) standard deviation of each
+        metric and the number of results per agent.
+    :param stats: Per-agent sums
+    :return: Summary table
+    """
+    summary = pd.DataFrame({"Agent": stats.index})
 
-        results = rows_a.loc[rows_a["Result"] == "Agreement", "Result"].to_list() + rows_b.loc[rows_b["Result"] == "Agreement", "Result"].to_list()
+    for metric, name in METRICS.items():
+        count = stats[f"{metric}Count"].to_numpy(dtype=float)
 
-        row["Agreement"] = len(results)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = stats[f"{metric}Sum"].to_numpy(dtype=float) / count
+            variance = stats[f"{metric}SquareSum"].to_numpy(dtype=float) / count - mean ** 2
 
-        row["AgreementRate"] = float(len(results)) / row["Count"]
+        summary[f"{name} Mean"] = mean
+        summary[f"{name} Stdev"] = np.sqrt(np.maximum(variance, 0.))
 
-        results = rows_a.loc[rows_a["Result"] == "Error", "Result"].to_list() + rows_b.loc[rows_b["Result"] == "Error", "Result"].to_list()
+    summary["Count"] = stats["Count"].to_numpy(dtype=int)
+    summary["Agreement"] = stats["Agreement"].to_numpy(dtype=int)
+    summary["AgreementRate"] = summary["Agreement"] / summary["Count"]
 
-        row["Error"] = len(results)
+    for result, name in RESULTS.items():
+        if result != "Agreement":
+            summary[name] = stats[result].to_numpy(dtype=int)
 
-        results = rows_a.loc[rows_a["Result"] == "Failed", "Result"].to_list() + rows_b.loc[rows_b["Result"] == "Failed", "Result"].to_list()
+    return summary
 
-        row["Failed"] = len(results)
 
-        summary_rows.append(row)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract the detailed results of tournament journals.")
+    parser.add_argument("journals", nargs="+", help="Paths of the tournament journals (tournament_journal*.jsonl)")
+    parser.add_argument("--output", required=True, help="Directory to extract")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="Number of sessions processed at once")
+    args = parser.parse_args()
 
-    pd.DataFrame(data=summary_rows).to_csv(os.path.join(save_dir, "summary.csv"), sep=";")
+    extract_journal(args.journals, args.output, args.chunk_size)
@@ -1,4 +1,7 @@
-from typing import List
+from collections import deque
+from logging.handlers import QueueListener, RotatingFileHandler
+from queue import Queue
+from typing import Deque, Optional
 
 from tudelft_utilities_logging.Reporter import Reporter
 import logging
@@ -7,20 +10,80 @@ import logging
 class BasicReporter(Reporter):
     """
         This Reporter (logger) print only Warnings and Errors.
+
+        The messages below ``level`` are dropped before anything else is done. Only the last ``capacity`` messages are
+        kept in memory (``logs``), so the memory stays flat during long sessions. If a ``file_path`` is given, the
+        messages are also written into a rotating log file by a background thread; a full queue drops the message
+        instead of blocking the agent.
     """
-    logs: List[str]
-    file_path: str
+    logs: Deque[str]
+    file_path: Optional[str]
+    level: int
+    queue_size: int
+    dropped: int
 
-    def __init__(self, file_path: str = "tournament_log.txt"):
+    def __init__(self, file_path: Optional[str] = None, level: int = logging.INFO, capacity: int = 1000,
+                 max_bytes: int = 10 * 1024 * 1024, backup_count: int = 3, queue_size: int = 10000):
+        """
+            Constructor
+        :param file_path: Path of the log file. As a default, no log file.
+        :param level: Minimum level of the messages to keep
+        :param capacity: Number of the most recent messages kept in memory
+        :param max_bytes: Size of the log file before it is rotated
+        :param backup_count: Number of the rotated log files to keep
+        :param queue_size: Maximum number of messages waiting for the background thread
+        """
         self.file_path = file_path
-        self.logs = []
+        self.level = level
+        self.logs = deque(maxlen=capacity)
+        self.queue_size = queue_size
+        self.dropped = 0
+        self.queue = None
+        self.listener = None
+
+        if file_path is not None:
+            handler = RotatingFileHandler(file_path, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+            handler.setFormatter(logging.Formatter("%(levelname)s : %(message)s"))
+
+            self.queue = Queue()
+            self.listener = QueueListener(self.queue, handler)
+            self.listener.start()
 
     def log(self, level:int, msg:str, thrown:BaseException=None):
+        if level < self.level:
+            return
+
         if level >= logging.WARNING:
             print(logging.getLevelName(level), ":", msg)
 
         self.logs.append(msg)
 
-    def save_log(self):
-        with open(self.file_path, "w") as f:
+        if self.queue is not None:
+            if self.queue.qsize() >= self.queue_size:
+                self.dropped += 1
+            else:
+                self.queue.put_nowait(logging.makeLogRecord({"levelno": level, "levelname": logging.getLevelName(level),
+                                                             "msg": msg}))
+
+    def save_log(self, file_path: Optional[str] = None):
+        """
+            Write the messages kept in memory into a file.
+        :param file_path: Path of the file. As a default, ``file_path`` of the reporter.
+        :return: Nothing
+        """
+        with open(file_path or self.file_path or "tournament_log.txt", "w") as f:
             f.write("\n".join(self.logs))
+
+    def close(self):
+        """
+            Write the waiting messages into the log file and stop the background thread.
+        :return: Nothing
+        """
+        if self.listener is not None:
+            self.listener.stop()
+
+            for handler in self.listener.handlers:
+                handler.close()
+
+            self.listener = None
+            self.queue = None
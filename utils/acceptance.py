@@ -0,0 +1,44 @@
+from decimal import Decimal
+from typing import Union
+
+"""
+    Per-turn acceptance context of the ANL 2022 agents (``CompromisingAgent``, ``LearningAgent``, ``SmartAgent`` and
+    ``SuperAgent``).
+
+    The acceptance threshold of these agents depends on the progress (``exp(alpha * progress)``), the utility of the
+    optimal bid and the learned data, but not on the tested bid. The agents compute it once when they receive
+    ``YourTurn``, and their loops over candidate bids compare against the cached float instead of reading the clock
+    and the profile for every candidate.
+"""
+
+
+class AcceptanceContext:
+    """
+        Values of the acceptance test which are fixed during a turn.
+    """
+    progress: float
+    optimal_utility: float
+    threshold: float
+
+    def __init__(self, progress: float, optimal_utility: float, threshold: float):
+        """
+            Constructor
+        :param progress: Progress of the negotiation at the start of the turn
+        :param optimal_utility: Utility of the optimal bid of the agent
+        :param threshold: Minimum utility of an acceptable bid
+        """
+        self.progress = progress
+        self.optimal_utility = optimal_utility
+        self.threshold = threshold
+
+    def accepts(self, utility: Union[float, Decimal]) -> bool:
+        """
+            Acceptance test of a bid.
+        :param utility: Utility of the bid for the agent
+        :return: Whether the utility reaches the threshold
+        """
+        return float(utility) >= self.threshold
+
+    def __repr__(self) -> str:
+        return "AcceptanceContext(progress=%.4f, optimal_utility=%.4f, threshold=%.4f)" % (
+            self.progress, self.optimal_utility, self.threshold)
@@ -0,0 +1,254 @@
+import argparse
+import glob
+import json
+import os
+import re
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import List, Optional
+
+"""
+    Latency benchmark of the agents over domain sizes.
+
+    Every agent plays one session against the same opponent on every domain of the sweep: the domains in ``domains/``
+    and synthetic domains with e.g. 100k and 1M bids (``utils.create_domains``). As a default, the opponent is the
+    ``ReplayAgent`` (a fixed concession curve, or the offers of ``--opponent-trace``), which costs no time itself. Each
+    session runs in a fresh process, so the peak memory and the import and setup costs are measured for this agent
+    only. Per session:
+
+        - ``init_ms``: time of the ``Settings`` inform
+        - ``turn_p50_ms`` and ``turn_p99_ms``: percentiles of the ``YourTurn`` informs
+        - ``peak_rss_mb``: peak resident memory of the process, ``base_rss_mb`` before the session
+        - ``offers_per_s``: offers of the agent per second of the session
+
+    The results are saved as JSON baselines; ``--compare`` prints the ratios to a previous baseline, so regressions can
+    be spotted before a tournament. Usage:
+
+        python -m utils.agent_benchmark --agents agents.hybrid.hybrid_agent.HybridAgent --output baseline.json
+        python -m utils.agent_benchmark --sizes 100000 1000000 --compare baseline.json
+"""
+
+AGENT_CLASS_PATTERN = re.compile(r"^class (\w+)\((?:DefaultParty|TimeDependentAgent)\):", re.MULTILINE)
+DEFAULT_OPPONENT = "agents.replay_agent.replay_agent.ReplayAgent"
+SYNTHETIC_SIZES = (100000, 1000000)
+METRICS = ("init_ms", "turn_p50_ms", "turn_p99_ms", "peak_rss_mb", "offers_per_s")
+
+
+def find_agents(agents_dir: str = "agents") -> List[str]:
+    """
+        Class paths of the agents in a directory, found in the sources without importing them.
+    :param agents_dir: Directory of the agent packages
+    :return: Sorted class paths
+    """
+    class_paths = []
+
+    for path in sorted(glob.glob(os.path.join(agents_dir, "**", "*.py"), recursive=True)):
+        with open(path, "r", encoding="utf-8") as f:
+            class_names = AGENT_CLASS_PATTERN.findall(f.read())
+
+        module_name = os.path.splitext(os.path.normpath(path))[0].replace(os.sep, ".")
+        class_paths.extend(f"{module_name}.{class_name}" for class_name in class_names)
+
+    return class_paths
+
+
+def get_synthetic_domain(size: int, domains_dir: str = "benchmark_domains") -> str:
+    """
+        Directory of a random domain with about ``size`` bids, created once.
+    :param size: Number of bids
+    :param domains_dir: Parent directory of the synthetic domains
+    :return: Directory of the domain
+    """
+    from utils.create_domains import Domain
+
+    name = f"synthetic{size}"
+    domain_dir = os.path.join(domains_dir, name)
+
+    if not os.path.exists(os.path.join(domain_dir, "profileB.json")):
+        Domain.create_random(name, size).to_file(domains_dir)
+
+    return domain_dir
+
+
+def get_peak_rss_mb() -> float:
+    """
+        Peak resident memory of this process.
+    :return: Memory in MB
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+def measure_session(class_path: str, opponent: str, domain_dir: str, deadline_time_ms: int, storage_dir: str,
+                    opponent_parameters: Optional[dict] = None) -> dict:
+    """
+        Run one session of the agent against the opponent and measure it. Called in a fresh process.
+    :param class_path: Class path of the agent
+    :param opponent: Class path of the opponent
+    :param domain_dir: Directory of the domain, the agent gets ``profileA.json``
+    :param deadline_time_ms: Deadline of the session
+    :param storage_dir: Parent directory of the storage of the agents
+    :param opponent_parameters: Parameters of the opponent, e.g. the ``trace`` of the ``ReplayAgent``
+    :return: Measurements of the session
+    """
+    from utils.runners import run_session
+
+    base_rss_mb = get_peak_rss_mb()
+
+    settings = {
+        "agents": [
+            {"class": class_path, "parameters": {"storage_dir": os.path.join(storage_dir, "agent")}},
+            {"class": opponent, "parameters": {"storage_dir": os.path.join(storage_dir, "opponent"),
+                                               **(opponent_parameters or {})}},
+        ],
+        "profiles": [os.path.join(domain_dir, "profileA.json"), os.path.join(domain_dir, "profileB.json")],
+        "deadline_time_ms": deadline_time_ms,
+        "trace_level": "compact",
+    }
+
+    start = time.perf_counter()
+    results_trace, results_summary = run_session(settings)
+    duration = time.perf_counter() - start
+
+    # the agent is the first connection
+    party = results_trace["connections"][0] if results_trace["connections"] else None
+    latency = results_summary.get(f"latency_{party.split('_')[-1]}", {}) if party is not None else {}
+    offers = sum(1 for action in results_trace.get("actions", []) if action.get("Offer", {}).get("actor") == party)
+
+    with open(os.path.join(domain_dir, "profileA.json"), "r", encoding="utf-8") as f:
+        issues_values = json.load(f)["LinearAdditiveUtilitySpace"]["domain"]["issuesValues"]
+
+    domain_size = 1
+    for issue_values in issues_values.values():
+        domain_size *= len(issue_values["values"])
+
+    return {
+        "agent": class_path,
+        "domain": os.path.basename(os.path.normpath(domain_dir)),
+        "domain_size": domain_size,
+        "result": results_summary["result"],
+        "error": results_trace["error"],
+        "init_ms": latency.get("Settings", {}).get("wall_max_ms"),
+        "turn_p50_ms": latency.get("YourTurn", {}).get("wall_p50_ms"),
+        "turn_p99_ms": latency.get("YourTurn", {}).get("wall_p99_ms"),
+        "turns": latency.get("YourTurn", {}).get("count", 0),
+        "base_rss_mb": base_rss_mb,
+        "peak_rss_mb": get_peak_rss_mb(),
+        "offers_per_s": offers / duration,
+        "duration_s": duration,
+    }
+
+
+def run_benchmark(class_paths: List[str], domain_dirs: List[str], opponent: str = DEFAULT_OPPONENT,
+                  deadline_time_ms: int = 10000, opponent_parameters: Optional[dict] = None) -> List[dict]:
+    """
+        Measure every agent on every domain, each session in a fresh process.
+    :param class_paths: Class paths of the agents
+    :param domain_dirs: Directories of the domains
+    :param opponent: Class path of the opponent
+    :param deadline_time_ms: Deadline of the sessions
+    :param opponent_parameters: Parameters of the opponent
+    :return: One result per agent and domain, see ``measure_session``
+    """
+    results = []
+
+    with tempfile.TemporaryDirectory() as storage_dir:
+        for class_path in class_paths:
+            for domain_dir in domain_dirs:
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                    future = executor.submit(measure_session, class_path, opponent, domain_dir, deadline_time_ms,
+                                             storage_dir, opponent_parameters)
+
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {"agent": class_path, "domain": os.path.basename(os.path.normpath(domain_dir)),
+                                  "result": "ERROR", "error": repr(e)}
+
+                results.append(result)
+                print(format_result(result))
+
+    return results
+
+
+def compare(results: List[dict], baseline: List[dict]) -> List[dict]:
+    """
+        Ratios of the metrics to a baseline, for the agents and domains in both.
+    :param results: Current results
+    :param baseline: Results of a previous run
+    :return: One row per agent and domain with ``<metric>_ratio`` (current / baseline)
+    """
+    previous = {(result["agent"], result["domain"]): result for result in baseline}
+    rows = []
+
+    for result in results:
+        base = previous.get((result["agent"], result["domain"]))
+
+        if base is None:
+            continue
+
+        row = {"agent": result["agent"], "domain": result["domain"]}
+        for metric in METRICS:
+            if result.get(metric) is not None and base.get(metric):
+                row[f"{metric}_ratio"] = result[metric] / base[metric]
+        rows.append(row)
+
+    return rows
+
+
+def format_result(result: dict) -> str:
+    """
+        One line of the progress output.
+    :param result: Result of ``measure_session``
+    :return: Formatted line
+    """
+    if result.get("init_ms") is None:
+        return "%-70s %-18s %s" % (result["agent"], result["domain"], result.get("error") or result["result"])
+
+    return "%-70s %-18s init %9.1f ms  turn p50 %8.2f ms  p99 %8.2f ms  peak %7.1f MB  %8.1f offers/s" % (
+        result["agent"], result["domain"], result["init_ms"], result["turn_p50_ms"] or 0., result["turn_p99_ms"] or 0.,
+        result["peak_rss_mb"], result["offers_per_s"])
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the latency and the memory of the agents over domain sizes.")
+    parser.add_argument("--agents", nargs="+", default=None,
+                        help="Class paths of the agents, as a default all agents in agents/")
+    parser.add_argument("--opponent", default=DEFAULT_OPPONENT, help="Class path of the opponent")
+    parser.add_argument("--opponent-trace", default=None,
+                        help="Session trace replayed by the ReplayAgent instead of its concession curve")
+    parser.add_argument("--domains", nargs="*", default=None,
+                        help="Directories of the domains, as a default all domains in domains/")
+    parser.add_argument("--sizes", nargs="*", type=int, default=list(SYNTHETIC_SIZES),
+                        help="Sizes of the synthetic domains")
+    parser.add_argument("--deadline", type=int, default=10000, help="Deadline of the sessions in ms")
+    parser.add_argument("--output", default=None, help="JSON file for the results (baseline)")
+    parser.add_argument("--compare", default=None, help="JSON file of a previous baseline")
+    args = parser.parse_args(argv)
+
+    class_paths = args.agents if args.agents is not None else [class_path for class_path in find_agents()
+                                                                if class_path != args.opponent]
+    domain_dirs = args.domains if args.domains is not None else sorted(glob.glob(os.path.join("domains", "domain*")))
+    domain_dirs = domain_dirs + [get_synthetic_domain(size) for size in args.sizes]
+
+    opponent_parameters = {"trace": args.opponent_trace} if args.opponent_trace is not None else None
+
+    results = run_benchmark(class_paths, domain_dirs, args.opponent, args.deadline, opponent_parameters)
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+        for row in compare(results, baseline):
+            ratios = "  ".join(f"{key[:-6]} x{value:.2f}" for key, value in row.items() if key.endswith("_ratio"))
+            print("%-70s %-18s %s" % (row["agent"], row["domain"], ratios))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import heapq
+import math
+from itertools import count
+from typing import Iterator, List, Optional, Tuple
+
+from geniusweb.issuevalue.Bid import Bid
+from geniusweb.profile.utilityspace.LinearAdditive import LinearAdditive
+
+from utils.frequency_model import BidEncoder
+from utils.lazy_import import lazy_import
+
+np = lazy_import("numpy")
+
+"""
+    Hamming-distance neighborhood of a bid, e.g. the bids near the last offer of the opponent for trade-off
+    (similarity-based) bidding.
+
+    The neighbors of a bid within distance ``k`` (at most ``k`` issues changed) are enumerated in descending own
+    utility without scanning the bid space. A neighbor differs from the center by the utility deltas of its changed
+    issues, so the enumeration is a best-first search over the issues: each node fixes the value of one more issue
+    (kept, or changed while changes are left), and its bound is the exact utility so far plus the best utility which the
+    remaining issues can add with the remaining changes. The children of a node are generated lazily in the order of
+    their bounds, so the heap only grows with the number of enumerated neighbors. With a maximum utility, the nodes whose
+    least reachable utility (the utility so far plus the worst the remaining issues can add) is above it are pruned, so
+    a window [min_utility, max_utility] does not enumerate the neighbors above it:
+
+        index = NeighborhoodIndex(profile)
+        for bid, utility in index.get_neighbors(last_received_bid, k=2, min_utility=0.7, max_utility=0.8):
+            ...
+"""
+
+
+class NeighborhoodIndex:
+    """
+        Per-issue utility deltas of a LinearAdditive profile, sorted, to enumerate the neighbors of bids.
+    """
+    encoder: BidEncoder
+    tables: List["np.ndarray"]
+    order: List["np.ndarray"]
+
+    def __init__(self, space: LinearAdditive):
+        """
+            Constructor
+        :param space: Own profile
+        """
+        self.encoder = BidEncoder(space.getDomain())
+        self.tables = self.encoder.get_utility_tables(space)
+        # value indices of every issue by descending weighted utility
+        self.order = [np.argsort(-table, kind="stable") for table in self.tables]
+
+    def get_utility(self, row: "np.ndarray") -> float:
+        """
+            Float utility of an encoded bid.
+        :param row: Value indices
+        :return: Utility
+        """
+        return float(sum(table[index] for table, index in zip(self.tables, row)))
+
+    @staticmethod
+    def get_distance(first: Bid, second: Bid) -> int:
+        """
+            Hamming distance of two bids.
+        :param first: First bid
+        :param second: Second bid
+        :return: Number of issues with different values
+        """
+        return sum(1 for issue in first.getIssues() if first.getValue(issue) != second.getValue(issue))
+
+    def get_neighbors(self, bid: Bid, k: int, min_utility: float = -math.inf, limit: Optional[int] = None,
+                      max_utility: float = math.inf) -> Iterator[Tuple[Bid, float]]:
+        """
+            Bids within Hamming distance ``k`` of a bid (including itself), by descending own utility.
+        :param bid: Center, e.g. the last offer of the opponent
+        :param k: Maximum number of changed issues
+        :param min_utility: The enumeration stops below this utility
+        :param limit: Maximum number of bids. As a default, all neighbors.
+        :param max_utility: The neighbors above this utility are skipped
+        :return: Iterator of (bid, float utility)
+        """
+        for row, utility, _ in self.get_neighbor_rows(self.encoder.encode(bid), k, min_utility, limit, max_utility):
+            yield self.encoder.decode(row), utility
+
+    def get_neighbor_rows(self, center: "np.ndarray", k: int, min_utility: float = -math.inf,
+                          limit: Optional[int] = None,
+                          max_utility: float = math.inf) -> Iterator[Tuple["np.ndarray", float, int]]:
+        """
+            Encoded bids within Hamming distance ``k`` of an encoded bid, by descending own utility.
+        :param center: Value indices of the center
+        :param k: Maximum number of changed issues
+        :param min_utility: The enumeration stops below this utility
+        :param limit: Maximum number of bids. As a default, all neighbors.
+        :param max_utility: The neighbors above this utility are skipped, and so are the nodes which can only lead to
+            such neighbors
+        :return: Iterator of (value indices, float utility, distance)
+        """
+        num_issues = len(self.tables)
+        k = max(0, min(k, num_issues))
+
+        # deltas[i]: (delta, value index) of the other values of issue i, by descending delta
+        deltas = []
+        for table, order, value in zip(self.tables, self.order, center):
+            deltas.append([(float(table[index] - table[value]), int(index)) for index in order if index != value])
+
+        # best[i][b]: the most the issues i.. can add with b changes
+        best = [[0.] * (k + 1) for _ in range(num_issues + 1)]
+        for i in range(num_issues - 1, -1, -1):
+            gain = max(deltas[i][0][0], 0.) if deltas[i] else 0.
+            for b in range(k + 1):
+                best[i][b] = max(best[i + 1][b], gain + best[i + 1][b - 1] if b > 0 else 0.)
+
+        # worst[i][b]: the least the issues i.. can add with b changes
+        worst = [[0.] * (k + 1) for _ in range(num_issues + 1)]
+        for i in range(num_issues - 1, -1, -1):
+            loss = min(deltas[i][-1][0], 0.) if deltas[i] else 0.
+            for b in range(k + 1):
+                worst[i][b] = min(worst[i + 1][b], loss + worst[i + 1][b - 1] if b > 0 else 0.)
+
+        # keep[i][b]: rank of keeping the value of issue i among its changes, by bound. Keeping saves a change.
+        keep = [[sum(1 for delta, _ in deltas[i] if delta + best[i + 1][b - 1] > best[i + 1][b]) if b > 0 else 0
+                 for b in range(k + 1)] for i in range(num_issues)]
+
+        base = self.get_utility(center)
+
+        def get_option(i: int, budget: int, rank: int) -> Optional[Tuple[float, float, int, int]]:
+            # option of issue i at a rank of the bound order: (bound, delta, value index or -1 to keep, changes left)
+            position = keep[i][budget] if budget > 0 else 0
+
+            if rank == position:
+                return best[i + 1][budget], 0., -1, budget
+
+            index = rank if rank < position else rank - 1
+            if budget == 0 or index >= len(deltas[i]):
+                return None
+
+            delta, value = deltas[i][index]
+            return delta + best[i + 1][budget - 1], delta, value, budget - 1
+
+        # node: (-bound, tie, issue, rank, delta of the parent, changes left of the parent, changes of the parent)
+        tie = count()
+        heap = [(-(base + best[0][k]), next(tie), 0, 0, 0., k, ())]
+        found = 0
+
+        while heap:
+            negative_bound, _, i, rank, delta, budget, changes = heapq.heappop(heap)
+
+            if -negative_bound < min_utility - 1e-12:
+                return
+
+            option = get_option(i, budget, rank)
+
+            # the next sibling has a lower or equal bound
+            sibling = get_option(i, budget, rank + 1)
+            if sibling is not None:
+                heapq.heappush(heap, (-(base + delta + sibling[0]), next(tie), i, rank + 1, delta, budget, changes))
+
+            _, option_delta, value, left = option
+            node_delta = delta + option_delta
+            node_changes = changes if value < 0 else changes + ((i, value),)
+
+            # every neighbor below this node is above the maximum utility
+            if base + node_delta + worst[i + 1][left] > max_utility + 1e-12:
+                continue
+
+            if i + 1 < num_issues:
+                first = get_option(i + 1, left, 0)
+                heapq.heappush(heap, (-(base + node_delta + first[0]), next(tie), i + 1, 0, node_delta, left,
+                                      node_changes))
+                continue
+
+            row = np.array(center, copy=True)
+            for issue, index in node_changes:
+                row[issue] = index
+
+            yield row, base + node_delta, len(node_changes)
+
+            found += 1
+            if limit is not None and found >= limit:
+                return
@@ -0,0 +1,179 @@
+import json
+import os
+from typing import Dict, List, Optional
+
+from utils.lazy_import import lazy_import
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+pd = lazy_import("pandas")
+
+"""
+    Columnar output of the session traces and the tournament results.
+
+    The tables are written as Parquet if ``pyarrow`` is installed: the rows are sorted by domain and every domain is
+    written as its own row group, so the readers can skip the other domains and only decode the columns they need.
+    Without ``pyarrow``, the same tables are written as CSV.
+
+    Tables:
+        - Offers of a session (``get_offers_table``): one row per offer or accept with ``round``, ``actor``,
+          ``action``, the utilities of both parties and the JSON encoded bid.
+        - Sessions of a tournament (``get_sessions_table``): one row per session with its domain, agents, utilities and
+          result.
+"""
+
+
+def get_domain(profile_path: str) -> str:
+    """
+        Name of the domain of a profile, i.e. the name of its directory.
+    :param profile_path: Path of the profile file
+    :return: Domain name
+    """
+    return os.path.basename(os.path.dirname(profile_path.split(":")[-1]))
+
+
+def get_offers_table(results_trace: dict) -> Dict[str, list]:
+    """
+        Offers and accepts of a session trace, as columns.
+    :param results_trace: Session trace of ``run_session``
+    :return: Columns ``domain, round, actor, action, party_1, utility_1, party_2, utility_2, bid``
+    """
+    parties = sorted(results_trace["connections"], key=lambda party: int(party.rsplit("_", 1)[-1]))
+    domain = get_domain(results_trace["partyprofiles"][parties[0]]["profile"])
+
+    table = {"domain": [], "round": [], "actor": [], "action": [], "party_1": [], "utility_1": [], "party_2": [],
+             "utility_2": [], "bid": []}
+
+    for index, action in enumerate(results_trace["actions"], 1):
+        for action_type in ("Offer", "Accept"):
+            if action_type in action:
+                offer = action[action_type]
+
+                table["domain"].append(domain)
+                table["round"].append(index)
+                table["actor"].append(offer["actor"])
+                table["action"].append(action_type)
+                table["bid"].append(json.dumps(offer["bid"]["issuevalues"], sort_keys=True))
+
+                for position, party in enumerate(parties, 1):
+                    table[f"party_{position}"].append(party)
+                    table[f"utility_{position}"].append(offer["utilities"][party])
+
+    return table
+
+
+def get_sessions_table(tournament_steps: List[dict], tournament_results: List[dict]) -> Dict[str, list]:
+    """
+        Session summaries of a tournament, as columns. The agent with the lower party number is ``agent_1``. Nested
+        values of the summaries (e.g. the latencies) are not included.
+    :param tournament_steps: Session settings
+    :param tournament_results: Session summaries, in the same order
+    :return: Columns ``domain, profile_1, profile_2, agent_1, utility_1, agent_2, utility_2`` and the other summary
+        values
+    """
+    keys = []
+    for results_summary in tournament_results:
+        for key, value in results_summary.items():
+            if key not in keys and not key.startswith(("agent_", "utility_")) and not isinstance(value, dict):
+                keys.append(key)
+
+    table = {key: [] for key in ["domain", "profile_1", "profile_2", "agent_1", "utility_1", "agent_2",
+                                 "utility_2"] + keys}
+
+    for settings, results_summary in zip(tournament_steps, tournament_results):
+        numbers = sorted(int(key.split("_")[1]) for key in results_summary if key.startswith("agent_"))
+
+        table["domain"].append(get_domain(settings["profiles"][0]))
+
+        for position, number in enumerate(numbers, 1):
+            table[f"profile_{position}"].append(settings["profiles"][position - 1])
+            table[f"agent_{position}"].append(results_summary[f"agent_{number}"])
+            table[f"utility_{position}"].append(float(results_summary[f"utility_{number}"]))
+
+        for key in keys:
+            table[key].append(results_summary.get(key))
+
+    return table
+
+
+def write_table(table: Dict[str, list], path: str) -> str:
+    """
+        Write a table as Parquet with one row group per domain, or as CSV if ``pyarrow`` is not installed.
+    :param table: Columns with a ``domain`` column
+    :param path: Path of the file without extension
+    :return: Path of the written file
+    """
+    df = pd.DataFrame(table)
+    df = df.sort_values("domain", kind="stable").reset_index(drop=True)
+
+    if pq is None:
+        df.to_csv(f"{path}.csv", index=False)
+
+        return f"{path}.csv"
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+
+    with pq.ParquetWriter(f"{path}.parquet", schema) as writer:
+        for _, domain_df in df.groupby("domain", sort=False):
+            writer.write_table(pa.Table.from_pandas(domain_df, schema=schema, preserve_index=False))
+
+    return f"{path}.parquet"
+
+
+def read_table(path: str, columns: Optional[List[str]] = None, domains: Optional[List[str]] = None) -> "pd.DataFrame":
+    """
+        Read a table of ``write_table``. Only the given columns are decoded; with Parquet, the row groups of the other
+        domains are skipped.
+    :param path: Path of the file, with or without extension
+    :param columns: Columns to read. As a default, all columns.
+    :param domains: Domains to read. As a default, all domains.
+    :return: Table
+    """
+    base, extension = os.path.splitext(path)
+
+    if extension not in (".parquet", ".csv"):
+        base, extension = path, ".parquet" if os.path.exists(f"{path}.parquet") else ".csv"
+
+    if extension == ".parquet":
+        if pq is None:
+            raise ImportError("pyarrow is required to read %s.parquet" % base)
+
+        filters = [("domain", "in", list(domains))] if domains is not None else None
+
+        return pq.read_table(f"{base}.parquet", columns=columns, filters=filters).to_pandas()
+
+    if domains is not None and columns is not None and "domain" not in columns:
+        df = pd.read_csv(f"{base}.csv", usecols=columns + ["domain"])
+
+        return df.loc[df["domain"].isin(domains), columns].reset_index(drop=True)
+
+    df = pd.read_csv(f"{base}.csv", usecols=columns)
+
+    if domains is not None:
+        df = df.loc[df["domain"].isin(domains)].reset_index(drop=True)
+
+    return df
+
+
+def get_trace(offers: "pd.DataFrame") -> dict:
+    """
+        Session trace in the format of ``run_session`` (only the actions) from an offers table, e.g. for
+        ``plot_trace``.
+    :param offers: Offers of a session
+    :return: Session trace with ``actions``
+    """
+    actions = []
+
+    for row in offers.itertuples(index=False):
+        actions.append({row.action: {
+            "actor": row.actor,
+            "bid": {"issuevalues": json.loads(row.bid)},
+            "utilities": {row.party_1: row.utility_1, row.party_2: row.utility_2},
+        }})
+
+    return {"actions": actions}
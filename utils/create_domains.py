@@ -130,8 +130,9 @@ class Domain:
         self.visualisation = visualisation
 
     @classmethod
-    def create_random(cls, name):
-        domain_size = randint(200, 10000)
+    def create_random(cls, name, domain_size=None):
+        if domain_size is None:
+            domain_size = randint(200, 10000)
 
         while True:
             num_issues = randint(4, 10)
@@ -145,9 +146,12 @@ class Domain:
 
         issuesValues = {}
         for issue, num_values in zip(issues, values_per_issue):
-            values = {"values": [f"value{x}" for x in ascii_uppercase[:num_values]]}
+            values = {"values": [f"value{x}" for x in range(num_values)]}
             issuesValues[f"issue{issue}"] = values
 
+        size = np.prod([len(values["values"]) for values in issuesValues.values()])
+        assert abs(domain_size - size) < (0.1 * domain_size), f"domain of {size} bids instead of {domain_size}"
+
         domain = {"name": name, "issuesValues": issuesValues}
         profile_A = Profile.create_random(domain, "profileA")
         profile_B = Profile.create_random(domain, "profileB")
@@ -0,0 +1,239 @@
+import hashlib
+import json
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Iterator, List, Optional
+
+from geniusweb.issuevalue.Bid import Bid
+from geniusweb.profile.utilityspace.LinearAdditive import LinearAdditive
+from pyson.ObjectMapper import ObjectMapper
+from tudelft.utilities.immutablelist.ImmutableList import ImmutableList
+
+from utils.lazy_import import lazy_import
+
+np = lazy_import("numpy")
+
+CACHE_SIZE = 8          # Number of profiles of which the sorted utilities are kept in the process
+EPSILON = 1e-9          # Margin of the float search, covers the rounding of the float utilities
+
+"""
+    Shared ExtendedUtilSpace of the time-dependent agents.
+
+    Instead of ``BidsWithUtility``, the utilities of all bids are computed once as a float array (one broadcast sum over
+    the weighted issue utilities) and sorted. ``getBids`` is then a binary search on this array, and the bids of the
+    slice are only decoded when they are accessed. The sorted utilities are cached per profile content, so the
+    following sessions with the same profile in the same process skip the computation. The ``SessionPool`` builds them
+    for the tournament profiles before forking (``preload_sorted_bids``), so the sessions inherit them.
+"""
+
+_cache: "OrderedDict[str, SortedBids]" = OrderedDict()
+_preloaded: "dict[str, SortedBids]" = {}
+
+
+class SortedBids:
+    """
+        All bids of a LinearAdditive profile, sorted by utility. A bid is identified by its index in the cartesian
+        product of the issue values, the last issue varying fastest.
+    """
+    issues: List[str]
+    values: list
+    utilities: "np.ndarray"
+    order: "np.ndarray"
+
+    def __init__(self, space: LinearAdditive):
+        domain = space.getDomain()
+
+        self.issues = sorted(domain.getIssues())
+        self.values = [list(domain.getValues(issue)) for issue in self.issues]
+
+        utilities = np.zeros(1)
+        for issue, values in zip(self.issues, self.values):
+            weight = float(space.getWeight(issue))
+            value_utilities = space.getUtilities()[issue]
+            issue_utilities = np.array([weight * float(value_utilities.getUtility(value)) for value in values])
+
+            utilities = (utilities[:, None] + issue_utilities[None, :]).ravel()
+
+        self.order = np.argsort(utilities, kind="stable")
+        self.utilities = utilities[self.order]
+
+    def get_bid(self, index: int) -> Bid:
+        """
+            Decode a bid from its index.
+        :param index: Index in the cartesian product
+        :return: Bid
+        """
+        issue_values = {}
+        for issue, values in zip(reversed(self.issues), reversed(self.values)):
+            index, value_index = divmod(index, len(values))
+            issue_values[issue] = values[value_index]
+
+        return Bid(issue_values)
+
+    def search(self, low: float, high: float) -> "np.ndarray":
+        """
+            Indices of the bids with a utility in ``[low, high]``, with a margin of ``EPSILON``.
+        :param low: Lower bound
+        :param high: Upper bound
+        :return: Bid indices
+        """
+        start = np.searchsorted(self.utilities, low - EPSILON, side="left")
+        end = np.searchsorted(self.utilities, high + EPSILON, side="right")
+
+        return self.order[start:end]
+
+
+class BidList(ImmutableList[Bid]):
+    """
+        Bids of a ``SortedBids`` slice, decoded on access.
+    """
+
+    def __init__(self, bids: SortedBids, indices: "np.ndarray"):
+        self._bids = bids
+        self._indices = indices
+
+    def get(self, index: int) -> Bid:
+        return self._bids.get_bid(int(self._indices[index]))
+
+    def size(self) -> int:
+        return len(self._indices)
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+    def __iter__(self) -> Iterator[Bid]:
+        return (self._bids.get_bid(int(index)) for index in self._indices)
+
+    def __repr__(self) -> str:
+        return "BidList(%d bids)" % len(self._indices)
+
+
+def get_content_hash(space: LinearAdditive) -> str:
+    """
+        Hash of the serialized profile, equal for the same profile loaded in different sessions.
+    :param space: Profile
+    :return: Hex digest
+    """
+    content = json.dumps(ObjectMapper().toJson(space), sort_keys=True)
+
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def get_sorted_bids(space: LinearAdditive) -> SortedBids:
+    """
+        Sorted bids of a profile, from the cache of the process if the same profile was used before.
+    :param space: Profile
+    :return: Sorted bids
+    """
+    key = get_content_hash(space)
+
+    if key in _preloaded:
+        return _preloaded[key]
+
+    if key in _cache:
+        _cache.move_to_end(key)
+    else:
+        _cache[key] = SortedBids(space)
+
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    return _cache[key]
+
+
+def preload_sorted_bids(space: LinearAdditive) -> SortedBids:
+    """
+        Sort the bids of a profile and keep them for the lifetime of the process, outside of the ``CACHE_SIZE`` limit.
+    :param space: Profile
+    :return: Sorted bids
+    """
+    key = get_content_hash(space)
+
+    if key not in _preloaded:
+        _preloaded[key] = _cache.pop(key, None) or SortedBids(space)
+
+    return _preloaded[key]
+
+
+class ExtendedUtilSpace:
+    """
+    Inner class for TimeDependentParty, made public for testing purposes. This
+    class may change in the future, use at your own risk.
+    """
+
+    def __init__(self, space: LinearAdditive, exact: bool = False):
+        """
+        @param space the profile
+        @param exact if true, the bids found with the float utilities are
+                     verified with the exact Decimal utilities of the profile
+        """
+        self._utilspace = space
+        self._exact = exact
+        self._bids = get_sorted_bids(space)
+        self._computeMinMax()
+        self._tolerance = self._computeTolerance()
+
+    def _computeMinMax(self):
+        """
+        Computes the fields minutil and maxUtil, from the worst and the best
+        bid of the sorted utilities.
+        """
+        self._minUtil = self._utilspace.getUtility(self._bids.get_bid(int(self._bids.order[0])))
+        self._maxUtil = self._utilspace.getUtility(self._bids.get_bid(int(self._bids.order[-1])))
+
+        rvbid = self._utilspace.getReservationBid()
+        if rvbid != None:
+            rv = self._utilspace.getUtility(rvbid)
+            if rv > self._minUtil:
+                self._minUtil = rv
+
+    def _computeTolerance(self) -> Decimal:
+        """
+        Tolerance is the Interval we need when searching bids. When we are close
+        to the maximum utility, this value has to be the distance between the
+        best and one-but-best utility.
+
+        @return the minimum tolerance required, which is the minimum difference
+                between the weighted utility of the best and one-but-best issue
+                value.
+        """
+        tolerance = Decimal(1)
+        for issue, values in zip(self._bids.issues, self._bids.values):
+            if len(values) > 1:
+                # we have at least 2 values.
+                weight = self._utilspace.getWeight(issue)
+                value_utilities = self._utilspace.getUtilities()[issue]
+                weighted = sorted((weight * value_utilities.getUtility(value) for value in values), reverse=True)
+                tolerance = min(tolerance, weighted[0] - weighted[1])
+        return tolerance
+
+    def getMin(self) -> Decimal:
+        return self._minUtil
+
+    def getMax(self) -> Decimal:
+        return self._maxUtil
+
+    def getBids(self, utilityGoal: Decimal) -> ImmutableList[Bid]:
+        """
+        @param utilityGoal the requested utility
+        @return bids with utility inside [utilitygoal-{@link #tolerance},
+                utilitygoal]
+        """
+        return self.getBidsIn(utilityGoal - self._tolerance, utilityGoal)
+
+    def getBidsIn(self, low: Decimal, high: Decimal, exact: Optional[bool] = None) -> ImmutableList[Bid]:
+        """
+        @param low   the minimum utility
+        @param high  the maximum utility
+        @param exact verify the utilities with the Decimal utilities of the
+                     profile, as a default the option of the constructor
+        @return bids with utility inside [low, high]
+        """
+        indices = self._bids.search(float(low), float(high))
+
+        if self._exact if exact is None else exact:
+            indices = np.array([index for index in indices
+                                if low <= self._utilspace.getUtility(self._bids.get_bid(int(index))) <= high],
+                               dtype=int)
+
+        return BidList(self._bids, indices)
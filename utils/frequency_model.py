@@ -0,0 +1,185 @@
+from typing import List, Optional
+
+from geniusweb.issuevalue.Bid import Bid
+from geniusweb.issuevalue.Domain import Domain
+from geniusweb.profile.utilityspace.LinearAdditive import LinearAdditive
+
+from utils.lazy_import import lazy_import
+
+np = lazy_import("numpy")
+
+"""
+    Array-backed frequency opponent model of the ANL 2022 agents (``CompromisingAgent``, ``LearningAgent`` and
+    ``SuperAgent``).
+
+    A bid is encoded as a row of value indices, one column per issue. The value counts of the opponent offers are kept as
+    one integer array per issue, and the estimated opponent utility of many encoded bids is evaluated at once:
+
+        value(bid) = sum_i w_i * count_i[v_i] / max(1, max(count_i)) / sum_i w_i
+        w_i = 1 / sqrt((sum_v (count_i[v] - mean(count_i)) ^ 2 + 0.1) / |values_i|)
+
+    This is the estimate of the former ``calcOpValue`` / ``calc_op_value`` of these agents. The per-issue terms are
+    recomputed only after an update, so the sampling loops near the deadline can score thousands of random bids per
+    turn with a few array lookups.
+"""
+
+
+class BidEncoder:
+    """
+        Bids of a domain as rows of value indices, the issues in sorted order.
+    """
+    issues: List[str]
+    values: list
+    sizes: "np.ndarray"
+
+    def __init__(self, domain: Domain):
+        self.issues = sorted(domain.getIssues())
+        self.values = [list(domain.getValues(issue)) for issue in self.issues]
+        self.sizes = np.array([len(values) for values in self.values])
+
+        self._indices = [{value: index for index, value in enumerate(values)} for values in self.values]
+
+    def encode(self, bid: Bid) -> "np.ndarray":
+        """
+            Encode a bid.
+        :param bid: Complete bid of the domain
+        :return: Value indices
+        """
+        return np.array([indices[bid.getValue(issue)] for issue, indices in zip(self.issues, self._indices)])
+
+    def encode_all(self, bids: List[Bid]) -> "np.ndarray":
+        """
+            Encode many bids.
+        :param bids: Complete bids of the domain
+        :return: One row of value indices per bid
+        """
+        rows = np.empty((len(bids), len(self.issues)), dtype=int)
+
+        for column, (issue, indices) in enumerate(zip(self.issues, self._indices)):
+            rows[:, column] = [indices[bid.getValue(issue)] for bid in bids]
+
+        return rows
+
+    def decode(self, row: "np.ndarray") -> Bid:
+        """
+            Decode a bid.
+        :param row: Value indices
+        :return: Bid
+        """
+        return Bid({issue: values[int(index)] for issue, values, index in zip(self.issues, self.values, row)})
+
+    def sample(self, n: int, rng: Optional["np.random.Generator"] = None) -> "np.ndarray":
+        """
+            Uniformly random bids of the domain.
+        :param n: Number of bids
+        :param rng: Random generator, as a default the global one of numpy
+        :return: One row of value indices per bid
+        """
+        if rng is None:
+            return np.random.randint(0, self.sizes, size=(n, len(self.issues)))
+
+        return rng.integers(0, self.sizes, size=(n, len(self.issues)))
+
+    def get_utility_tables(self, space: LinearAdditive) -> List["np.ndarray"]:
+        """
+            Weighted value utilities of a profile per issue, for ``get_utilities``.
+        :param space: Profile of the domain
+        :return: One float array per issue
+        """
+        tables = []
+
+        for issue, values in zip(self.issues, self.values):
+            weight = float(space.getWeight(issue))
+            value_utilities = space.getUtilities()[issue]
+            tables.append(np.array([weight * float(value_utilities.getUtility(value)) for value in values]))
+
+        return tables
+
+    @staticmethod
+    def get_utilities(tables: List["np.ndarray"], rows: "np.ndarray") -> "np.ndarray":
+        """
+            Float utilities of encoded bids.
+        :param tables: Utility tables of ``get_utility_tables``
+        :param rows: Encoded bids
+        :return: One utility per bid
+        """
+        utilities = np.zeros(len(rows))
+
+        for column, table in enumerate(tables):
+            utilities += table[rows[:, column]]
+
+        return utilities
+
+
+class FrequencyModel:
+    """
+        Value counts of the opponent offers, see the module documentation.
+    """
+    encoder: BidEncoder
+    counts: List["np.ndarray"]
+
+    def __init__(self, encoder: BidEncoder):
+        self.encoder = encoder
+        self.counts = [np.zeros(size, dtype=int) for size in encoder.sizes]
+
+        self._tables = None
+
+    def update(self, bid: Optional[Bid]):
+        """
+            Count the values of an opponent offer.
+        :param bid: Offer, ignored if None
+        :return: Nothing
+        """
+        if bid is None:
+            return
+
+        for counts, index in zip(self.counts, self.encoder.encode(bid)):
+            counts[index] += 1
+
+        self._tables = None
+
+    def clear(self):
+        """
+            Forget all offers.
+        :return: Nothing
+        """
+        for counts in self.counts:
+            counts[:] = 0
+
+        self._tables = None
+
+    def get_tables(self) -> List["np.ndarray"]:
+        """
+            Weighted and normalized value estimates per issue, recomputed only after an update.
+        :return: One float array per issue, the estimate of a bid is the sum of its entries
+        """
+        if self._tables is None:
+            value_utilities = []
+            weights = []
+
+            for counts in self.counts:
+                value_utilities.append(counts / max(1, int(counts.max())))
+                weights.append(1. / np.sqrt((np.sum((counts - counts.mean()) ** 2) + 0.1) / len(counts)))
+
+            total_weight = sum(weights)
+            self._tables = [utilities * weight / total_weight for utilities, weight in zip(value_utilities, weights)]
+
+        return self._tables
+
+    def get_value(self, bid: Bid) -> float:
+        """
+            Estimated opponent utility of a bid.
+        :param bid: Complete bid of the domain
+        :return: Estimate in [0, 1]
+        """
+        row = self.encoder.encode(bid)
+
+        return float(sum(table[index] for table, index in zip(self.get_tables(), row)))
+
+    def get_values(self, rows: "np.ndarray") -> "np.ndarray":
+        """
+            Estimated opponent utilities of encoded bids.
+        :param rows: Encoded bids
+        :return: One estimate per bid
+        """
+        return BidEncoder.get_utilities(self.get_tables(), rows)
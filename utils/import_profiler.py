@@ -0,0 +1,117 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import List
+
+"""
+    Import-time measurement for agent class paths.
+
+    Every class path is imported in a fresh interpreter with ``python -X importtime`` so that the cost of each module
+    is isolated from the others. Usage:
+
+        python -m utils.import_profiler agents.hybrid.hybrid_agent.HybridAgent --top 15
+"""
+
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def measure_import(class_path: str, python: str = sys.executable) -> dict:
+    """
+        Import the module of the given class path in a fresh interpreter and collect per-module import costs.
+    :param class_path: Class path of the agent, e.g. ``agents.hybrid.hybrid_agent.HybridAgent``
+    :param python: Python executable to use
+    :return: Dictionary with ``class``, ``total_ms`` (wall-clock of the interpreter), ``import_ms`` (cumulative import
+        cost of the agent module) and ``modules`` (list of per-module costs, sorted by cumulative time)
+    """
+    module_name, class_name = class_path.rsplit(".", 1)
+    code = "import %s; getattr(%s, %r)" % (module_name, module_name, class_name)
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([os.getcwd()] + ([env["PYTHONPATH"]] if "PYTHONPATH" in env else []))
+
+    start = time.perf_counter()
+    process = subprocess.run([python, "-X", "importtime", "-c", code], capture_output=True, text=True, env=env)
+    total_ms = (time.perf_counter() - start) * 1000.
+
+    modules = []
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+
+        if match is None:
+            continue
+
+        self_us, cumulative_us, indent, name = match.groups()
+        modules.append({
+            "module": name,
+            "self_ms": int(self_us) / 1000.,
+            "cumulative_ms": int(cumulative_us) / 1000.,
+            "depth": len(indent) // 2,
+        })
+
+    # the agent package and its parents are imported one after another at the top level
+    root = module_name.split(".")[0]
+    top_level = [module for module in modules
+                 if module["depth"] == 0 and (module["module"] == root or module["module"].startswith(root + "."))]
+
+    modules.sort(key=lambda module: module["cumulative_ms"], reverse=True)
+
+    return {
+        "class": class_path,
+        "error": process.stderr.strip().splitlines()[-1] if process.returncode != 0 else None,
+        "total_ms": total_ms,
+        "import_ms": sum(module["cumulative_ms"] for module in top_level),
+        "modules": modules,
+    }
+
+
+def measure_imports(class_paths: List[str], python: str = sys.executable) -> List[dict]:
+    """
+        Measure the import cost of several agent class paths, each one in a separate interpreter.
+    :param class_paths: List of agent class paths
+    :param python: Python executable to use
+    :return: List of results of ``measure_import``, sorted by import time (descending)
+    """
+    results = [measure_import(class_path, python) for class_path in class_paths]
+
+    results.sort(key=lambda result: result["total_ms"], reverse=True)
+
+    return results
+
+
+def format_report(results: List[dict], top: int = 10) -> str:
+    """
+        Human-readable import-time report.
+    :param results: Results of ``measure_imports``
+    :param top: Number of the most expensive modules listed per agent
+    :return: Report as string
+    """
+    lines = []
+
+    for result in results:
+        lines.append("%s: %.1f ms interpreter, %.1f ms imports" %
+                     (result["class"], result["total_ms"], result["import_ms"]))
+
+        if result["error"] is not None:
+            lines.append("    ERROR: %s" % result["error"])
+
+        for module in result["modules"][:top]:
+            lines.append("    %10.1f ms  %10.1f ms self  %s" %
+                         (module["cumulative_ms"], module["self_ms"], module["module"]))
+
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-module import time of agent class paths.")
+    parser.add_argument("class_paths", nargs="+", help="Agent class paths, e.g. agents.hybrid.hybrid_agent.HybridAgent")
+    parser.add_argument("--top", type=int, default=10, help="Number of modules to list per agent")
+    args = parser.parse_args()
+
+    print(format_report(measure_imports(args.class_paths), args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import importlib
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, Optional
+
+"""
+    Per-call latency instrumentation of the agents.
+
+    ``instrument_parties`` wraps ``notifyChange`` of the agent classes during a session and records the wall-clock and
+    CPU time of every call, per party and per inform type (``Settings``, ``YourTurn``, ``ActionDone``, ``Finished``).
+    The ``timed`` decorator records the calls of BOA components (bidding, acceptance, opponent model) in the same way,
+    under the party which is being notified. Outside of an instrumented session, ``timed`` only costs a global lookup.
+
+    ``LatencyRecorder.summary`` reduces the samples to percentiles in milliseconds, which ``run_session`` adds to the
+    session summary as ``latency_1`` and ``latency_2``.
+"""
+
+PERCENTILES = (50, 95, 99)
+
+_recorder = None        # Recorder of the instrumented session in this process, if any
+
+
+class LatencyRecorder:
+    """
+        Wall-clock and CPU time samples of the calls, per party and per call name.
+    """
+    samples: Dict[str, Dict[str, List[tuple]]]
+    current: Optional[str]          # Party which is being notified
+
+    def __init__(self):
+        self.samples = defaultdict(lambda: defaultdict(list))
+        self.current = None
+
+    def record(self, party: str, name: str, wall: float, cpu: float):
+        """
+            Record a call.
+        :param party: Position of the party
+        :param name: Inform type or component method
+        :param wall: Wall-clock time in seconds
+        :param cpu: CPU time of the thread in seconds
+        :return: Nothing
+        """
+        self.samples[party][name].append((wall, cpu))
+
+    def total_wall(self) -> float:
+        """
+            Total wall-clock time of the ``notifyChange`` calls of all parties. The component calls are left out, since
+            they are part of these calls.
+        :return: Time in seconds
+        """
+        return sum(wall for calls in self.samples.values() for name, samples in calls.items() if "." not in name
+                   for wall, _ in samples)
+
+    def summary(self) -> Dict[str, Dict[str, dict]]:
+        """
+            Percentiles of the recorded calls.
+        :return: ``{party: {name: {"count", "wall_p50_ms", ..., "wall_max_ms", "cpu_p50_ms", ...}}}``
+        """
+        summary = {}
+
+        for party, calls in self.samples.items():
+            summary[party] = {}
+
+            for name, samples in calls.items():
+                stats = {"count": len(samples)}
+
+                for kind, values in zip(("wall", "cpu"), zip(*samples)):
+                    values = sorted(values)
+
+                    for q in PERCENTILES:
+                        stats[f"{kind}_p{q}_ms"] = percentile(values, q) * 1000.
+                    stats[f"{kind}_max_ms"] = values[-1] * 1000.
+
+                summary[party][name] = stats
+
+        return summary
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+        Nearest-rank percentile.
+    :param values: Sorted, non-empty list of values
+    :param q: Percentile in [0, 100]
+    :return: Percentile value
+    """
+    rank = max(int(-(-q * len(values) // 100)), 1)
+
+    return values[rank - 1]
+
+
+def timed(function):
+    """
+        Decorator to record the calls of a component method, e.g. ``BiddingStrategy.generate``, while the session is
+        instrumented.
+    :param function: Method to time
+    :return: Decorated method
+    """
+    name = function.__qualname__
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        recorder = _recorder
+
+        if recorder is None:
+            return function(*args, **kwargs)
+
+        wall, cpu = time.perf_counter(), time.thread_time()
+
+        try:
+            return function(*args, **kwargs)
+        finally:
+            recorder.record(recorder.current, name, time.perf_counter() - wall, time.thread_time() - cpu)
+
+    return wrapper
+
+
+@contextmanager
+def instrument_parties(class_paths: List[str]):
+    """
+        Record the ``notifyChange`` calls of the agent classes. The party of a call is the position in the party ID
+        (e.g. ``1`` for ``HybridAgent_1``), which is known from the ``Settings`` inform.
+    :param class_paths: Class paths of the agents
+    :return: Context manager which yields the ``LatencyRecorder``
+    """
+    global _recorder
+
+    recorder = LatencyRecorder()
+    originals = {}
+    positions = {}
+
+    def instrument(notify_change):
+        @wraps(notify_change)
+        def wrapper(self, data):
+            if id(self) not in positions and hasattr(data, "getID"):
+                positions[id(self)] = str(data.getID()).rsplit("_", 1)[-1]
+
+            party = positions.get(id(self), type(self).__name__)
+            previous, recorder.current = recorder.current, party
+            wall, cpu = time.perf_counter(), time.thread_time()
+
+            try:
+                return notify_change(self, data)
+            finally:
+                recorder.record(party, type(data).__name__, time.perf_counter() - wall, time.thread_time() - cpu)
+                recorder.current = previous
+
+        return wrapper
+
+    for class_path in class_paths:
+        module_name, class_name = class_path.rsplit(".", 1)
+        agent_class = getattr(importlib.import_module(module_name), class_name)
+
+        if agent_class not in originals:
+            originals[agent_class] = agent_class.__dict__.get("notifyChange")
+            agent_class.notifyChange = instrument(agent_class.notifyChange)
+
+    _recorder = recorder
+
+    try:
+        yield recorder
+    finally:
+        _recorder = None
+
+        for agent_class, notify_change in originals.items():
+            if notify_change is None:
+                del agent_class.notifyChange
+            else:
+                agent_class.notifyChange = notify_change
@@ -0,0 +1,81 @@
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """
+        Module proxy which postpones the actual import until the first attribute access.
+
+        Heavy dependencies (pandas, lightgbm, sklearn, scipy, plotly, numpy) cost seconds per interpreter. With this
+        proxy, importing an agent class only pays for them when the agent really uses them.
+    """
+
+    def __init__(self, name: str):
+        super(LazyModule, self).__init__(name)
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self) -> types.ModuleType:
+        """
+            Import the real module once and cache it.
+        :return: The real module
+        """
+        module = self.__dict__["_lazy_module"]
+
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__["_lazy_module"] = module
+
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__dict__["_lazy_module"] is not None else "not loaded"
+
+        return "<lazy module '%s' (%s)>" % (self.__name__, state)
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """
+        Import a module lazily. If the module is already imported, it is returned directly.
+    :param name: Full module name, e.g. ``sklearn.linear_model``
+    :return: The module itself if already imported, otherwise a LazyModule proxy
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    return LazyModule(name)
+
+
+def is_loaded(module: types.ModuleType) -> bool:
+    """
+        Check whether a (possibly lazy) module has been imported.
+    :param module: Module or LazyModule proxy
+    :return: True if the real module is in memory
+    """
+    if isinstance(module, LazyModule):
+        return module.__dict__["_lazy_module"] is not None
+
+    return True
+
+
+def load_lazy_modules(module: types.ModuleType) -> list:
+    """
+        Import the real modules behind the LazyModule proxies in the globals of a module, e.g. before forking worker
+        processes which would otherwise import them again on first use.
+    :param module: Module whose globals are checked
+    :return: Names of the loaded modules
+    """
+    names = []
+
+    for value in list(vars(module).values()):
+        if isinstance(value, LazyModule):
+            value._load()
+            names.append(value.__name__)
+
+    return names
@@ -0,0 +1,283 @@
+import argparse
+import glob
+import importlib
+import json
+import os
+import random
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from geniusweb.bidspace.AllBidsList import AllBidsList
+from geniusweb.issuevalue.Bid import Bid
+from geniusweb.issuevalue.DiscreteValue import DiscreteValue
+
+from utils.lazy_import import lazy_import
+from utils.runners import get_utility_function
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+stats = lazy_import("scipy.stats")
+
+"""
+    Accuracy and cost benchmark of the opponent models.
+
+    Bid sequences of an opponent are replayed against each opponent model. The sequences are either taken from
+    session traces (``session_results_trace.json`` with trace level ``compact`` or ``full``), or generated for every
+    domain: a Boulware opponent (``profileB.json``) which concedes on its true utilities. After each sequence, the
+    predictions of the model over all bids of the domain are compared with the true utilities of the opponent:
+
+        - ``pearson`` and ``kendall``: correlation of the predicted and the true utilities
+        - ``pareto_mae``: the Pareto frontier is estimated with our true utilities and the predicted utilities of the
+          opponent; the mean absolute error of the opponent's true utilities on this frontier with respect to the true
+          frontier (``specials.json``), at the utilities of the true frontier for us
+        - ``update_ms`` and ``predict_ms``: mean time of a call
+
+    Usage:
+
+        python -m utils.opponent_model_benchmark --domains domains --output opponent_models.csv
+        python -m utils.opponent_model_benchmark --traces results/*/session_results_trace.json
+"""
+
+
+class ReplayProgress:
+    """
+        Progress of a replayed negotiation, the time is set for each bid instead of the clock.
+    """
+    t: float
+
+    def __init__(self):
+        self.t = 0.
+
+    def get(self, current_time_ms: int) -> float:
+        return self.t
+
+    def isPastDeadline(self, current_time_ms: int) -> bool:
+        return self.t >= 1.
+
+
+# Opponent models: class path, constructor, update and predict functions
+MODELS: Dict[str, Tuple[str, Callable, Callable, Callable]] = {
+    "utils": (
+        "utils.OpponentModel.OpponentModel",
+        lambda cls, domain, profile, progress: cls(domain),
+        lambda model, bid, t: model.update(bid),
+        lambda model, bid: model.get_predicted_utility(bid),
+    ),
+    "template_agent": (
+        "agents.template_agent.opponent_model.OpponentModel",
+        lambda cls, domain, profile, progress: cls(domain, profile, progress),
+        lambda model, bid, t: model.update(bid),
+        lambda model, bid: model.get_utility(bid),
+    ),
+    "hybrid": (
+        "agents.hybrid.opponent_model.OpponentModel",
+        lambda cls, domain, profile, progress: cls(domain, profile, progress, log=lambda *args, **kwargs: None),
+        lambda model, bid, t: model.update(bid),
+        lambda model, bid: model.get_utility(bid),
+    ),
+    "procrastin_agent": (
+        "agents.ANL2022.procrastin_agent.utils.opponent_model.OpponentModel",
+        lambda cls, domain, profile, progress: cls(domain),
+        lambda model, bid, t: model.update(bid, t),
+        lambda model, bid: model.get_predicted_utility(bid),
+    ),
+}
+
+
+def generate_sequence(opponent_profile_path: str, num_bids: int = 200, e: float = 0.2, reservation: float = 0.5,
+                      seed: int = 0) -> List[Bid]:
+    """
+        Bids of a Boulware opponent: at time ``t``, a random bid with a true utility close above
+        ``1 - (1 - reservation) * t ^ (1 / e)``.
+    :param opponent_profile_path: Path of the opponent's profile
+    :param num_bids: Number of bids
+    :param e: Concession factor
+    :param reservation: Utility at the deadline
+    :param seed: Random seed
+    :return: List of bids
+    """
+    rng = random.Random(seed)
+    profile = get_utility_function(f"file:{opponent_profile_path}")
+    all_bids = AllBidsList(profile.getDomain())
+
+    bids = [all_bids.get(i) for i in range(all_bids.size())]
+    utilities = np.array([float(profile.getUtility(bid)) for bid in bids])
+    order = np.argsort(utilities)
+    sorted_utilities = utilities[order]
+
+    sequence = []
+    for i in range(num_bids):
+        t = i / max(num_bids - 1, 1)
+        target = 1. - (1. - reservation) * t ** (1. / e)
+
+        # a random bid among the 5 bids closest above the target
+        start = min(int(np.searchsorted(sorted_utilities, target)), len(bids) - 1)
+        sequence.append(bids[order[rng.randint(start, min(start + 4, len(bids) - 1))]])
+
+    return sequence
+
+
+def get_trace_sequences(trace_path: str) -> List[Tuple[str, str, List[Bid]]]:
+    """
+        Bid sequences of both parties of a session trace.
+    :param trace_path: Path of ``session_results_trace.json``
+    :return: List of ``(own profile path, opponent profile path, opponent bids)``
+    """
+    with open(trace_path, "r", encoding="utf-8") as f:
+        trace = json.load(f)
+
+    profiles = {party: profile["profile"].split(":", 1)[-1] for party, profile in trace["partyprofiles"].items()}
+    sequences = []
+
+    for opponent, opponent_profile in profiles.items():
+        own_profile = next(profile for party, profile in profiles.items() if party != opponent)
+
+        bids = [Bid({issue: DiscreteValue(value) for issue, value in action["Offer"]["bid"]["issuevalues"].items()})
+                for action in trace["actions"] if "Offer" in action and action["Offer"]["actor"] == opponent]
+
+        if bids:
+            sequences.append((own_profile, opponent_profile, bids))
+
+    return sequences
+
+
+def get_pareto_mae(own_utilities, true_utilities, predicted_utilities, true_frontier: List[Tuple[float, float]]) -> float:
+    """
+        Mean absolute error of the estimated Pareto frontier, see the module documentation.
+    :param own_utilities: Our true utilities of all bids
+    :param true_utilities: True utilities of the opponent of all bids
+    :param predicted_utilities: Predicted utilities of the opponent of all bids
+    :param true_frontier: True frontier as ``(own utility, opponent utility)``
+    :return: Mean absolute error
+    """
+    # estimated frontier: the bids which are not dominated in (own utility, predicted utility)
+    order = np.lexsort((-predicted_utilities, -own_utilities))
+    frontier = []
+    best_predicted = -np.inf
+    for index in order:
+        if predicted_utilities[index] > best_predicted:
+            frontier.append(index)
+            best_predicted = predicted_utilities[index]
+
+    frontier = np.array(frontier)[np.argsort(own_utilities[frontier])]
+
+    true_frontier = np.array(sorted(true_frontier))
+    estimated = np.interp(true_frontier[:, 0], own_utilities[frontier], true_utilities[frontier])
+
+    return float(np.mean(np.abs(estimated - true_frontier[:, 1])))
+
+
+def benchmark_sequence(model_name: str, own_profile_path: str, opponent_profile_path: str, bids: List[Bid]) -> dict:
+    """
+        Replay a bid sequence against an opponent model and evaluate its predictions over all bids of the domain.
+    :param model_name: Key of ``MODELS``
+    :param own_profile_path: Path of our profile
+    :param opponent_profile_path: Path of the opponent's profile (ground truth)
+    :param bids: Bids of the opponent
+    :return: Metrics of the model
+    """
+    class_path, create, update, predict = MODELS[model_name]
+    module_name, class_name = class_path.rsplit(".", 1)
+    model_class = getattr(importlib.import_module(module_name), class_name)
+
+    own_profile = get_utility_function(f"file:{own_profile_path}")
+    opponent_profile = get_utility_function(f"file:{opponent_profile_path}")
+    domain = own_profile.getDomain()
+
+    progress = ReplayProgress()
+    model = create(model_class, domain, own_profile, progress)
+
+    start = time.perf_counter()
+    for i, bid in enumerate(bids):
+        progress.t = i / max(len(bids), 1)
+        update(model, bid, progress.t)
+    update_ms = (time.perf_counter() - start) * 1000. / max(len(bids), 1)
+
+    all_bids = AllBidsList(domain)
+    all_bids = [all_bids.get(i) for i in range(all_bids.size())]
+
+    start = time.perf_counter()
+    predicted = np.array([float(predict(model, bid)) for bid in all_bids])
+    predict_ms = (time.perf_counter() - start) * 1000. / len(all_bids)
+
+    own = np.array([float(own_profile.getUtility(bid)) for bid in all_bids])
+    true = np.array([float(opponent_profile.getUtility(bid)) for bid in all_bids])
+
+    # true Pareto frontier, as (own utility, opponent utility)
+    with open(os.path.join(os.path.dirname(opponent_profile_path), "specials.json"), "r") as f:
+        opponent_index = 0 if os.path.basename(opponent_profile_path) == "profileA.json" else 1
+        true_frontier = [(point["utility"][1 - opponent_index], point["utility"][opponent_index])
+                         for point in json.load(f)["pareto_front"]]
+
+    constant = np.ptp(predicted) == 0
+
+    return {
+        "model": model_name,
+        "domain": os.path.basename(os.path.dirname(opponent_profile_path)),
+        "num_bids": len(bids),
+        "pearson": float("nan") if constant else float(np.corrcoef(predicted, true)[0, 1]),
+        "kendall": float("nan") if constant else float(stats.kendalltau(predicted, true)[0]),
+        "pareto_mae": get_pareto_mae(own, true, predicted, true_frontier),
+        "update_ms": update_ms,
+        "predict_ms": predict_ms,
+    }
+
+
+def run_benchmark(models: List[str], domains_dir: str = "domains", trace_paths: Optional[List[str]] = None,
+                  num_bids: int = 200, seed: int = 0) -> "pd.DataFrame":
+    """
+        Benchmark the opponent models on the traces, or on generated sequences for every domain.
+    :param models: Keys of ``MODELS``
+    :param domains_dir: Directory of the domains, used if no traces are given
+    :param trace_paths: Paths of session traces
+    :param num_bids: Number of bids of the generated sequences
+    :param seed: Random seed of the generated sequences
+    :return: One row per model and sequence
+    """
+    if trace_paths:
+        sequences = [sequence for trace_path in trace_paths for sequence in get_trace_sequences(trace_path)]
+    else:
+        sequences = []
+        for domain_dir in sorted(glob.glob(os.path.join(domains_dir, "domain*"))):
+            own_profile, opponent_profile = (os.path.join(domain_dir, "profileA.json"),
+                                             os.path.join(domain_dir, "profileB.json"))
+            sequences.append((own_profile, opponent_profile, generate_sequence(opponent_profile, num_bids, seed=seed)))
+
+    rows = [benchmark_sequence(model, own_profile, opponent_profile, bids)
+            for own_profile, opponent_profile, bids in sequences for model in models]
+
+    return pd.DataFrame(rows)
+
+
+def format_report(results: "pd.DataFrame") -> str:
+    """
+        Averages of the metrics per model.
+    :param results: Result of ``run_benchmark``
+    :return: Report as text
+    """
+    summary = results.groupby("model")[["pearson", "kendall", "pareto_mae", "update_ms", "predict_ms"]].mean()
+
+    return summary.sort_values("kendall", ascending=False).to_string(float_format="%.4f")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the accuracy and the cost of the opponent models.")
+    parser.add_argument("--models", nargs="+", default=list(MODELS.keys()), choices=list(MODELS.keys()),
+                        help="Opponent models to benchmark")
+    parser.add_argument("--domains", default="domains", help="Directory of the domains for the generated sequences")
+    parser.add_argument("--traces", nargs="*", default=None, help="Session traces to replay instead")
+    parser.add_argument("--num-bids", type=int, default=200, help="Number of bids of the generated sequences")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the generated sequences")
+    parser.add_argument("--output", default=None, help="CSV file for the results of every sequence")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.models, args.domains, args.traces, args.num_bids, args.seed)
+
+    if args.output is not None:
+        results.to_csv(args.output, index=False)
+
+    print(format_report(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,40 @@
+import argparse
+import json
 import os
 from collections import defaultdict
+from multiprocessing import Pool
+from typing import List, Optional, Union
 
 import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs
 
+from utils.columnar import get_trace, read_table
+from utils.lazy_import import lazy_import
+from utils.scheduler import load_journal
+from utils.sqlite_store import SQLiteStore
 
-def plot_trace(results_trace: dict, plot_file: str):
+np = lazy_import("numpy")
+
+HOVER_LIMIT = 5000      # Maximum number of points of a plot with the issue values of the bids as hover text
+
+
+def plot_trace(results_trace: dict, plot_file: str, max_points: Optional[int] = None, hover: Optional[bool] = None,
+               include_plotlyjs: Union[bool, str] = True):
+    """
+        Plot the utilities of the offers of a session. The points are rendered with WebGL (``Scattergl``), so long
+        sessions stay responsive.
+    :param results_trace: Session trace of ``run_session``
+    :param plot_file: Path of the HTML file
+    :param max_points: Maximum number of points per line, the lines are downsampled with LTTB. As a default, all points.
+    :param hover: Add the issue values of the bids as hover text. As a default, only if the plot has at most
+        ``HOVER_LIMIT`` points; otherwise only the round and the utility are shown.
+    :param include_plotlyjs: How plotly.js is included in the HTML file, see ``plotly.io.write_html``. ``"directory"``
+        shares one copy of plotly.js between the plots of a directory.
+    :return: Nothing
+    """
     utilities = defaultdict(lambda: defaultdict(lambda: {"x": [], "y": [], "bids": []}))
     accept = {"x": [], "y": [], "bids": []}
+    index = 0
     for index, action in enumerate(results_trace["actions"], 1):
         if "Offer" in action:
             offer = action["Offer"]
@@ -23,9 +51,20 @@ def plot_trace(results_trace: dict, plot_file: str):
                 accept["y"].append(util)
                 accept["bids"].append(offer["bid"]["issuevalues"])
 
+    # downsample each line
+    if max_points is not None:
+        for data in utilities.values():
+            for utility in data.values():
+                selected = lttb(utility["x"], utility["y"], max_points)
+                for key in ("x", "y", "bids"):
+                    utility[key] = [utility[key][i] for i in selected]
+
+    if hover is None:
+        hover = sum(len(utility["x"]) for data in utilities.values() for utility in data.values()) <= HOVER_LIMIT
+
     fig = go.Figure()
     fig.add_trace(
-        go.Scatter(
+        go.Scattergl(
             mode="markers",
             x=accept["x"],
             y=accept["y"],
@@ -39,24 +78,27 @@ def plot_trace(results_trace: dict, plot_file: str):
     for i, (agent, data) in enumerate(utilities.items()):
         for actor, utility in data.items():
             name = "_".join(agent.split("_")[-2:])
-            text = []
-            for bid, util in zip(utility["bids"], utility["y"]):
-                text.append(
-                    "<br>".join(
-                        [f"<b>utility: {util:.3f}</b><br>"]
-                        + [f"{i}: {v}" for i, v in bid.items()]
+            if hover:
+                text = []
+                for bid, util in zip(utility["bids"], utility["y"]):
+                    text.append(
+                        "<br>".join(
+                            [f"<b>utility: {util:.3f}</b><br>"]
+                            + [f"{i}: {v}" for i, v in bid.items()]
+                        )
                     )
-                )
+                hover_settings = {"hovertext": text, "hoverinfo": "text"}
+            else:
+                hover_settings = {"hovertemplate": "round: %{x}<br><b>utility: %{y:.3f}</b>"}
             fig.add_trace(
-                go.Scatter(
+                go.Scattergl(
                     mode="lines+markers" if agent == actor else "markers",
-                    x=utilities[agent][actor]["x"],
-                    y=utilities[agent][actor]["y"],
+                    x=utility["x"],
+                    y=utility["y"],
                     name=f"{name} offered" if agent == actor else f"{name} received",
                     legendgroup=agent,
                     marker={"color": color[i]},
-                    hovertext=text,
-                    hoverinfo="text",
+                    **hover_settings,
                 )
             )
 
@@ -72,4 +114,183 @@ def plot_trace(results_trace: dict, plot_file: str):
     )
     fig.update_xaxes(title_text="round", range=[0, index + 1], ticks="outside")
     fig.update_yaxes(title_text="utility", range=[0, 1], ticks="outside")
-    fig.write_html(f"{os.path.splitext(plot_file)[0]}.html")
+    fig.write_html(f"{os.path.splitext(plot_file)[0]}.html", include_plotlyjs=include_plotlyjs)
+
+
+def lttb(x: List[float], y: List[float], threshold: int) -> List[int]:
+    """
+        Largest-Triangle-Three-Buckets downsampling: keeps the first and the last point, and from each bucket in
+        between the point which forms the largest triangle with the previous selected point and the average of the next
+        bucket.
+    :param x: X values, in increasing order
+    :param y: Y values
+    :param threshold: Number of points to keep
+    :return: Indices of the kept points
+    """
+    length = len(x)
+
+    if threshold >= length or threshold < 3:
+        return list(range(length))
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # bucket boundaries of the points between the first and the last point
+    edges = np.linspace(1, length - 1, threshold - 1).astype(int)
+
+    selected = [0]
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else length
+
+        average_x, average_y = x[end:next_end].mean(), y[end:next_end].mean()
+        previous = selected[-1]
+
+        areas = np.abs((x[previous] - average_x) * (y[start:end] - y[previous]) -
+                       (x[previous] - x[start:end]) * (average_y - y[previous]))
+
+        selected.append(int(start + np.argmax(areas)))
+
+    selected.append(length - 1)
+
+    return selected
+
+
+def plot_offers(offers_path: str, plot_file: str, max_points: Optional[int] = None, hover: Optional[bool] = None,
+                include_plotlyjs: Union[bool, str] = True):
+    """
+        Plot a session trace from its offers table (``session_offers.parquet`` or ``.csv``, see ``utils.columnar``).
+    :param offers_path: Path of the offers table
+    :param plot_file: Path of the plot file
+    :param max_points: Maximum number of points per line, see ``plot_trace``
+    :param hover: Add the issue values of the bids as hover text, see ``plot_trace``
+    :param include_plotlyjs: How plotly.js is included, see ``plot_trace``
+    :return: Nothing
+    """
+    offers = read_table(offers_path, ["round", "actor", "action", "party_1", "utility_1", "party_2", "utility_2", "bid"])
+
+    plot_trace(get_trace(offers), plot_file, max_points, hover, include_plotlyjs)
+
+
+def plot_trace_file(trace_path: str, plot_path: str, max_points: Optional[int] = None, hover: Optional[bool] = None,
+                    include_plotlyjs: Union[bool, str] = True):
+    """
+        Plot a trace file: ``session_results_trace.json`` or an offers table.
+    :param trace_path: Path of the trace file
+    :param plot_path: Path of the plot file
+    :param max_points: Maximum number of points per line, see ``plot_trace``
+    :param hover: Add the issue values of the bids as hover text, see ``plot_trace``
+    :param include_plotlyjs: How plotly.js is included, see ``plot_trace``
+    :return: Nothing
+    """
+    if os.path.splitext(trace_path)[1] == ".json":
+        with open(trace_path, "r", encoding="utf-8") as f:
+            plot_trace(json.load(f), plot_path, max_points, hover, include_plotlyjs)
+    else:
+        plot_offers(trace_path, plot_path, max_points, hover, include_plotlyjs)
+
+
+def plot_store_session(store_path: str, session_id: int, plot_path: str, max_points: Optional[int] = None,
+                       hover: Optional[bool] = None, include_plotlyjs: Union[bool, str] = True):
+    """
+        Plot a session from the offers of a ``SQLiteStore``.
+    :param store_path: Path of the store
+    :param session_id: ID of the session in the store
+    :param plot_path: Path of the plot file
+    :param max_points: Maximum number of points per line, see ``plot_trace``
+    :param hover: Add the issue values of the bids as hover text, see ``plot_trace``
+    :param include_plotlyjs: How plotly.js is included, see ``plot_trace``
+    :return: Nothing
+    """
+    plot_trace(SQLiteStore(store_path).get_trace(session_id), plot_path, max_points, hover, include_plotlyjs)
+
+
+def _plot_batch(plot_fn, jobs: List[tuple], output_dir: str, num_workers: Optional[int]):
+    # plotly.js is written once here, not by the workers at the same time
+    plotly_js_path = os.path.join(output_dir, "plotly.min.js")
+    if not os.path.exists(plotly_js_path):
+        with open(plotly_js_path, "w", encoding="utf-8") as f:
+            f.write(get_plotlyjs())
+
+    with Pool(num_workers) as pool:
+        pool.starmap(plot_fn, jobs)
+
+
+def plot_trace_files(trace_paths: List[str], output_dir: str, max_points: Optional[int] = None,
+                     hover: Optional[bool] = None, num_workers: Optional[int] = None) -> List[str]:
+    """
+        Batch mode: plot many trace files in parallel. The plots share one copy of plotly.js in ``output_dir``.
+    :param trace_paths: Paths of the trace files
+    :param output_dir: Directory of the plots
+    :param max_points: Maximum number of points per line, see ``plot_trace``
+    :param hover: Add the issue values of the bids as hover text, see ``plot_trace``
+    :param num_workers: Number of processes. As a default, the number of CPUs.
+    :return: Paths of the plots
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    jobs = []
+    for i, trace_path in enumerate(trace_paths):
+        name = os.path.splitext(os.path.basename(trace_path))[0]
+        jobs.append((trace_path, os.path.join(output_dir, f"{i}_{name}.html"), max_points, hover, "directory"))
+
+    _plot_batch(plot_trace_file, jobs, output_dir, num_workers)
+
+    return [job[1] for job in jobs]
+
+
+def plot_journal(journal_path: str, store_path: str, output_dir: str, max_points: Optional[int] = None,
+                 hover: Optional[bool] = None, num_workers: Optional[int] = None) -> List[str]:
+    """
+        Batch mode for a tournament: plot the sessions of a results journal in parallel. A journal only holds the
+        summaries, so the offers are read from the ``SQLiteStore`` of the tournament (``store_path`` in the tournament
+        settings): the summaries of the stored sessions have its ``session_id``. The sessions without one are skipped.
+    :param journal_path: Path of the journal of ``run_tournament``
+    :param store_path: Path of the store of the tournament
+    :param output_dir: Directory of the plots
+    :param max_points: Maximum number of points per line, see ``plot_trace``
+    :param hover: Add the issue values of the bids as hover text, see ``plot_trace``
+    :param num_workers: Number of processes. As a default, the number of CPUs.
+    :return: Paths of the plots
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    jobs = []
+    skipped = 0
+    for entry in load_journal(journal_path):
+        summary = entry["summary"]
+        if summary.get("session_id") is None:
+            skipped += 1
+            continue
+
+        name = f"{entry['index']}_{summary.get('agent_1')}_{summary.get('agent_2')}"
+        jobs.append((store_path, summary["session_id"], os.path.join(output_dir, f"{name}.html"), max_points, hover,
+                     "directory"))
+
+    if skipped > 0:
+        print(f"WARNING: {skipped} sessions of the journal are not in the store, they are not plotted")
+
+    _plot_batch(plot_store_session, jobs, output_dir, num_workers)
+
+    return [job[2] for job in jobs]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plot session traces.")
+    parser.add_argument("traces", nargs="*", help="Paths of the traces (session_results_trace.json or offers tables)")
+    parser.add_argument("--journal", default=None, help="Journal of a tournament, the offers are read from --store")
+    parser.add_argument("--store", default=None, help="SQLite store of the tournament (store_path)")
+    parser.add_argument("--output", required=True, help="Directory of the plots")
+    parser.add_argument("--max-points", type=int, default=None, help="Maximum number of points per line (LTTB)")
+    parser.add_argument("--hover", default=None, choices=["on", "off"], help="Issue values of the bids as hover text")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes")
+    args = parser.parse_args()
+
+    hover = None if args.hover is None else args.hover == "on"
+
+    if args.journal is not None:
+        if args.store is None:
+            parser.error("--journal requires --store")
+        plot_journal(args.journal, args.store, args.output, args.max_points, hover, args.workers)
+
+    plot_trace_files(args.traces, args.output, args.max_points, hover, args.workers)
@@ -0,0 +1,212 @@
+import cProfile
+import os
+import pstats
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from utils.lazy_import import lazy_import
+
+pd = lazy_import("pandas")
+
+MAX_DEPTH = 256         # Maximum depth of the collapsed stacks
+MIN_TIME_US = 1         # Stacks with less time are left out of the collapsed stacks
+
+"""
+    Profiler mode of the tournaments (``run_tournament(..., profile=True)``).
+
+    Every session times its stages and adds them to its summary as ``stages`` (in seconds):
+
+        - ``setup``: parsing the settings with ``ObjectMapper`` and creating the GeniusWeb ``Runner``
+        - ``agents``: the ``notifyChange`` calls of the agents, i.e. their compute
+        - ``protocol``: the rest of ``Runner.run``, i.e. the protocol and the connections
+        - ``serialize``: ``ObjectMapper.toJson`` of the session state (trace level ``full``)
+        - ``process_results``: the utilities and the summary of the session
+        - ``store``: the ``SQLiteStore`` insert, if any
+
+    The tournament adds ``summary`` (the pandas summary of ``process_tournament_results``). With a ``profile_dir``,
+    every session is also run under ``cProfile``; the profiles are aggregated into ``profile.collapsed``, one
+    ``frame;frame;frame microseconds`` line per stack, which can be rendered by ``flamegraph.pl`` or speedscope.
+"""
+
+
+class StageTimer:
+    """
+        Wall-clock time per stage, the times of a stage entered more than once are added up.
+    """
+    stages: Dict[str, float]
+
+    def __init__(self):
+        self.stages = defaultdict(float)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+            Time a stage.
+        :param name: Name of the stage
+        :return: Context manager
+        """
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.stages[name] += time.perf_counter() - start
+
+
+@contextmanager
+def profile_to(path: Optional[str]) -> Iterator[None]:
+    """
+        Run the block under ``cProfile`` and dump the statistics into a file.
+    :param path: Path of the statistics file. As a default, no profiling.
+    :return: Context manager
+    """
+    if path is None:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+def get_label(func: Tuple[str, int, str]) -> str:
+    """
+        Frame name of a function in the collapsed stacks.
+    :param func: ``(file, line, name)`` of ``pstats``
+    :return: Label without semicolons
+    """
+    file_name, line, name = func
+
+    if file_name == "~":
+        return name.replace(";", ",")
+
+    return f"{name} ({os.path.basename(file_name)}:{line})".replace(";", ",")
+
+
+def get_collapsed_stacks(stats: pstats.Stats) -> Dict[str, int]:
+    """
+        Stacks of the call graph of a profile. ``cProfile`` only records the callers of each function, so the time of a
+        function is split over its call paths in the proportion of the time per caller.
+    :param stats: Profile statistics
+    :return: ``{"frame;frame;frame": microseconds}`` of the own time of the last frame
+    """
+    entries = stats.stats
+    children = defaultdict(dict)
+
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, (_, _, _, cumulative) in callers.items():
+            children[caller][func] = cumulative
+
+    stacks = defaultdict(int)
+    path = []
+    visiting = set()
+
+    def visit(func, scale: float):
+        _, _, own, cumulative, _ = entries[func]
+
+        path.append(get_label(func))
+        visiting.add(func)
+
+        own_us = int(own * scale * 1e6)
+        if own_us >= MIN_TIME_US:
+            stacks[";".join(path)] += own_us
+
+        if len(path) < MAX_DEPTH:
+            for child, child_cumulative in children[func].items():
+                total = entries[child][3] if child in entries else 0.
+
+                if child in visiting or total <= 0. or child_cumulative * scale * 1e6 < MIN_TIME_US:
+                    continue
+
+                visit(child, scale * child_cumulative / total)
+
+        visiting.discard(func)
+        path.pop()
+
+    # the roots: the time which is not called from a profiled function, e.g. from the frame which enabled the profiler
+    for func, (_, _, _, cumulative, callers) in entries.items():
+        outside = cumulative - sum(caller_cumulative for caller, (_, _, _, caller_cumulative) in callers.items()
+                                   if caller in entries and caller != func)
+
+        if outside * 1e6 >= MIN_TIME_US:
+            visit(func, outside / cumulative)
+
+    return stacks
+
+
+def write_collapsed_stacks(profile_paths: List[str], output_path: str):
+    """
+        Aggregate the session profiles into one collapsed stack file.
+    :param profile_paths: Paths of the ``cProfile`` statistics files
+    :param output_path: Path of the collapsed stack file
+    :return: Nothing
+    """
+    stats = pstats.Stats(*profile_paths)
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        for stack, microseconds in sorted(get_collapsed_stacks(stats).items()):
+            f.write(f"{stack} {microseconds}\n")
+
+
+def get_stage_table(tournament_results: List[dict], tournament_stages: Optional[Dict[str, float]] = None
+                    ) -> "pd.DataFrame":
+    """
+        Breakdown of the time of a tournament per stage.
+    :param tournament_results: Session summaries with ``stages``
+    :param tournament_stages: Stages of the tournament itself, e.g. ``summary``
+    :return: Table indexed by stage with ``total_s``, ``sessions``, ``mean_ms`` (per session) and ``share`` (of the
+        total time of all stages)
+    """
+    totals = defaultdict(float)
+    counts = defaultdict(int)
+
+    for results_summary in tournament_results:
+        for stage, seconds in results_summary.get("stages", {}).items():
+            totals[stage] += seconds
+            counts[stage] += 1
+
+    for stage, seconds in (tournament_stages or {}).items():
+        totals[stage] += seconds
+        counts[stage] += 1
+
+    table = pd.DataFrame({
+        "total_s": pd.Series(totals, dtype=float),
+        "sessions": pd.Series(counts, dtype=int),
+    })
+    table["mean_ms"] = table["total_s"] / table["sessions"] * 1000.
+    table["share"] = table["total_s"] / table["total_s"].sum()
+
+    return table.sort_values("total_s", ascending=False)
+
+
+def write_report(tournament_results: List[dict], profile_dir: Optional[str] = None,
+                 tournament_stages: Optional[Dict[str, float]] = None,
+                 profile_paths: Optional[List[str]] = None) -> "pd.DataFrame":
+    """
+        Print the stage breakdown of a tournament, and write it (``stages.csv``) and the collapsed stacks of the session
+        profiles (``profile.collapsed``) into ``profile_dir``.
+    :param tournament_results: Session summaries with ``stages``
+    :param profile_dir: Directory of the report. As a default, the report is only printed.
+    :param tournament_stages: Stages of the tournament itself
+    :param profile_paths: Profiles of the sessions of this tournament. The ones which do not exist (e.g. of a killed
+        session) are left out.
+    :return: Stage table, see ``get_stage_table``
+    """
+    table = get_stage_table(tournament_results, tournament_stages)
+    print(table.to_string(float_format="%.3f"))
+
+    if profile_dir is not None:
+        table.to_csv(os.path.join(profile_dir, "stages.csv"))
+
+        profile_paths = [path for path in profile_paths or [] if os.path.exists(path)]
+        if profile_paths:
+            write_collapsed_stacks(profile_paths, os.path.join(profile_dir, "profile.collapsed"))
+
+    return table
@@ -1,11 +1,17 @@
+import hashlib
+import json
+import os
 import shutil
 from collections import defaultdict
+from functools import lru_cache
 from itertools import permutations
 from math import factorial, prod
 from pathlib import Path
-from typing import Tuple
+from typing import List, Optional, Tuple
 
-import pandas as pd
+from geniusweb.actions.Accept import Accept
+from geniusweb.actions.Offer import Offer
+from geniusweb.issuevalue.Bid import Bid
 from geniusweb.profile.utilityspace.LinearAdditiveUtilitySpace import (
     LinearAdditiveUtilitySpace,
 )
@@ -22,29 +28,68 @@ from uri.uri import URI
 from utils.BasicReporter import BasicReporter
 
 from utils.ask_proceed import ask_proceed
-
-
-def run_session(settings, reset_storage: bool = True) -> Tuple[dict, dict]:
+from utils.latency import instrument_parties
+from utils.lazy_import import lazy_import
+from utils.profiling import StageTimer, profile_to, write_report
+from utils.scheduler import load_journal, schedule_sessions
+from utils.session_pool import DEFAULT_GRACE_TIME_MS, SessionPool
+from utils.sqlite_store import SQLiteStore
+
+pd = lazy_import("pandas")
+
+TRACE_LEVELS = ("none", "summary", "compact", "full")
+
+
+def run_session(settings, reset_storage: bool = True, store_path: Optional[str] = None, profile: bool = False,
+                profile_path: Optional[str] = None) -> Tuple[dict, dict]:
+    """
+        Run a negotiation session.
+    :param settings: Session settings
+    :param reset_storage: Reset the storage of the agents before the session
+    :param store_path: Path of the optional ``SQLiteStore``, the session and its offers are inserted into it. The
+        ID of the session in the store is added to the summary as ``session_id``.
+    :param profile: Add the time of each stage of the session to the summary as ``stages``
+    :param profile_path: Run the session under ``cProfile`` and dump the statistics into this file (see
+        ``utils.profiling``)
+    :return: Session trace and session summary. The summary contains the latency percentiles of the ``notifyChange``
+        calls of each party per inform type as ``latency_1`` and ``latency_2``.
+
+        The content of the trace depends on ``settings["trace_level"]``:
+            - ``none``: no trace (``None``)
+            - ``summary``: parties, profiles and error of the session, without the actions
+            - ``compact``: additionally, the offers and accepts with actor, issue values and utilities, as needed by
+              ``plot_trace``, ``utils.columnar`` and ``SQLiteStore``
+            - ``full`` (default): the complete ``SAOPState`` JSON with the utilities of the bids
+        Except for ``full``, the summary is computed directly from the action objects and the utilities are only
+        calculated for the bids in the trace.
+    """
     agents = settings["agents"]
     profiles = settings["profiles"]
     deadline_time_ms = settings["deadline_time_ms"]
+    trace_level = settings.get("trace_level", "full")
 
     # quick and dirty checks
     assert isinstance(agents, list) and len(agents) == 2
     assert isinstance(profiles, list) and len(profiles) == 2
     assert isinstance(deadline_time_ms, int) and deadline_time_ms > 0
     assert all(["class" in agent for agent in agents])
+    assert trace_level in TRACE_LEVELS
 
-    for agent in agents:
-        if "parameters" in agent:
-            if "storage_dir" in agent["parameters"]:
-                storage_dir = Path(agent["parameters"]["storage_dir"])
+    with profile_to(profile_path):
+        return _run_session(settings, reset_storage, store_path, profile)
 
-                if reset_storage and storage_dir.exists():
-                    shutil.rmtree(storage_dir)
 
-                if not storage_dir.exists():
-                    storage_dir.mkdir(parents=True)
+def _run_session(settings, reset_storage: bool, store_path: Optional[str], profile: bool) -> Tuple[dict, dict]:
+    """
+        Body of ``run_session``, which may run under ``cProfile``.
+    """
+    agents = settings["agents"]
+    profiles = settings["profiles"]
+    deadline_time_ms = settings["deadline_time_ms"]
+    trace_level = settings.get("trace_level", "full")
+    timer = StageTimer()
+
+    prepare_storage(agents, reset_storage)
 
     # file path to uri
     profiles_uri = [f"file:{x}" for x in profiles]
@@ -89,65 +134,297 @@ def run_session(settings, reset_storage: bool = True) -> Tuple[dict, dict]:
         }
     }
 
-    # parse settings dict to settings object
-    settings_obj = ObjectMapper().parse(settings_full, NegoSettings)
+    with timer.stage("setup"):
+        # parse settings dict to settings object
+        settings_obj = ObjectMapper().parse(settings_full, NegoSettings)
 
-    # create the negotiation session runner object
-    runner = Runner(settings_obj, ClassPathConnectionFactory(), BasicReporter(), 0)
+        # create the negotiation session runner object
+        reporter = BasicReporter()
+        runner = Runner(settings_obj, ClassPathConnectionFactory(), reporter, 0)
 
-    # run the negotiation session
-    runner.run()
+    # run the negotiation session, the calls of the agents are timed
+    try:
+        with instrument_parties([agent["class"] for agent in agents]) as latency, timer.stage("protocol"):
+            runner.run()
+    finally:
+        reporter.close()
 
-    # get results from the session in class format and dict format
+    # the agents' share of the run
+    timer.stages["agents"] = latency.total_wall()
+    timer.stages["protocol"] -= timer.stages["agents"]
+
+    # get results from the session in class format
     results_class: SAOPState = runner.getProtocol().getState()
-    results_dict: dict = ObjectMapper().toJson(results_class)["SAOPState"]
 
-    # add utilities to the results and create a summary
-    results_trace, results_summary = process_results(results_class, results_dict)
+    if trace_level == "full":
+        # dict format, add utilities to the results and create a summary
+        with timer.stage("serialize"):
+            results_dict: dict = ObjectMapper().toJson(results_class)["SAOPState"]
+        with timer.stage("process_results"):
+            results_trace, results_summary = process_results(results_class, results_dict)
+    else:
+        with timer.stage("process_results"):
+            results_trace, results_summary = process_actions(results_class, trace_level)
+
+    for party, party_latency in latency.summary().items():
+        results_summary[f"latency_{party}"] = party_latency
+
+    if store_path is not None:
+        with timer.stage("store"):
+            results_summary["session_id"] = SQLiteStore(store_path).add_session(settings, results_trace, results_summary)
+
+    if profile:
+        results_summary["stages"] = dict(timer.stages)
 
     return results_trace, results_summary
 
 
-def run_tournament(tournament_settings: dict) -> Tuple[list, list]:
+def prepare_storage(agents: list, reset_storage: bool = True):
+    for agent in agents:
+        if "parameters" in agent:
+            if "storage_dir" in agent["parameters"]:
+                storage_dir = Path(agent["parameters"]["storage_dir"])
+
+                if reset_storage and storage_dir.exists():
+                    shutil.rmtree(storage_dir)
+
+                if not storage_dir.exists():
+                    storage_dir.mkdir(parents=True)
+
+
+def run_tournament(tournament_settings: dict, num_workers: int = 1, journal_path: Optional[str] = None,
+                   history: Optional[List[str]] = None, shard_index: int = 0, shard_count: int = 1,
+                   profile: bool = False, profile_dir: Optional[str] = None) -> Tuple[list, list]:
+    """
+        Run a tournament. The sessions are executed by a warm ``SessionPool``: the agent classes and profiles are
+        loaded once and every session runs in a forked child process, at most ``num_workers`` at the same time.
+
+        By default, every session starts with an empty storage: each agent uses its own ``storage_dir/session_<index>``
+        directory, which is reset before the session, so the sessions running at the same time do not share learned
+        data. With ``tournament_settings["persistent_storage"]``, the agents keep their ``storage_dir``, which is reset
+        once before the tournament, and learn across the sessions. Both do not depend on ``num_workers``.
+
+        Each session is killed when it exceeds its deadline plus ``tournament_settings["grace_time_ms"]`` (``TIMEOUT``)
+        or when its memory exceeds ``tournament_settings["max_memory_mb"]`` (``OOM``).
+
+        The sessions are dispatched longest first, by the cost estimated from the domain sizes and from the agent
+        timings in the ``history`` journals. Every finished session is appended to the journal at ``journal_path``.
+
+        A tournament can be spread over several machines: each machine runs the same settings with its own
+        ``shard_index`` in ``[0, shard_count)`` and only executes its part of the sessions. The shard journals are
+        combined afterwards with ``merge_journals``.
+
+        If ``tournament_settings["store_path"]`` is given, every session and its offers are also inserted into that
+        ``SQLiteStore``.
+
+        With ``profile``, the stages of every session are timed and their breakdown is printed at the end. With
+        ``profile_dir``, every session also runs under ``cProfile`` and the breakdown (``stages.csv``) and the
+        aggregated stacks (``profile.collapsed``, for flame graphs) are written into that directory, see
+        ``utils.profiling``.
+    """
+    assert 0 <= shard_index < shard_count
+
     # create agent permutations, ensures that every agent plays against every other agent on both sides of a profile set.
     agents = tournament_settings["agents"]
     profile_sets = tournament_settings["profile_sets"]
-    deadline_time_ms = tournament_settings["deadline_time_ms"]
 
     num_sessions = (factorial(len(agents)) // factorial(len(agents) - 2)) * len(
         profile_sets
     )
-    if num_sessions > 100:
+    shard_indices = get_shard(num_sessions, shard_index, shard_count)
+
+    if len(shard_indices) > 100:
         message = (
-            f"WARNING: this would run {num_sessions} negotiation sessions. Proceed?"
+            f"WARNING: this would run {len(shard_indices)} negotiation sessions. Proceed?"
         )
         if not ask_proceed(message):
             print("Exiting script")
             exit()
 
-    tournament_results = []
-    tournament_steps = []
+    all_tournament_steps = get_tournament_sessions(tournament_settings)
+    tournament_steps = [all_tournament_steps[index] for index in shard_indices]
+
+    # the profiles of this run, kept out of the session settings (and so of the journal)
+    profile_paths = None
+    if profile and profile_dir is not None:
+        os.makedirs(profile_dir, exist_ok=True)
+
+        profile_paths = [os.path.join(profile_dir, f"session_{index}.prof") for index in shard_indices]
+        for profile_path in profile_paths:
+            # a session which is killed leaves no profile, the one of an earlier run must not be taken instead
+            if os.path.exists(profile_path):
+                os.remove(profile_path)
+
+    persistent_storage = tournament_settings.get("persistent_storage", False)
+    if persistent_storage:
+        prepare_storage(agents)
+
+    pool = SessionPool(
+        num_workers,
+        grace_time_ms=tournament_settings.get("grace_time_ms", DEFAULT_GRACE_TIME_MS),
+        max_memory_mb=tournament_settings.get("max_memory_mb"),
+        store_path=tournament_settings.get("store_path"),
+    )
+    pool.preload(agents, profile_sets)
+
+    # the most expensive sessions first
+    order = schedule_sessions(tournament_steps, history)
+
+    journal = open(journal_path, "a", encoding="utf-8") if journal_path is not None else None
+    fingerprint = get_tournament_fingerprint(tournament_settings)
+
+    def write_journal(index: int, session_results_summary: dict):
+        if journal is not None:
+            journal.write(json.dumps({"index": shard_indices[index], "num_sessions": num_sessions,
+                                      "fingerprint": fingerprint,
+                                      "settings": tournament_steps[index], "summary": session_results_summary}) + "\n")
+            journal.flush()
+
+    # run the negotiation sessions
+    try:
+        tournament_results = pool.run(tournament_steps, not persistent_storage, order, write_journal, profile,
+                                      profile_paths)
+    finally:
+        if journal is not None:
+            journal.close()
+
+    timer = StageTimer()
+    with timer.stage("summary"):
+        tournament_results_summary = process_tournament_results(tournament_results)
+
+    if profile:
+        write_report(tournament_results, profile_dir, timer.stages, profile_paths)
+
+    return tournament_steps, tournament_results, tournament_results_summary
+
+
+def get_tournament_sessions(tournament_settings: dict) -> list:
+    """
+        Create the settings of every session in the tournament. Only the summaries of the sessions are kept, so the
+        trace level is ``none`` by default, or ``compact`` if the offers are stored (``store_path``). Without
+        ``persistent_storage``, the ``storage_dir`` of the agents is a directory per session (``session_<index>``).
+    :param tournament_settings: Tournament settings
+    :return: List of session settings dicts for ``run_session``
+    """
+    agents = tournament_settings["agents"]
+    profile_sets = tournament_settings["profile_sets"]
+    deadline_time_ms = tournament_settings["deadline_time_ms"]
+    trace_level = tournament_settings.get("trace_level",
+                                          "compact" if tournament_settings.get("store_path") is not None else "none")
+    persistent_storage = tournament_settings.get("persistent_storage", False)
+
+    sessions = []
     for profiles in profile_sets:
         # quick an dirty check
         assert isinstance(profiles, list) and len(profiles) == 2
         for agent_duo in permutations(agents, 2):
+            if not persistent_storage:
+                agent_duo = [get_session_agent(agent, len(sessions)) for agent in agent_duo]
+
             # create session settings dict
-            settings = {
+            sessions.append({
                 "agents": list(agent_duo),
                 "profiles": profiles,
                 "deadline_time_ms": deadline_time_ms,
-            }
-
-            # run a single negotiation session
-            _, session_results_summary = run_session(settings)
-
-            # assemble results
-            tournament_steps.append(settings)
-            tournament_results.append(session_results_summary)
-
-    tournament_results_summary = process_tournament_results(tournament_results)
-
-    return tournament_steps, tournament_results, tournament_results_summary
+                "trace_level": trace_level,
+            })
+
+    return sessions
+
+
+def get_session_agent(agent: dict, index: int) -> dict:
+    """
+        Settings of an agent in a session of a tournament without ``persistent_storage``: its ``storage_dir`` is a
+        directory of the session.
+    :param agent: Agent settings
+    :param index: Index of the session
+    :return: Agent settings
+    """
+    if "storage_dir" not in agent.get("parameters", {}):
+        return agent
+
+    parameters = dict(agent["parameters"], storage_dir=os.path.join(agent["parameters"]["storage_dir"],
+                                                                       f"session_{index}"))
+
+    return dict(agent, parameters=parameters)
+
+
+def get_tournament_fingerprint(tournament_settings: dict) -> str:
+    """
+        Hash of the settings which define the sessions of a tournament: agents, profile sets, deadline and
+        ``persistent_storage``. It is written into every journal line, so the journals of different tournaments are
+        not merged.
+    :param tournament_settings: Tournament settings
+    :return: Hex digest
+    """
+    content = json.dumps({
+        "agents": tournament_settings["agents"],
+        "profile_sets": tournament_settings["profile_sets"],
+        "deadline_time_ms": tournament_settings["deadline_time_ms"],
+        "persistent_storage": tournament_settings.get("persistent_storage", False),
+    }, sort_keys=True)
+
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def get_shard(num_sessions: int, shard_index: int, shard_count: int) -> List[int]:
+    """
+        Deterministic partition of the tournament sessions: session ``i`` belongs to shard ``i % shard_count``.
+    :param num_sessions: Number of sessions in the whole tournament
+    :param shard_index: Index of the shard
+    :param shard_count: Number of shards
+    :return: Indices of the sessions in the shard
+    """
+    return list(range(shard_index, num_sessions, shard_count))
+
+
+def merge_journals(journal_paths: List[str], tournament_settings: Optional[dict] = None) -> Tuple[list, list]:
+    """
+        Combine the journals of the shards of a tournament. Every session must be present exactly once, and all the
+        journals must have the same tournament fingerprint (``get_tournament_fingerprint``).
+    :param journal_paths: Paths of the shard journals
+    :param tournament_settings: Settings of the tournament. If given, the fingerprint of the journals must be the one
+        of these settings, and the settings of every session must be the ones of ``get_tournament_sessions``.
+    :return: Tournament steps and tournament results, ordered by session index
+    """
+    entries = {}
+    num_sessions = set()
+    fingerprints = set()
+
+    for journal_path in journal_paths:
+        for entry in load_journal(journal_path):
+            if entry["index"] in entries:
+                raise ValueError(f"Session {entry['index']} is present more than once ({journal_path})")
+
+            entries[entry["index"]] = entry
+            num_sessions.add(entry["num_sessions"])
+            fingerprints.add(entry.get("fingerprint"))
+
+    if len(num_sessions) > 1:
+        raise ValueError(f"Journals belong to different tournaments, number of sessions: {sorted(num_sessions)}")
+
+    if len(fingerprints) > 1:
+        raise ValueError(f"Journals belong to different tournaments, fingerprints: {sorted(map(str, fingerprints))}")
+
+    if tournament_settings is not None:
+        fingerprint = get_tournament_fingerprint(tournament_settings)
+        if fingerprints and fingerprints != {fingerprint}:
+            raise ValueError(f"Journals do not belong to this tournament, "
+                             f"fingerprints: {sorted(map(str, fingerprints))}")
+
+        sessions = get_tournament_sessions(tournament_settings)
+        for index, entry in entries.items():
+            if index >= len(sessions) or entry["settings"] != sessions[index]:
+                raise ValueError(f"Settings of session {index} do not match the tournament")
+
+    missing = sorted(set(range(num_sessions.pop() if num_sessions else 0)) - set(entries.keys()))
+    if missing:
+        raise ValueError(f"{len(missing)} sessions are missing: {missing}")
+
+    tournament_steps = [entries[index]["settings"] for index in sorted(entries.keys())]
+    tournament_results = [entries[index]["summary"] for index in sorted(entries.keys())]
+
+    return tournament_steps, tournament_results
 
 
 def process_results(results_class: SAOPState, results_dict: dict):
@@ -213,6 +490,121 @@ def process_results(results_class: SAOPState, results_dict: dict):
     return results_dict, results_summary
 
 
+def process_actions(results_class: SAOPState, trace_level: str) -> Tuple[Optional[dict], dict]:
+    """
+        Create the summary of a session straight from the action objects, without the JSON serialization of the
+        session state. The summary is the same as of ``process_results``.
+    :param results_class: Final state of the session
+    :param trace_level: ``none``, ``summary`` or ``compact``, see ``run_session``
+    :return: Session trace and session summary
+    """
+    parties = results_class.getConnections()
+    party_profiles = results_class.getPartyProfiles()
+
+    # geniusweb agent reference to Python class name and profile URI
+    agent_translate = {
+        party: str(party_profiles[party].getParty().getPartyRef().getURI()).split(".")[-1] for party in parties
+    }
+    profile_uris = {party: str(party_profiles[party].getProfile().getURI()) for party in parties}
+
+    results_trace = None
+    if trace_level != "none":
+        results_trace = {
+            "connections": [party.getName() for party in parties],
+            "partyprofiles": {
+                party.getName(): {"party": {"partyref": str(party_profiles[party].getParty().getPartyRef().getURI())},
+                                  "profile": profile_uris[party]}
+                for party in parties
+            },
+            "error": None if results_class.getError() is None else str(results_class.getError()),
+        }
+
+    results_summary = {"num_offers": 0}
+    actions = results_class.getActions()
+
+    def get_utilities(bid: Bid) -> dict:
+        if bid is None:
+            raise ValueError("Found `None` bid in sequence of actions")
+
+        return {party.getName(): float(get_utility_function(profile_uris[party]).getUtility(bid)) for party in parties}
+
+    if actions:
+        compact_actions = []
+
+        for action in actions:
+            if not isinstance(action, (Offer, Accept)):
+                continue
+
+            results_summary["num_offers"] += 1
+
+            if trace_level == "compact":
+                compact_actions.append({type(action).__name__: {
+                    "actor": action.getActor().getName(),
+                    "bid": {"issuevalues": get_issue_values(action.getBid())},
+                    "utilities": get_utilities(action.getBid()),
+                }})
+
+        if trace_level == "compact":
+            results_trace["actions"] = compact_actions
+
+        # gather a summary of results
+        if isinstance(actions[-1], Accept):
+            utilities = get_utilities(actions[-1].getBid())
+            utilities_final = [utilities[party.getName()] for party in parties]
+            result = "agreement"
+        else:
+            utilities_final = [0, 0]
+            result = "failed"
+    else:
+        utilities_final = [0, 0]
+        result = "ERROR"
+
+    for i, party in enumerate(parties):
+        position = party.getName().split("_")[-1]
+        results_summary[f"agent_{position}"] = agent_translate[party]
+        results_summary[f"utility_{position}"] = utilities_final[i]
+    results_summary["nash_product"] = prod(utilities_final)
+    results_summary["social_welfare"] = sum(utilities_final)
+    results_summary["result"] = result
+
+    return results_trace, results_summary
+
+
+def get_issue_values(bid: Bid) -> dict:
+    """
+        Issue values of a bid as in the JSON of the bid: strings for discrete values, numbers for number values.
+    :param bid: Bid
+    :return: Dictionary of ``{issue: value}``
+    """
+    issue_values = {}
+
+    for issue, value in bid.getIssueValues().items():
+        value = value.getValue()
+        issue_values[issue] = value if isinstance(value, str) else float(value)
+
+    return issue_values
+
+
+def get_failed_summary(settings: dict, result: str) -> dict:
+    """
+        Summary of a session which did not produce any results (e.g. ``TIMEOUT``, ``OOM`` or ``ERROR``).
+    :param settings: Session settings
+    :param result: Result of the session
+    :return: Session summary in the same format as ``process_results``
+    """
+    results_summary = {"num_offers": 0}
+
+    for position, agent in enumerate(settings["agents"], 1):
+        results_summary[f"agent_{position}"] = agent["class"].split(".")[-1]
+        results_summary[f"utility_{position}"] = 0
+    results_summary["nash_product"] = 0
+    results_summary["social_welfare"] = 0
+    results_summary["result"] = result
+
+    return results_summary
+
+
+@lru_cache(maxsize=None)
 def get_utility_function(profile_uri) -> LinearAdditiveUtilitySpace:
     profile_connection = ProfileConnectionFactory.create(
         URI(profile_uri), StdOutReporter()
@@ -225,10 +617,16 @@ def get_utility_function(profile_uri) -> LinearAdditiveUtilitySpace:
 
 def process_tournament_results(tournament_results):
     agent_result_raw = defaultdict(lambda: defaultdict(list))
+    agent_latency_raw = defaultdict(lambda: defaultdict(list))
     tournament_results_summary = defaultdict(lambda: defaultdict(int))
     for session_results in tournament_results:
         agents = {k: v for k, v in session_results.items() if k.startswith("agent")}
         for agent_id, agent_class in agents.items():
+            # time to take an action, the sessions which failed before any turn have no latency
+            turn_latency = session_results.get(f"latency_{agent_id.split('_')[1]}", {}).get("YourTurn")
+            if turn_latency is not None:
+                for stat in ("wall_p50_ms", "wall_p95_ms", "wall_max_ms"):
+                    agent_latency_raw[agent_class][stat].append(turn_latency[stat])
             agent_result_raw[agent_class]["utility"].append(
                 session_results[f"utility_{agent_id.split('_')[1]}"]
             )
@@ -251,6 +649,11 @@ def process_tournament_results(tournament_results):
             tournament_results_summary[agent][f"avg_{desc}"] = stat_average
         tournament_results_summary[agent]["count"] = num_session
 
+    for agent, stats in agent_latency_raw.items():
+        tournament_results_summary[agent]["avg_turn_p50_ms"] = sum(stats["wall_p50_ms"]) / len(stats["wall_p50_ms"])
+        tournament_results_summary[agent]["avg_turn_p95_ms"] = sum(stats["wall_p95_ms"]) / len(stats["wall_p95_ms"])
+        tournament_results_summary[agent]["max_turn_ms"] = max(stats["wall_max_ms"])
+
     column_order = [
         "avg_utility",
         "avg_nash_product",
@@ -260,12 +663,19 @@ def process_tournament_results(tournament_results):
         "agreement",
         "failed",
         "ERROR",
+        "TIMEOUT",
+        "OOM",
+        "avg_turn_p50_ms",
+        "avg_turn_p95_ms",
+        "max_turn_ms",
     ]
     column_type = {
         "count": int,
         "agreement": int,
         "failed": int,
         "ERROR": int,
+        "TIMEOUT": int,
+        "OOM": int,
     }
 
     # results dictionary to dataframe
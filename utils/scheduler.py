@@ -0,0 +1,105 @@
+import json
+import os
+from collections import defaultdict
+from functools import lru_cache
+from math import prod
+from typing import List, Optional
+
+"""
+    Longest-processing-time-first scheduling of tournament sessions.
+
+    The cost of a session is estimated as ``domain size * agent rate``, where the rate of an agent is its average
+    session duration per bid observed in previous tournament journals. Sessions are dispatched from the most expensive
+    to the cheapest one, so that the expensive sessions do not end up last and leave the workers idle.
+"""
+
+
+@lru_cache(maxsize=None)
+def get_domain_size(profile_path: str) -> int:
+    """
+        Number of bids in the domain of a profile. ``size`` in ``specials.json`` of the domain directory is used if
+        it exists, otherwise it is calculated from the issues of the profile.
+    :param profile_path: Path of the profile file
+    :return: Number of bids
+    """
+    profile_path = profile_path.split(":")[-1]
+    specials_path = os.path.join(os.path.dirname(profile_path), "specials.json")
+
+    if os.path.exists(specials_path):
+        with open(specials_path, "r") as f:
+            return int(json.load(f)["size"])
+
+    with open(profile_path, "r") as f:
+        profile = json.load(f)
+
+    issues_values = profile["LinearAdditiveUtilitySpace"]["domain"]["issuesValues"]
+
+    return prod(len(issue["values"]) for issue in issues_values.values())
+
+
+def load_journal(journal_path: str) -> List[dict]:
+    """
+        Read a tournament journal. Each line is a JSON object with ``index``, ``settings`` and ``summary`` of a session.
+    :param journal_path: Path of the journal file
+    :return: List of journal entries
+    """
+    entries = []
+
+    with open(journal_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+
+    return entries
+
+
+def get_agent_rates(journal_paths: List[str]) -> dict:
+    """
+        Average session duration per bid of each agent class in previous journals.
+    :param journal_paths: Paths of previous tournament journals
+    :return: Dictionary of ``{agent class path: seconds per bid}``
+    """
+    rates = defaultdict(list)
+
+    for journal_path in journal_paths:
+        for entry in load_journal(journal_path):
+            duration = entry["summary"].get("duration")
+
+            if duration is None:
+                continue
+
+            size = get_domain_size(entry["settings"]["profiles"][0])
+
+            for agent in entry["settings"]["agents"]:
+                rates[agent["class"]].append(duration / size)
+
+    return {agent: sum(rate) / len(rate) for agent, rate in rates.items()}
+
+
+def estimate_session_cost(settings: dict, agent_rates: dict) -> float:
+    """
+        Estimated cost of a session. The agents without history get the average rate of the known agents.
+    :param settings: Session settings
+    :param agent_rates: Rates of ``get_agent_rates``
+    :return: Estimated cost
+    """
+    default_rate = sum(agent_rates.values()) / len(agent_rates) if agent_rates else 1.
+
+    size = get_domain_size(settings["profiles"][0])
+    rate = sum(agent_rates.get(agent["class"], default_rate) for agent in settings["agents"]) / len(settings["agents"])
+
+    return size * rate
+
+
+def schedule_sessions(sessions: List[dict], journal_paths: Optional[List[str]] = None) -> List[int]:
+    """
+        Order the sessions by estimated cost, the longest first.
+    :param sessions: List of session settings
+    :param journal_paths: Paths of previous tournament journals for the agent timings
+    :return: Indices of ``sessions`` in dispatch order
+    """
+    agent_rates = get_agent_rates(journal_paths) if journal_paths else {}
+
+    costs = [estimate_session_cost(settings, agent_rates) for settings in sessions]
+
+    return sorted(range(len(sessions)), key=lambda index: costs[index], reverse=True)
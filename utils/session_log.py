@@ -0,0 +1,170 @@
+import glob
+import os
+import pickle
+import struct
+from collections import OrderedDict
+from typing import Any, Callable, List, Tuple
+
+from utils.storage import CACHE_SIZE, file_lock, get_stamp, read_data, write_data
+
+"""
+    Append-only session log with periodic compaction.
+
+    Instead of re-writing the whole learning history after every session, each session appends one length-prefixed
+    record to ``{path}.{generation}.log``. The records are folded into a summary with a ``reduce`` function. Once the
+    log holds ``compact_after`` records, the summary is written as a snapshot (``{path}.snapshot``) and a new, empty
+    log generation is started. Loading reads the snapshot plus the short tail, so it does not depend on the number of
+    past sessions.
+
+    The loaded summaries are cached in the process with the version of the snapshot and the offset of the log: as long
+    as the snapshot is the same, the next ``load`` only reads and folds the records appended since, e.g. the one of the
+    previous session in the same worker. The summary is shared with the cache, so it must not be modified.
+"""
+
+HEADER = struct.Struct(">I")    # Length of each record, 4-byte unsigned big-endian
+
+# path -> (versions of the snapshot and of the log, generation, end offset and number of the folded records, summary)
+_summaries: "OrderedDict[str, Tuple[tuple, int, int, int, Any]]" = OrderedDict()
+
+
+class SessionLog:
+    path: str
+    reduce: Callable[[Any, Any], Any]
+    initial: Callable[[], Any]
+    compact_after: int
+
+    def __init__(self, path: str, reduce: Callable[[Any, Any], Any], initial: Callable[[], Any] = lambda: None,
+                 compact_after: int = 16):
+        """
+            Constructor
+        :param path: Base path of the log, e.g. ``{storage_dir}/{opponent}_data``
+        :param reduce: Folds a record into the summary: ``reduce(summary, record) -> summary``
+        :param initial: Creates the summary when there is no snapshot
+        :param compact_after: Number of records in the log which triggers a compaction
+        """
+        self.path = path
+        self.reduce = reduce
+        self.initial = initial
+        self.compact_after = compact_after
+
+    def append(self, record: Any):
+        """
+            Append a record of a session.
+        :param record: Any picklable object
+        :return: Nothing
+        """
+        raw = pickle.dumps(record)
+
+        with file_lock(self.path):
+            generation, stamp, offset, count, summary = self._get_cached()
+            _, end = self._read_records(generation, offset)
+
+            with open(self._log_path(generation), "ab") as f:
+                # drop a torn record left by a killed session
+                f.truncate(end)
+                f.write(HEADER.pack(len(raw)) + raw)
+                f.flush()
+                os.fsync(f.fileno())
+
+            # the record is folded by the next load, the cache only follows a new log file
+            self._set_cached(stamp, generation, offset, count, summary)
+
+    def load(self) -> Any:
+        """
+            Summary of all sessions: the snapshot with the records of the log folded into it. The log is compacted if
+            it is long enough.
+        :return: Summary
+        """
+        with file_lock(self.path):
+            generation, stamp, offset, count, summary = self._get_cached()
+            records, end = self._read_records(generation, offset)
+
+            for record in records:
+                summary = self.reduce(summary, record)
+
+            count += len(records)
+
+            if count >= self.compact_after:
+                generation += 1
+                self._compact(generation, summary)
+                stamp, end, count = get_stamp(f"{self.path}.snapshot"), 0, 0
+
+            self._set_cached(stamp, generation, end, count, summary)
+
+        return summary
+
+    def _get_cached(self) -> Tuple[int, tuple, int, int, Any]:
+        # generation, snapshot version, folded offset, number of folded records and summary; from the snapshot if the
+        # cache of the process is missing or outdated
+        key = os.path.abspath(self.path)
+        stamp = get_stamp(f"{self.path}.snapshot")
+
+        if key in _summaries:
+            (cached_stamp, log_inode), generation, offset, count, summary = _summaries[key]
+            log_stamp = get_stamp(self._log_path(generation))
+
+            # the log is only appended to (or truncated after the folded records) until the next compaction
+            if cached_stamp == stamp and (log_stamp[2] == log_inode and log_stamp[1] >= offset if log_stamp is not None
+                                          else offset == 0):
+                _summaries.move_to_end(key)
+                return generation, stamp, offset, count, summary
+
+        generation, summary = self._read_snapshot()
+
+        return generation, stamp, 0, 0, summary
+
+    def _set_cached(self, stamp: tuple, generation: int, offset: int, count: int, summary: Any):
+        key = os.path.abspath(self.path)
+        log_stamp = get_stamp(self._log_path(generation))
+        _summaries[key] = ((stamp, log_stamp[2] if log_stamp is not None else None), generation, offset, count, summary)
+        _summaries.move_to_end(key)
+
+        if len(_summaries) > CACHE_SIZE:
+            _summaries.popitem(last=False)
+
+    def _read_snapshot(self) -> Tuple[int, Any]:
+        snapshot = read_data(f"{self.path}.snapshot")
+
+        if snapshot is None:
+            return 0, self.initial()
+
+        return snapshot["generation"], snapshot["summary"]
+
+    def _read_records(self, generation: int, start_offset: int = 0) -> Tuple[List[Any], int]:
+        # records of a log generation after an offset and the end offset of the last complete record
+        log_path = self._log_path(generation)
+
+        if not os.path.exists(log_path):
+            return [], 0
+
+        with open(log_path, "rb") as f:
+            # the records before the offset are already folded into a cached summary
+            f.seek(start_offset)
+            raw = f.read()
+
+        records = []
+        offset = 0
+
+        # a torn record at the end (e.g. a killed session) is ignored
+        while offset + HEADER.size <= len(raw):
+            length, = HEADER.unpack_from(raw, offset)
+            start = offset + HEADER.size
+
+            if start + length > len(raw):
+                break
+
+            records.append(pickle.loads(raw[start:start + length]))
+            offset = start + length
+
+        return records, start_offset + offset
+
+    def _compact(self, generation: int, summary: Any):
+        # the snapshot switches to the new generation atomically, the old logs are removed afterwards
+        write_data(f"{self.path}.snapshot", {"generation": generation, "summary": summary})
+
+        for log_path in glob.glob(f"{glob.escape(self.path)}.*.log"):
+            if log_path != self._log_path(generation):
+                os.remove(log_path)
+
+    def _log_path(self, generation: int) -> str:
+        return f"{self.path}.{generation}.log"
@@ -0,0 +1,270 @@
+import importlib
+import multiprocessing
+import sys
+import time
+import traceback
+from multiprocessing.connection import wait
+from typing import Callable, List, Optional
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+DEFAULT_GRACE_TIME_MS = 10000       # Time allowed after the negotiation deadline before a session is killed
+POLL_INTERVAL = 0.5                 # Seconds between two checks of the running sessions
+
+
+class SessionPool:
+    """
+        Warm worker pool for tournaments.
+
+        The parent process imports every agent class and parses every profile once (``preload``). The heavy
+        dependencies which the agents and the utils modules import lazily (``utils.lazy_import``) are loaded as well,
+        and the sorted bids of the profiles are built if an agent uses ``utils.extended_util_space``. Each negotiation
+        session is then executed in a new child process forked from this warm parent, so the session starts without
+        re-importing GeniusWeb, pyson or the agents' dependencies and without sorting the bids again (copy-on-write).
+        Every session still gets fresh agent instances and an isolated state, because the child exits after a single
+        session. The learned data in the ``storage_dir`` of the agents is loaded into the cache of ``utils.storage``
+        as well, and refreshed before every new round of sessions is started, so the sessions which read it with
+        ``cache=True`` skip the deserialization.
+
+        Every session is guarded: it is killed when it runs longer than its deadline plus ``grace_time_ms``
+        (``TIMEOUT``), or when its resident memory exceeds ``max_memory_mb`` (``OOM``). A crashed session is recorded
+        as ``ERROR``. In all cases, the other sessions continue.
+
+        On platforms without ``fork``, the ``forkserver`` (preloaded with the agent modules) or ``spawn`` start method
+        is used instead.
+    """
+    num_workers: int
+    start_method: str
+    grace_time_ms: int
+    max_memory_mb: Optional[float]
+    store_path: Optional[str]
+    preloaded_modules: List[str]
+    storage_dirs: List[str]
+
+    def __init__(self, num_workers: int, start_method: Optional[str] = None,
+                 grace_time_ms: int = DEFAULT_GRACE_TIME_MS, max_memory_mb: Optional[float] = None,
+                 store_path: Optional[str] = None):
+        """
+            Constructor
+        :param num_workers: Maximum number of sessions running at the same time
+        :param start_method: Multiprocessing start method. As a default, ``fork`` if available, otherwise
+            ``forkserver`` or ``spawn``.
+        :param grace_time_ms: Time allowed after the negotiation deadline before the session is killed
+        :param max_memory_mb: Maximum resident memory (RSS) of a session in MB. As a default, no limit.
+        :param store_path: Path of the optional ``SQLiteStore`` the sessions write their results into
+        """
+        assert isinstance(num_workers, int) and num_workers > 0
+        assert isinstance(grace_time_ms, int) and grace_time_ms >= 0
+
+        if start_method is None:
+            available = multiprocessing.get_all_start_methods()
+            start_method = next(method for method in ("fork", "forkserver", "spawn") if method in available)
+
+        self.num_workers = num_workers
+        self.start_method = start_method
+        self.context = multiprocessing.get_context(start_method)
+        self.grace_time_ms = grace_time_ms
+        self.max_memory_mb = max_memory_mb
+        self.store_path = store_path
+        self.preloaded_modules = []
+        self.storage_dirs = []
+
+    def preload(self, agents: List[dict], profile_sets: List[list]):
+        """
+            Import all agent classes with their lazy dependencies and parse all profiles in the parent process.
+        :param agents: Agent settings, as in ``tournament_settings["agents"]``
+        :param profile_sets: Profile sets, as in ``tournament_settings["profile_sets"]``
+        :return: Nothing
+        """
+        from utils.lazy_import import load_lazy_modules
+        from utils.runners import get_utility_function
+
+        for agent in agents:
+            module_name, class_name = agent["class"].rsplit(".", 1)
+            getattr(importlib.import_module(module_name), class_name)
+
+            if module_name not in self.preloaded_modules:
+                self.preloaded_modules.append(module_name)
+
+        # the lazy dependencies of the agent modules and of the utils modules they use
+        for name, module in list(sys.modules.items()):
+            if module is not None and name.split(".")[0] in ("agents", "utils"):
+                for lazy_name in load_lazy_modules(module):
+                    if lazy_name not in self.preloaded_modules:
+                        self.preloaded_modules.append(lazy_name)
+
+        # the agents with an ExtendedUtilSpace find the sorted bids of the profiles in the inherited cache
+        sorted_bids = sys.modules.get("utils.extended_util_space") if self.start_method == "fork" else None
+
+        for profiles in profile_sets:
+            for profile in profiles:
+                space = get_utility_function(f"file:{profile}")
+
+                if sorted_bids is not None:
+                    sorted_bids.preload_sorted_bids(space)
+
+        for agent in agents:
+            storage_dir = agent.get("parameters", {}).get("storage_dir")
+            if storage_dir is not None and storage_dir not in self.storage_dirs:
+                self.storage_dirs.append(storage_dir)
+
+        self.warm_storage()
+
+        if self.start_method == "forkserver":
+            self.context.set_forkserver_preload(["utils.runners"] + self.preloaded_modules)
+
+    def warm_storage(self):
+        """
+            Load the changed data files of the preloaded agents into the cache of ``utils.storage``, which the forked
+            sessions inherit. Only useful with ``fork``.
+        :return: Nothing
+        """
+        from utils.storage import warm_cache
+
+        if self.start_method != "fork":
+            return
+
+        for storage_dir in self.storage_dirs:
+            warm_cache(storage_dir)
+
+    def run(self, sessions: List[dict], reset_storage: bool = False, order: Optional[List[int]] = None,
+            callback: Optional[Callable[[int, dict], None]] = None, profile: bool = False,
+            profile_paths: Optional[List[Optional[str]]] = None) -> List[dict]:
+        """
+            Run the sessions, at most ``num_workers`` at the same time. The wall-clock time of each session is added
+            to its summary as ``duration`` (in seconds).
+        :param sessions: List of session settings for ``run_session``
+        :param reset_storage: Reset the storage of the agents before each session
+        :param order: Dispatch order as indices of ``sessions``, e.g. from ``utils.scheduler.schedule_sessions``. As a
+            default, the given order.
+        :param callback: Called with the index and the summary of every session as soon as it is finished
+        :param profile: Time the stages of the sessions, see ``run_session``
+        :param profile_paths: ``cProfile`` statistics file of every session, in the same order as ``sessions``. As a
+            default, no profiling.
+        :return: List of session result summaries, in the same order as ``sessions``
+        """
+        from utils.runners import get_failed_summary
+
+        if order is None:
+            order = range(len(sessions))
+
+        results = [None] * len(sessions)
+        pending = [(index, sessions[index]) for index in order]
+        running = {}
+
+        def finish(index: int, results_summary: dict, started: float):
+            results_summary["duration"] = time.monotonic() - started
+            results[index] = results_summary
+
+            if callback is not None:
+                callback(index, results_summary)
+
+        while pending or running:
+            # fill the free worker slots, with the learned data of the finished sessions
+            if pending and len(running) < self.num_workers:
+                self.warm_storage()
+
+            while pending and len(running) < self.num_workers:
+                index, settings = pending.pop(0)
+                receiver, sender = self.context.Pipe(duplex=False)
+
+                profile_path = profile_paths[index] if profile_paths is not None else None
+                process = self.context.Process(target=_session_worker,
+                                               args=(settings, reset_storage, self.store_path, profile, profile_path,
+                                                     sender), daemon=True)
+                started = time.monotonic()
+                process.start()
+                sender.close()
+
+                deadline = started + (settings["deadline_time_ms"] + self.grace_time_ms) / 1000.
+                running[receiver] = (index, process, started, deadline)
+
+            # wait for any session to finish, or for the next check
+            timeout = min([POLL_INTERVAL] + [deadline - time.monotonic() for _, _, _, deadline in running.values()])
+
+            for receiver in wait(list(running.keys()), max(timeout, 0.)):
+                index, process, started, _ = running.pop(receiver)
+
+                try:
+                    status, payload = receiver.recv()
+                except EOFError:
+                    status, payload = "error", "Session process exited with code %s" % process.exitcode
+                finally:
+                    receiver.close()
+                    process.join()
+
+                if status != "ok":
+                    print("ERROR : session %d failed\n%s" % (index, payload), file=sys.stderr)
+                    payload = get_failed_summary(sessions[index], "ERROR")
+
+                finish(index, payload, started)
+
+            # kill the sessions which exceed their budget
+            for receiver, (index, process, started, deadline) in list(running.items()):
+                if time.monotonic() > deadline:
+                    result = "TIMEOUT"
+                elif self.max_memory_mb is not None and get_memory_mb(process.pid) > self.max_memory_mb:
+                    result = "OOM"
+                else:
+                    continue
+
+                print("WARNING : session %d is killed (%s)" % (index, result), file=sys.stderr)
+
+                process.kill()
+                process.join()
+                receiver.close()
+                del running[receiver]
+
+                finish(index, get_failed_summary(sessions[index], result), started)
+
+        return results
+
+
+def get_memory_mb(pid: int) -> float:
+    """
+        Resident memory (RSS) of a process. ``psutil`` is used if it is installed, otherwise ``/proc`` is read.
+    :param pid: Process ID
+    :return: RSS in MB, 0 if it cannot be determined
+    """
+    try:
+        if psutil is not None:
+            return psutil.Process(pid).memory_info().rss / (1024. * 1024.)
+
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.
+    except (OSError, ValueError):
+        pass
+    except Exception as e:
+        # psutil.NoSuchProcess, psutil.AccessDenied
+        if psutil is None or not isinstance(e, psutil.Error):
+            raise
+
+    return 0.
+
+
+def _session_worker(settings: dict, reset_storage: bool, store_path: Optional[str], profile: bool,
+                    profile_path: Optional[str], sender):
+    """
+        Entry point of a session process. Only the summary is sent back to the parent.
+    :param settings: Session settings for ``run_session``
+    :param reset_storage: Reset the storage of the agents before the session
+    :param store_path: Path of the optional ``SQLiteStore``
+    :param profile: Time the stages of the session
+    :param profile_path: Path of the ``cProfile`` statistics file of the session
+    :param sender: Pipe end to send the result
+    :return: Nothing
+    """
+    from utils.runners import run_session
+
+    try:
+        _, results_summary = run_session(settings, reset_storage, store_path, profile, profile_path)
+        sender.send(("ok", results_summary))
+    except BaseException:
+        sender.send(("error", traceback.format_exc()))
+    finally:
+        sender.close()
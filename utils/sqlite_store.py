@@ -0,0 +1,282 @@
+import json
+import os
+import sqlite3
+import time
+from typing import List, Optional
+
+from utils.scheduler import get_domain_size
+
+"""
+    Optional SQLite store for the results of the sessions and the learned data of the agents.
+
+    A single database file is shared by the runners (``sessions`` and ``offers`` tables) and the learning models
+    (``learned`` table). The database is in WAL mode, so the sessions running in parallel can write at the same time
+    while the others read. The tables are indexed by agent, opponent and domain size, so an agent can query e.g. the
+    last N sessions against an opponent on large domains without loading its whole history.
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    agent_1 TEXT NOT NULL,
+    agent_2 TEXT NOT NULL,
+    profile_1 TEXT NOT NULL,
+    profile_2 TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    domain_size INTEGER NOT NULL,
+    deadline_time_ms INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    utility_1 REAL,
+    utility_2 REAL,
+    nash_product REAL,
+    social_welfare REAL,
+    num_offers INTEGER
+);
+CREATE INDEX IF NOT EXISTS sessions_agent_1 ON sessions (agent_1, agent_2, domain_size);
+CREATE INDEX IF NOT EXISTS sessions_agent_2 ON sessions (agent_2, agent_1, domain_size);
+
+CREATE TABLE IF NOT EXISTS offers (
+    session_id INTEGER NOT NULL REFERENCES sessions (id),
+    turn INTEGER NOT NULL,
+    actor TEXT NOT NULL,
+    action TEXT NOT NULL,
+    bid TEXT NOT NULL,
+    utility_1 REAL,
+    utility_2 REAL,
+    PRIMARY KEY (session_id, turn)
+);
+
+CREATE TABLE IF NOT EXISTS learned (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    agent TEXT NOT NULL,
+    opponent TEXT NOT NULL,
+    domain_size INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS learned_agent ON learned (agent, opponent, domain_size);
+"""
+
+BUSY_TIMEOUT = 60.     # Seconds to wait for the lock of a concurrent writer
+
+
+class SQLiteStore:
+    """
+        Session results, offers and per-opponent learned data in a SQLite database (WAL mode).
+    """
+    path: str
+
+    def __init__(self, path: str):
+        """
+            Constructor. The database and its tables are created if they do not exist.
+        :param path: Path of the database file
+        """
+        self.path = path
+
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        with self.connect() as connection:
+            connection.executescript(SCHEMA)
+
+    def connect(self) -> "_ClosingConnection":
+        """
+            Open a connection to the database. Use it in a ``with`` block, it is committed and closed at the end.
+        :return: Connection, the rows are ``sqlite3.Row``
+        """
+        connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+
+        return _ClosingConnection(connection)
+
+    def add_session(self, settings: dict, results_trace: dict, results_summary: dict) -> int:
+        """
+            Insert the summary and the offers of a session, as returned by ``run_session``.
+        :param settings: Session settings
+        :param results_trace: Session trace
+        :param results_summary: Session summary
+        :return: ID of the session
+        """
+        profiles = settings["profiles"]
+
+        with self.connect() as connection:
+            session_id = connection.execute(
+                "INSERT INTO sessions (created, agent_1, agent_2, profile_1, profile_2, domain, domain_size, "
+                "deadline_time_ms, result, utility_1, utility_2, nash_product, social_welfare, num_offers) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), results_summary["agent_1"], results_summary["agent_2"], profiles[0], profiles[1],
+                 os.path.basename(os.path.dirname(profiles[0])), get_domain_size(profiles[0]),
+                 settings["deadline_time_ms"], results_summary["result"], results_summary["utility_1"],
+                 results_summary["utility_2"], results_summary["nash_product"], results_summary["social_welfare"],
+                 results_summary.get("num_offers", 0))
+            ).lastrowid
+
+            connection.executemany(
+                "INSERT INTO offers (session_id, turn, actor, action, bid, utility_1, utility_2) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(session_id, turn) + offer for turn, offer in enumerate(get_offers(results_trace))]
+            )
+
+        return session_id
+
+    def get_sessions(self, agent: Optional[str] = None, opponent: Optional[str] = None,
+                     min_domain_size: Optional[int] = None, limit: Optional[int] = None) -> List[dict]:
+        """
+            Query the sessions, the most recent first. An agent is matched on both sides of the profile set.
+        :param agent: Class name of the agent. As a default, any agent.
+        :param opponent: Class name of the opponent. As a default, any opponent.
+        :param min_domain_size: Only the sessions on the domains larger than this size
+        :param limit: Maximum number of sessions
+        :return: List of session rows as dictionaries
+        """
+        conditions, parameters = [], []
+
+        if agent is not None and opponent is not None:
+            conditions.append("((agent_1 = ? AND agent_2 = ?) OR (agent_1 = ? AND agent_2 = ?))")
+            parameters += [agent, opponent, opponent, agent]
+        elif agent is not None or opponent is not None:
+            conditions.append("(agent_1 = ? OR agent_2 = ?)")
+            parameters += [agent or opponent] * 2
+
+        if min_domain_size is not None:
+            conditions.append("domain_size > ?")
+            parameters.append(min_domain_size)
+
+        return self._select("sessions", conditions, parameters, limit)
+
+    def get_offers(self, session_id: int) -> List[dict]:
+        """
+            Offers and acceptances of a session, in turn order.
+        :param session_id: ID of the session
+        :return: List of offer rows as dictionaries, ``bid`` is decoded
+        """
+        with self.connect() as connection:
+            rows = connection.execute("SELECT * FROM offers WHERE session_id = ? ORDER BY turn", (session_id,))
+
+            offers = [dict(row) for row in rows]
+
+        for offer in offers:
+            offer["bid"] = json.loads(offer["bid"])
+
+        return offers
+
+    def get_trace(self, session_id: int) -> dict:
+        """
+            Session trace in the format of ``run_session`` (only the actions) from the offers of a session, e.g. for
+            ``plot_trace``.
+        :param session_id: ID of the session
+        :return: Session trace with ``actions``
+        """
+        offers = self.get_offers(session_id)
+
+        # the utilities are stored by party number, the party names are the actors
+        parties = {actor.split("_")[-1]: actor for actor in (offer["actor"] for offer in offers)}
+        actions = []
+
+        for offer in offers:
+            utilities = {parties.get(number, f"party_{number}"): offer[f"utility_{number}"] for number in ("1", "2")}
+            actions.append({offer["action"]: {"actor": offer["actor"], "bid": offer["bid"],
+                                              "utilities": utilities}})
+
+        return {"actions": actions}
+
+    def add_learned(self, agent: str, opponent: str, data: dict, domain_size: Optional[int] = None) -> int:
+        """
+            Insert the learned data of an agent after a session against an opponent.
+        :param agent: Name of the agent
+        :param opponent: Name of the opponent
+        :param data: JSON serializable learned data
+        :param domain_size: Size of the domain of the session
+        :return: ID of the row
+        """
+        with self.connect() as connection:
+            return connection.execute(
+                "INSERT INTO learned (created, agent, opponent, domain_size, data) VALUES (?, ?, ?, ?, ?)",
+                (time.time(), agent, opponent, domain_size, json.dumps(data))
+            ).lastrowid
+
+    def get_learned(self, agent: str, opponent: str, min_domain_size: Optional[int] = None,
+                    limit: Optional[int] = None) -> List[dict]:
+        """
+            Learned data of an agent against an opponent, in chronological order.
+        :param agent: Name of the agent
+        :param opponent: Name of the opponent
+        :param min_domain_size: Only the data of the domains larger than this size
+        :param limit: Only the most recent ``limit`` rows
+        :return: List of learned data
+        """
+        conditions, parameters = ["agent = ?", "opponent = ?"], [agent, opponent]
+
+        if min_domain_size is not None:
+            conditions.append("domain_size > ?")
+            parameters.append(min_domain_size)
+
+        rows = self._select("learned", conditions, parameters, limit)
+
+        return [json.loads(row["data"]) for row in reversed(rows)]
+
+    def _select(self, table: str, conditions: List[str], parameters: list, limit: Optional[int]) -> List[dict]:
+        # most recent rows first
+        query = f"SELECT * FROM {table}"
+
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        query += " ORDER BY id DESC"
+
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters = parameters + [limit]
+
+        with self.connect() as connection:
+            return [dict(row) for row in connection.execute(query, parameters)]
+
+
+class _ClosingConnection:
+    """
+        ``sqlite3.Connection`` which is also closed (not only committed) at the end of a ``with`` block.
+    """
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    def __enter__(self):
+        self.connection.__enter__()
+
+        return self
+
+    def __exit__(self, *args):
+        try:
+            return self.connection.__exit__(*args)
+        finally:
+            self.connection.close()
+
+
+def get_offers(results_trace: dict) -> List[tuple]:
+    """
+        Offers and acceptances of a session trace as ``offers`` rows.
+    :param results_trace: Session trace of ``run_session``
+    :return: List of ``(actor, action, bid, utility_1, utility_2)``
+    """
+    offers = []
+
+    if results_trace is None:
+        return offers
+
+    for action in results_trace.get("actions", []):
+        for action_type in ("Offer", "Accept"):
+            if action_type in action:
+                offer = action[action_type]
+                utilities = {party.split("_")[-1]: utility for party, utility in offer.get("utilities", {}).items()}
+
+                offers.append((offer["actor"], action_type, json.dumps(offer["bid"]),
+                               utilities.get("1"), utilities.get("2")))
+
+    return offers
@@ -0,0 +1,243 @@
+import json
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+CACHE_SIZE = 64         # Number of data files kept in the cache of the process
+
+"""
+    Concurrency-safe learning storage for the agents' ``storage_dir``.
+
+    Agents are run in parallel against multiple opponents, so several sessions can read and write the same file at
+    the same time. This module provides:
+
+        - ``write_data``: atomic write (temporary file + rename), readers never see a torn file.
+        - ``file_lock``: per-file exclusive lock (a ``.lock`` file next to the data file).
+        - ``update_data``: locked read-merge-write. The merge callback receives the currently stored data, so the
+          updates of the concurrent sessions are not lost.
+        - ``cache=True``: a process-local cache of the loaded data, keyed by the path and the version of the file
+          (modification time, size and inode, see ``get_stamp``). A file changed by another process is loaded again;
+          ``write_data`` writes through, so the following sessions in the same process skip the deserialization. The
+          cached object is shared by all readers: do not modify it without writing it back. ``warm_cache`` loads a
+          whole directory, e.g. in the parent of forked sessions.
+
+    Supported formats are ``pickle`` (default) and ``json``.
+"""
+
+_cache: "OrderedDict[Tuple[str, str], Tuple[tuple, Any]]" = OrderedDict()
+_unreadable: "dict[str, tuple]" = {}   # path -> version of the files which are neither pickle nor json
+
+
+def _dumps(data: Any, fmt: str, indent: int = None) -> bytes:
+    if fmt == "pickle":
+        return pickle.dumps(data)
+    if fmt == "json":
+        return json.dumps(data, indent=indent).encode("utf-8")
+
+    raise ValueError("Unknown storage format: %s" % fmt)
+
+
+def _loads(raw: bytes, fmt: str) -> Any:
+    if fmt == "pickle":
+        return pickle.loads(raw)
+    if fmt == "json":
+        return json.loads(raw.decode("utf-8"))
+
+    raise ValueError("Unknown storage format: %s" % fmt)
+
+
+@contextmanager
+def file_lock(path: str):
+    """
+        Exclusive inter-process lock for a data file. The lock is held on ``{path}.lock``.
+    :param path: Path of the data file
+    :return: Context manager
+    """
+    with open(f"{path}.lock", "a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _get_stamp(stat: os.stat_result) -> tuple:
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def get_stamp(path: str) -> Optional[tuple]:
+    """
+        Version of a file. ``write_data`` replaces the file, so every write changes at least the inode.
+    :param path: Path of the file
+    :return: ``(mtime_ns, size, inode)``, or None if the file does not exist
+    """
+    try:
+        return _get_stamp(os.stat(path))
+    except FileNotFoundError:
+        return None
+
+
+def _cache_put(key: Tuple[str, str], stamp: tuple, data: Any):
+    _cache[key] = (stamp, data)
+    _cache.move_to_end(key)
+
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+def clear_cache():
+    """
+        Forget the cached data of the process.
+    :return: Nothing
+    """
+    _cache.clear()
+
+
+def warm_cache(directory: str) -> int:
+    """
+        Load the data files of a directory into the cache, at most ``CACHE_SIZE``, the most recently modified first.
+        Files which are cached and did not change are not read again, so this can be repeated to refresh the cache. The
+        format of every file is detected (``json``, then ``pickle``); locks, temporary files and session logs are
+        skipped.
+    :param directory: Directory of the data files, e.g. the ``storage_dir`` of an agent
+    :return: Number of cached files
+    """
+    try:
+        entries = [entry for entry in os.scandir(directory) if entry.is_file() and not entry.name.startswith(".")
+                   and not entry.name.endswith((".lock", ".tmp", ".log", ".snapshot"))]
+    except FileNotFoundError:
+        return 0
+
+    entries.sort(key=lambda entry: entry.stat().st_mtime_ns, reverse=True)
+    cached = 0
+
+    for entry in entries[:CACHE_SIZE]:
+        path = os.path.abspath(entry.path)
+        if _unreadable.get(path) == get_stamp(path):
+            continue
+
+        formats = [fmt for fmt in ("json", "pickle") if (path, fmt) in _cache] or ["json", "pickle"]
+        for fmt in formats:
+            try:
+                read_data(path, fmt=fmt, cache=True)
+                cached += 1
+                break
+            except Exception:
+                _cache.pop((path, fmt), None)
+        else:
+            _unreadable[path] = get_stamp(path)
+
+    return cached
+
+
+def read_data(path: str, default: Any = None, fmt: str = "pickle", cache: bool = False) -> Any:
+    """
+        Read a data file.
+    :param path: Path of the data file
+    :param default: Returned if the file does not exist
+    :param fmt: ``pickle`` or ``json``
+    :param cache: Return the cached data if the file did not change since it was loaded or written by this process
+    :return: Stored data
+    """
+    key = (os.path.abspath(path), fmt)
+
+    if cache and key in _cache and _cache[key][0] == get_stamp(path):
+        _cache.move_to_end(key)
+        return _cache[key][1]
+
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return default
+
+    with f:
+        # the version of the file which is read, even if it is replaced in the meantime
+        stamp = _get_stamp(os.fstat(f.fileno()))
+        data = _loads(f.read(), fmt)
+
+    if cache:
+        _cache_put(key, stamp, data)
+
+    return data
+
+
+def write_data(path: str, data: Any, fmt: str = "pickle", indent: int = None, cache: bool = False):
+    """
+        Write a data file atomically: the data is written into a temporary file in the same directory, which then
+        replaces the data file.
+    :param path: Path of the data file
+    :param data: Data to store
+    :param fmt: ``pickle`` or ``json``
+    :param indent: Indentation for ``json``
+    :param cache: Keep the data in the cache, so the next cached ``read_data`` of this process skips the file
+    :return: Nothing
+    """
+    key = (os.path.abspath(path), fmt)
+    _cache.pop(key, None)
+
+    raw = _dumps(data, fmt, indent)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".%s." % os.path.basename(path), suffix=".tmp")
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+
+            # the rename keeps the modification time, the size and the inode
+            stamp = _get_stamp(os.fstat(f.fileno()))
+
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        raise
+
+    if cache:
+        _cache_put(key, stamp, data)
+
+
+def update_data(path: str, merge: Callable[[Any], Any], default: Any = None, fmt: str = "pickle",
+                indent: int = None, cache: bool = False) -> Any:
+    """
+        Read, merge and write a data file while holding its lock.
+    :param path: Path of the data file
+    :param merge: Callback receiving the stored data (or ``default``) and returning the data to store
+    :param default: Passed to ``merge`` if the file does not exist
+    :param fmt: ``pickle`` or ``json``
+    :param indent: Indentation for ``json``
+    :param cache: Read through and write through the cache, see ``read_data``
+    :return: The stored data after the merge
+    """
+    with file_lock(path):
+        try:
+            data = merge(read_data(path, default, fmt, cache))
+
+            write_data(path, data, fmt, indent, cache)
+        except BaseException:
+            # the merge may have modified the cached data before the write failed
+            _cache.pop((os.path.abspath(path), fmt), None)
+            raise
+
+    return data
@@ -0,0 +1,292 @@
+import importlib
+import math
+import os
+from itertools import product
+from typing import Dict, List, Optional
+
+from utils.lazy_import import lazy_import
+from utils.session_pool import DEFAULT_GRACE_TIME_MS, SessionPool
+
+pd = lazy_import("pandas")
+
+"""
+    Hyperparameter sweeps of agents over the tournament grid.
+
+    Every agent of the sweep has a parameter ``grid`` which is expanded into configurations, e.g. ``{"e": [0.1, 0.5,
+    1.0]}`` for a ``TimeDependentAgent``. Each configuration gets a unique ID (``Class[e=0.1]``) and its own storage
+    directory, and plays against every opponent on every profile set, on both sides. The opponents get a storage
+    directory per configuration as well, so a learning opponent does not carry what it learned against one
+    configuration over to the next. All these directories are reset at the start of the sweep. The sessions run in
+    parallel through the ``SessionPool``.
+
+    Only ``TimeDependentAgent`` itself reads ``e``: its subclasses (Boulware, Conceder, Linear, Hardliner) fix it in
+    ``getE``, so sweeping ``e`` on them is rejected. The numbers of the grid are passed as floats.
+
+    With successive halving (``eta``), all configurations first play on a few profile sets; only the best ``1 / eta``
+    of them (by mean utility) play on ``eta`` times more profile sets in the next round, and so on until all profile sets
+    are used or one configuration is left. Example:
+
+        sweep_settings = {
+            "agents": [
+                {"class": "agents.time_dependent_agent.time_dependent_agent.TimeDependentAgent",
+                 "grid": {"e": [0.05, 0.1, 0.2]}},
+                {"class": "agents.hybrid.hybrid_agent.HybridAgent", "parameters": {"storage_dir": "agent_storage/Hybrid"},
+                 "grid": {"p1": [0.8, 0.85, 0.9], "p3": [0.3, 0.5]}},
+            ],
+            "opponents": [{"class": "agents.conceder_agent.conceder_agent.ConcederAgent"}],
+            "profile_sets": [["domains/domain00/profileA.json", "domains/domain00/profileB.json"], ...],
+            "deadline_time_ms": 10000,
+        }
+        results = run_sweep(sweep_settings, num_workers=8, eta=3)
+        print(summarize_sweep(results))
+"""
+
+
+def get_config_id(class_path: str, parameters: dict) -> str:
+    """
+        Unique ID of a configuration.
+    :param class_path: Class path of the agent
+    :param parameters: Swept parameters
+    :return: e.g. ``HybridAgent[p1=0.85,p3=0.5]``
+    """
+    return "%s[%s]" % (class_path.split(".")[-1], ",".join(f"{name}={value}" for name, value in parameters.items()))
+
+
+def check_grid(class_path: str, grid: dict):
+    """
+        Reject the swept parameters which the agent ignores: ``e`` of a ``TimeDependentAgent`` subclass which fixes it
+        in ``getE``.
+    :param class_path: Class path of the agent
+    :param grid: Grid of the agent
+    :return: Nothing
+    """
+    if "e" not in grid:
+        return
+
+    module_name, class_name = class_path.rsplit(".", 1)
+    agent_class = getattr(importlib.import_module(module_name), class_name)
+
+    # the class of the MRO which defines getE
+    owner = next((cls for cls in agent_class.__mro__ if "getE" in vars(cls)), None)
+    if owner is not None and owner.__name__ != "TimeDependentAgent" and \
+            any(cls.__name__ == "TimeDependentAgent" for cls in agent_class.__mro__):
+        raise ValueError("%s fixes e in %s.getE, sweep e on TimeDependentAgent instead" % (class_name, owner.__name__))
+
+
+def get_grid_value(value):
+    """
+        Value of a grid as passed to the agent: the numbers are floats, e.g. ``TimeDependentAgent`` ignores an ``e`` of
+        ``1``.
+    :param value: Value of the grid
+    :return: Value of the parameter
+    """
+    if isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+
+    return value
+
+
+def expand_grid(agents: List[dict]) -> List[dict]:
+    """
+        Configurations of the agents, one per combination of their ``grid`` values.
+    :param agents: Agent settings with an optional ``grid`` of ``{parameter: [values]}``
+    :return: Configurations with ``id``, ``class``, ``parameters`` (including the swept ones) and ``swept``
+    """
+    configs = []
+
+    for agent in agents:
+        grid = agent.get("grid", {})
+        names = list(grid.keys())
+        check_grid(agent["class"], grid)
+
+        for values in product(*[grid[name] for name in names]):
+            swept = {name: get_grid_value(value) for name, value in zip(names, values)}
+            config_id = get_config_id(agent["class"], swept)
+            parameters = dict(agent.get("parameters", {}), **swept)
+
+            # the learned data of a configuration should not be mixed with the others
+            if "storage_dir" in parameters:
+                parameters["storage_dir"] = os.path.join(parameters["storage_dir"], config_id)
+
+            configs.append({"id": config_id, "class": agent["class"], "parameters": parameters, "swept": swept})
+
+    if len({config["id"] for config in configs}) != len(configs):
+        raise ValueError("The configurations of the sweep are not unique")
+
+    return configs
+
+
+def get_opponent(opponent: dict, config_id: str) -> dict:
+    """
+        Settings of an opponent against a configuration, with a storage directory of its own.
+    :param opponent: Agent settings of the opponent
+    :param config_id: ID of the configuration
+    :return: Agent settings
+    """
+    parameters = dict(opponent.get("parameters", {}))
+
+    if "storage_dir" in parameters:
+        parameters["storage_dir"] = os.path.join(parameters["storage_dir"], config_id)
+
+    return dict(opponent, parameters=parameters)
+
+
+def get_sweep_sessions(configs: List[dict], opponents: List[dict], profile_sets: List[list], deadline_time_ms: int,
+                       trace_level: str = "none") -> List[dict]:
+    """
+        Sessions of every configuration against every opponent on every profile set, on both sides.
+    :param configs: Configurations of ``expand_grid``
+    :param opponents: Agent settings of the opponents
+    :param profile_sets: Profile sets
+    :param deadline_time_ms: Deadline of the sessions
+    :param trace_level: Trace level of the sessions
+    :return: Session settings for ``run_session``, with the configuration as ``config`` and its side as ``side``
+    """
+    sessions = []
+
+    for config in configs:
+        agent = {"class": config["class"], "parameters": config["parameters"]}
+
+        for opponent in opponents:
+            opponent = get_opponent(opponent, config["id"])
+
+            for profiles in profile_sets:
+                for side, agents in ((1, [agent, opponent]), (2, [opponent, agent])):
+                    sessions.append({
+                        "agents": agents,
+                        "profiles": profiles,
+                        "deadline_time_ms": deadline_time_ms,
+                        "trace_level": trace_level,
+                        "config": config["id"],
+                        "side": side,
+                    })
+
+    return sessions
+
+
+def get_rows(sessions: List[dict], results: List[dict], configs: Dict[str, dict], halving_round: int) -> List[dict]:
+    """
+        Tidy rows of the sessions: one row per session, from the point of view of the configuration.
+    :param sessions: Session settings of ``get_sweep_sessions``
+    :param results: Session summaries, in the same order
+    :param configs: Configurations by ID
+    :param halving_round: Round of the successive halving
+    :return: Rows
+    """
+    rows = []
+
+    for settings, results_summary in zip(sessions, results):
+        # the party with the lower number is the first agent of the session
+        numbers = sorted(int(key.split("_")[1]) for key in results_summary if key.startswith("agent_"))
+        own, other = numbers if settings["side"] == 1 else numbers[::-1]
+        config = configs[settings["config"]]
+        opponent = settings["agents"][2 - settings["side"]]
+
+        row = {
+            "config": config["id"],
+            "agent": config["class"].split(".")[-1],
+            "opponent": opponent["class"].split(".")[-1],
+            "profile": settings["profiles"][settings["side"] - 1],
+            "side": settings["side"],
+            "round": halving_round,
+            "utility": float(results_summary[f"utility_{own}"]),
+            "opponent_utility": float(results_summary[f"utility_{other}"]),
+            "nash_product": results_summary["nash_product"],
+            "social_welfare": results_summary["social_welfare"],
+            "result": results_summary["result"],
+            "duration": results_summary.get("duration"),
+        }
+        row.update({f"param_{name}": value for name, value in config["swept"].items()})
+        rows.append(row)
+
+    return rows
+
+
+def run_sweep(sweep_settings: dict, num_workers: int = 1, eta: Optional[int] = None,
+              min_profile_sets: Optional[int] = None) -> "pd.DataFrame":
+    """
+        Run a sweep, see the module documentation.
+    :param sweep_settings: ``agents`` with their ``grid``, ``opponents``, ``profile_sets``, ``deadline_time_ms`` and
+        optionally ``grace_time_ms`` and ``max_memory_mb``
+    :param num_workers: Number of sessions running in parallel
+    :param eta: Reduction factor of the successive halving. As a default, all configurations play on all profile sets.
+    :param min_profile_sets: Number of profile sets of the first halving round. As a default, the number which leads to
+        one configuration at the end.
+    :return: Tidy results, see ``get_rows``
+    """
+    from utils.runners import prepare_storage
+
+    configs = expand_grid(sweep_settings["agents"])
+    opponents = sweep_settings["opponents"]
+    profile_sets = sweep_settings["profile_sets"]
+    configs_by_id = {config["id"]: config for config in configs}
+
+    # no learned data of an earlier sweep
+    prepare_storage([{"class": config["class"], "parameters": config["parameters"]} for config in configs] +
+                    [get_opponent(opponent, config["id"]) for config in configs for opponent in opponents])
+
+    pool = SessionPool(
+        num_workers,
+        grace_time_ms=sweep_settings.get("grace_time_ms", DEFAULT_GRACE_TIME_MS),
+        max_memory_mb=sweep_settings.get("max_memory_mb"),
+    )
+    pool.preload([{"class": config["class"]} for config in configs] + opponents, profile_sets)
+
+    if eta is None:
+        budget = len(profile_sets)
+    elif min_profile_sets is not None:
+        budget = min(min_profile_sets, len(profile_sets))
+    else:
+        # rounds until one configuration is left
+        num_rounds, num_configs = 1, len(configs)
+        while num_configs > 1:
+            num_configs = int(math.ceil(num_configs / eta))
+            num_rounds += 1
+
+        budget = max(len(profile_sets) // eta ** (num_rounds - 1), 1)
+
+    survivors = configs
+    done = 0
+    rows = []
+    halving_round = 0
+
+    while True:
+        sessions = get_sweep_sessions(survivors, opponents, profile_sets[done:budget],
+                                      sweep_settings["deadline_time_ms"])
+        results = pool.run(sessions)
+        rows.extend(get_rows(sessions, results, configs_by_id, halving_round))
+
+        done = budget
+
+        if eta is None or budget >= len(profile_sets) or len(survivors) <= 1:
+            break
+
+        # keep the best configurations on everything they played so far
+        scores = pd.DataFrame(rows).groupby("config")["utility"].mean()
+        keep = max(int(math.ceil(len(survivors) / eta)), 1)
+        best = set(scores.loc[[config["id"] for config in survivors]].nlargest(keep).index)
+        survivors = [config for config in survivors if config["id"] in best]
+
+        budget = min(budget * eta, len(profile_sets))
+        halving_round += 1
+
+    return pd.DataFrame(rows)
+
+
+def summarize_sweep(results: "pd.DataFrame") -> "pd.DataFrame":
+    """
+        Mean results per configuration, best first.
+    :param results: Tidy results of ``run_sweep``
+    :return: Table indexed by configuration
+    """
+    summary = results.groupby("config").agg(
+        utility=("utility", "mean"),
+        opponent_utility=("opponent_utility", "mean"),
+        nash_product=("nash_product", "mean"),
+        social_welfare=("social_welfare", "mean"),
+        agreement_rate=("result", lambda result: (result == "agreement").mean()),
+        sessions=("utility", "size"),
+        rounds=("round", "max"),
+    )
+
+    return summary.sort_values(["rounds", "utility"], ascending=False)
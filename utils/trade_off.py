@@ -0,0 +1,180 @@
+import heapq
+import math
+from itertools import count
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from geniusweb.issuevalue.Bid import Bid
+from geniusweb.issuevalue.Value import Value
+from geniusweb.profile.utilityspace.LinearAdditive import LinearAdditive
+
+from utils.frequency_model import BidEncoder
+from utils.lazy_import import lazy_import
+
+np = lazy_import("numpy")
+
+"""
+    Iso-utility trade-off bids of a LinearAdditive profile: the bids of an own utility window, in descending estimated
+    opponent utility.
+
+    The opponent estimate has to be additive over the issues (issue weight times value estimate, as the frequency
+    models), so the bids are enumerated by a best-first search over the issues instead of scoring every bid of the
+    window. Each node fixes the value of one more issue, in descending order of its opponent estimate, and its bound is
+    the opponent estimate so far plus the best estimate of the remaining issues. The children of a node are generated
+    lazily, so the queue only grows with the number of enumerated bids.
+
+    Values which cannot reach the window anymore are skipped: for every suffix of the issues, the reachable sums of the
+    own utilities are kept as a bit set over bins of ``resolution`` (a conservative superset), and a value is only
+    taken if the rest of the bid can still land in the window. The leaves are checked exactly.
+
+        generator = TradeOffGenerator(profile)
+        tables = generator.get_opponent_tables(lambda issue, value: opponent_model.get_utility(issue, value))
+        for bid, utility, opponent_utility in generator.get_bids(tables, 0.78, 0.82):
+            ...
+"""
+
+
+class TradeOffGenerator:
+    """
+        Sorted per-issue utilities of a LinearAdditive profile, to enumerate the bids of an own utility window by
+        descending opponent estimate.
+    """
+    encoder: BidEncoder
+    tables: List["np.ndarray"]
+    resolution: float
+
+    def __init__(self, space: LinearAdditive, resolution: float = 1e-3):
+        """
+            Constructor
+        :param space: Own profile
+        :param resolution: Bin width of the reachable own utilities
+        """
+        self.encoder = BidEncoder(space.getDomain())
+        self.tables = self.encoder.get_utility_tables(space)
+        self.resolution = resolution
+
+        # bins of the own value utilities, rounded down
+        self._bins = [np.maximum(np.floor(table / resolution), 0).astype(int) for table in self.tables]
+
+        # _reachable[i]: cumulative count of the reachable bin sums of the issues i.., for range queries
+        reachable = np.ones(1, dtype=bool)
+        self._reachable = [np.cumsum(reachable)]
+        for bins in reversed(self._bins):
+            suffix = np.zeros(len(reachable) + int(bins.max()), dtype=bool)
+            for shift in np.unique(bins):
+                suffix[shift:shift + len(reachable)] |= reachable
+            reachable = suffix
+            self._reachable.append(np.cumsum(reachable))
+        self._reachable.reverse()
+
+    def get_opponent_tables(self, estimate: Callable[[str, Value], float]) -> List["np.ndarray"]:
+        """
+            Opponent estimates per issue, for ``get_bids``.
+        :param estimate: Weighted estimate of a value of an issue, e.g. weight * value estimate of a frequency model
+        :return: One float array per issue
+        """
+        return [np.array([float(estimate(issue, value)) for value in values])
+                for issue, values in zip(self.encoder.issues, self.encoder.values)]
+
+    def _can_reach(self, i: int, low: float, high: float) -> bool:
+        # whether the issues i.. may add an own utility in [low, high]
+        num_issues = len(self.tables) - i
+        if num_issues == 0:
+            return low - 1e-12 <= 0. <= high + 1e-12
+
+        # a bin sum f stands for a utility in [f, f + num_issues) * resolution
+        first = max(0, math.ceil(low / self.resolution - 1e-9) - num_issues)
+        last = min(len(self._reachable[i]) - 1, math.floor(high / self.resolution + 1e-9))
+        if first > last:
+            return False
+
+        return self._reachable[i][last] - (self._reachable[i][first - 1] if first > 0 else 0) > 0
+
+    def get_bids(self, opponent_tables: List["np.ndarray"], low: float, high: float,
+                 limit: Optional[int] = None, max_queue: Optional[int] = None) -> Iterator[Tuple[Bid, float, float]]:
+        """
+            Bids with an own utility in [low, high], by descending opponent estimate.
+        :param opponent_tables: Opponent estimates of ``get_opponent_tables``
+        :param low: Minimum own utility
+        :param high: Maximum own utility
+        :param limit: Maximum number of bids. As a default, all bids of the window.
+        :param max_queue: Maximum size of the queue. The worst nodes are dropped beyond it, so the order stays exact but
+            bids may be missed. As a default, unbounded.
+        :return: Iterator of (bid, float own utility, float opponent estimate)
+        """
+        for row, utility, opponent_utility in self.get_rows(opponent_tables, low, high, limit, max_queue):
+            yield self.encoder.decode(row), utility, opponent_utility
+
+    def get_rows(self, opponent_tables: List["np.ndarray"], low: float, high: float, limit: Optional[int] = None,
+                 max_queue: Optional[int] = None) -> Iterator[Tuple["np.ndarray", float, float]]:
+        """
+            Encoded bids with an own utility in [low, high], by descending opponent estimate.
+        :param opponent_tables: Opponent estimates of ``get_opponent_tables``
+        :param low: Minimum own utility
+        :param high: Maximum own utility
+        :param limit: Maximum number of bids. As a default, all bids of the window.
+        :param max_queue: Maximum size of the queue, see ``get_bids``
+        :return: Iterator of (value indices, float own utility, float opponent estimate)
+        """
+        num_issues = len(self.tables)
+        if num_issues == 0 or not self._can_reach(0, low, high):
+            return
+
+        # value indices of every issue by descending opponent estimate
+        orders = [[int(index) for index in np.argsort(-table, kind="stable")] for table in opponent_tables]
+        own = [[float(utility) for utility in table] for table in self.tables]
+        opponent = [[float(utility) for utility in table] for table in opponent_tables]
+
+        # best[i]: the most the issues i.. can add to the opponent estimate
+        best = [0.] * (num_issues + 1)
+        for i in range(num_issues - 1, -1, -1):
+            best[i] = best[i + 1] + max(opponent[i])
+
+        def get_option(i: int, rank: int, utility: float) -> int:
+            # first rank from rank on of issue i whose value keeps the window reachable, -1 if none
+            while rank < len(orders[i]):
+                value_utility = own[i][orders[i][rank]]
+                if self._can_reach(i + 1, low - utility - value_utility, high - utility - value_utility):
+                    return rank
+                rank += 1
+            return -1
+
+        def push(i: int, rank: int, utility: float, opponent_utility: float, values: tuple):
+            bound = opponent_utility + opponent[i][orders[i][rank]] + best[i + 1]
+            heapq.heappush(heap, (-bound, next(tie), i, rank, utility, opponent_utility, values))
+
+        # node: (-bound, tie, issue, rank, own utility of the parent, opponent estimate of the parent, parent values)
+        tie = count()
+        heap = []
+        rank = get_option(0, 0, 0.)
+        if rank >= 0:
+            push(0, rank, 0., 0., ())
+        found = 0
+
+        while heap:
+            _, _, i, rank, utility, opponent_utility, values = heapq.heappop(heap)
+
+            # the next sibling has a lower or equal bound
+            sibling = get_option(i, rank + 1, utility)
+            if sibling >= 0:
+                push(i, sibling, utility, opponent_utility, values)
+
+            value = orders[i][rank]
+            node_utility = utility + own[i][value]
+            node_opponent_utility = opponent_utility + opponent[i][value]
+            node_values = values + (value,)
+
+            if i + 1 < num_issues:
+                first = get_option(i + 1, 0, node_utility)
+                if first >= 0:
+                    push(i + 1, first, node_utility, node_opponent_utility, node_values)
+
+                if max_queue is not None and len(heap) > 2 * max_queue:
+                    heap = heapq.nsmallest(max_queue, heap)
+                    heapq.heapify(heap)
+                continue
+
+            yield np.array(node_values), node_utility, node_opponent_utility
+
+            found += 1
+            if limit is not None and found >= limit:
+                return